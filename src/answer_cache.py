@@ -0,0 +1,148 @@
+import re
+import time
+import threading
+import logging
+from collections import OrderedDict
+import numpy as np
+import metrics
+
+logger = logging.getLogger(__name__)
+
+ANSWER_CACHE_LOOKUPS = metrics.counter(
+    "pakfashion_answer_cache_lookups_total",
+    "Answer cache lookups, by result",
+    ["result"],
+)
+
+# Follow-ups like "show me more of those" depend on the chat history, so they are never served from cache
+FOLLOW_UP = re.compile(r"\b(it|its|that|those|these|them|this|they|more|same|another|other|else|previous|above)\b")
+
+
+def normalize_question(question):
+    text = re.sub(r"[^\w\s]", " ", question.lower())
+    return " ".join(text.split())
+
+
+class AnswerCache:
+    """Two-layer answer cache: exact match on the normalized question, then embedding similarity.
+
+    A semantic match is only served when both questions name the same entities (brands,
+    categories, colours, price bounds); without entities only exact matches are served.
+    Entries expire after ttl seconds, the least recently used are evicted past max_entries,
+    and everything is dropped when the index version changes.
+    """
+
+    def __init__(self, embeddings, max_entries=1000, ttl=3600, threshold=0.92):
+        self.embeddings = embeddings
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.threshold = threshold
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()
+        self.version = None
+        self.matrix = None
+        self.matrix_keys = []
+        self.matrix_entities = []
+        self.exact_hits = 0
+        self.semantic_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def stats(self):
+        with self.lock:
+            lookups = self.exact_hits + self.semantic_hits + self.misses
+            return {
+                "entries": len(self.entries),
+                "exact_hits": self.exact_hits,
+                "semantic_hits": self.semantic_hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+                "hit_rate": round((self.exact_hits + self.semantic_hits) / lookups, 3) if lookups else 0.0,
+            }
+
+    def cacheable(self, question, has_history):
+        return not (has_history and FOLLOW_UP.search(question.lower()))
+
+    def check_version(self, version):
+        # Caller holds the lock
+        if version != self.version:
+            if self.entries:
+                self.invalidations += 1
+                logger.info(f"Index version changed to {version}, dropping {len(self.entries)} cached answers")
+            self.entries.clear()
+            self.matrix = None
+            self.version = version
+
+    def expire(self):
+        # Caller holds the lock
+        now = time.time()
+        expired = [key for key, entry in self.entries.items() if now - entry["created"] > self.ttl]
+        for key in expired:
+            del self.entries[key]
+        if expired:
+            self.matrix = None
+
+    def embed(self, key):
+        try:
+            vector = np.asarray(self.embeddings.embed_query(key), dtype=np.float32)
+        except Exception as e:
+            logger.warning(f"Could not embed question for the semantic cache: {e}")
+            return None
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else None
+
+    def semantic_match(self, vector, entities):
+        # Caller holds the lock
+        if self.matrix is None:
+            keys = [key for key, entry in self.entries.items() if entry["vector"] is not None]
+            self.matrix_keys = keys
+            self.matrix_entities = [self.entries[key]["entities"] for key in keys]
+            self.matrix = np.vstack([self.entries[key]["vector"] for key in keys]) if keys else None
+        if self.matrix is None:
+            return None, 0.0
+        # "khaadi lawn" and "sapphire lawn" embed close together; only answers about the same things compete
+        same = np.array([other == entities for other in self.matrix_entities])
+        if not same.any():
+            return None, 0.0
+        similarities = np.where(same, self.matrix @ vector, -np.inf)
+        best = int(np.argmax(similarities))
+        return self.matrix_keys[best], float(similarities[best])
+
+    def lookup(self, question, version, entities=None):
+        key = normalize_question(question)
+        with self.lock:
+            self.check_version(version)
+            self.expire()
+            entry = self.entries.get(key)
+            if entry is not None:
+                self.entries.move_to_end(key)
+                self.exact_hits += 1
+                ANSWER_CACHE_LOOKUPS.inc(result="exact")
+                return entry["answer"], None
+        # Embedding happens outside the lock; it is the only slow step of a lookup
+        vector = self.embed(key)
+        with self.lock:
+            if vector is not None and entities is not None and self.version == version:
+                match, similarity = self.semantic_match(vector, entities)
+                if match is not None and similarity >= self.threshold and match in self.entries:
+                    self.entries.move_to_end(match)
+                    self.semantic_hits += 1
+                    ANSWER_CACHE_LOOKUPS.inc(result="semantic")
+                    logger.debug(f"Semantic cache hit for '{key}' via '{match}' ({similarity:.3f})")
+                    return self.entries[match]["answer"], vector
+            self.misses += 1
+        ANSWER_CACHE_LOOKUPS.inc(result="miss")
+        return None, vector
+
+    def store(self, question, answer, version, vector=None, entities=None):
+        key = normalize_question(question)
+        with self.lock:
+            self.check_version(version)
+            self.entries[key] = {"answer": answer, "vector": vector, "entities": entities, "created": time.time()}
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+                self.evictions += 1
+            self.matrix = None
@@ -1,71 +1,52 @@
+import os
+import ipaddress
 import streamlit as st
-import threading
 import logging
-import os
-from sqlalchemy import create_engine, Column, Integer, String
-from sqlalchemy.orm import declarative_base, sessionmaker
-import bcrypt
-from main import get_fashion_bot
-from urls_finder import URLFinder
+from streamlit.runtime.scriptrunner import get_script_run_ctx
+from query_client import QueryClient
+from auth_service import AuthThrottled, register_user, authenticate_user, verify_token
+from tracing import configure_logging, trace
+import metrics
 
 # =======================
-# Database Configuration
+# Logging Configuration
 # =======================
 
-Base = declarative_base()
-
-class User(Base):
-    __tablename__ = 'users'
-    
-    id = Column(Integer, primary_key=True)
-    email = Column(String(120), unique=True, nullable=False)
-    username = Column(String(150), unique=True, nullable=False)
-    password = Column(String(60), nullable=False)
-    
-# Create SQLite engine and session
-engine = create_engine('sqlite:///users.db', connect_args={"check_same_thread": False})
-Base.metadata.create_all(engine)
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
-db_session = SessionLocal()
+# Idempotent, so the reruns Streamlit does on every interaction do not stack up handlers
+configure_logging('fashion_bot_app.log')
+logger = logging.getLogger(__name__)
 
-# =======================
-# Logging Configuration
-# =======================
+# Each replica can expose its own auth metrics to Prometheus; off unless APP_METRICS_PORT is set
+@st.cache_resource
+def start_metrics_server():
+    port = int(os.getenv("APP_METRICS_PORT", "0"))
+    return metrics.start_http_server(port) if port else None
 
-logging.basicConfig(level=logging.INFO,
-                    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-                    filename='fashion_bot_app.log',
-                    filemode='a')
+start_metrics_server()
 
-console_handler = logging.StreamHandler()
-console_handler.setLevel(logging.INFO)
-formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
-console_handler.setFormatter(formatter)
+# Proxies (addresses or CIDR ranges) allowed to report the client address in X-Forwarded-For
+TRUSTED_PROXIES = [ipaddress.ip_network(entry.strip(), strict=False)
+                   for entry in os.getenv("TRUSTED_PROXIES", "").split(",") if entry.strip()]
 
-logging.getLogger('').addHandler(console_handler)
-logger = logging.getLogger(__name__)
+ADMIN_EMAILS = {email.strip().lower() for email in os.getenv("ADMIN_EMAILS", "").split(",") if email.strip()}
 
 # =======================
-# Initialize FashionBot
+# Query Service Client
 # =======================
 
-fashion_bot = get_fashion_bot()
-logger.info("FashionBot instance created")
+# Answers come from query_service.py; scraping and indexing run in ingest_worker.py, so this process stays light
+@st.cache_resource
+def get_query_client():
+    return QueryClient()
 
-def start_url_finder():
-    url_finder = URLFinder()
-    search_query = "Pakistani women fashion brands"  # or any appropriate search term
-    url_finder.find_urls(search_query)
-    logger.info("URL Finder started")
+query_client = get_query_client()
 
-def initialize_url_finder():
-    url_finder_thread = threading.Thread(target=start_url_finder)
-    url_finder_thread.daemon = True
-    url_finder_thread.start()
-    logger.info("URL Finder thread initialized")
+PRODUCTS_PER_PAGE = 6
 
-# Initialize the URLFinder
-initialize_url_finder()
+# Small resized copies served by the query service; each image is fetched at most once per hour per replica
+@st.cache_data(ttl=3600, max_entries=1000, show_spinner=False)
+def load_thumbnail(image_url):
+    return query_client.thumbnail(image_url)
 
 # =======================
 # Streamlit Configuration
@@ -79,45 +60,169 @@ st.set_page_config(
 logger.info("Streamlit page configured")
 
 # =======================
-# Authentication Functions
+# Authentication Helpers
 # =======================
 
-def hash_password(password: str) -> bytes:
-    return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt())
+def is_trusted_proxy(address):
+    try:
+        ip = ipaddress.ip_address(address)
+    except ValueError:
+        return False
+    return any(ip in network for network in TRUSTED_PROXIES)
 
-def verify_password(password: str, hashed: bytes) -> bool:
-    return bcrypt.checkpw(password.encode('utf-8'), hashed)
+def client_ip() -> str:
+    """Key the auth rate limit is counted under: the caller's address, or its browser session if unknown."""
+    if hasattr(st.context, "ip_address"):
+        # Streamlit reports connections from localhost as None
+        peer = st.context.ip_address or "127.0.0.1"
+        # X-Forwarded-For is client-controlled unless a proxy we run set it; walk it from the right,
+        # past our own proxies, to the address the outermost one saw
+        if is_trusted_proxy(peer):
+            hops = [hop.strip() for hop in st.context.headers.get("X-Forwarded-For", "").split(',') if hop.strip()]
+            while hops and is_trusted_proxy(hops[-1]):
+                hops.pop()
+            if hops:
+                peer = hops[-1]
+        return peer
+    # Older Streamlit does not expose the peer address; never share one bucket across all such clients
+    ctx = get_script_run_ctx()
+    return f"session:{ctx.session_id}" if ctx else None
 
-def register_user(email: str, username: str, password: str) -> bool:
-    existing_user = db_session.query(User).filter((User.email == email) | (User.username == username)).first()
-    if existing_user:
-        return False
-    hashed_pw = hash_password(password)
-    new_user = User(email=email, username=username, password=hashed_pw)
-    db_session.add(new_user)
-    db_session.commit()
-    return True
-
-def authenticate_user(email: str, password: str) -> bool:
-    user = db_session.query(User).filter(User.email == email).first()
-    if user and verify_password(password, user.password):
-        return True
-    return False
+def current_user():
+    # Validates the signed token on every rerun without touching the database or bcrypt
+    email = verify_token(st.session_state.get('auth_token'))
+    st.session_state['authenticated'] = email is not None
+    st.session_state['user_email'] = email or ''
+    return email
 
 # =======================
 # Streamlit App Layout
 # =======================
 
+def render_products(products, key, expanded=True):
+    # Product cards, three to a row, a page at a time; collapsed cards load no images at all
+    if not products:
+        return
+    state_key = f"products_shown_{key}"
+    if state_key not in st.session_state:
+        st.session_state[state_key] = PRODUCTS_PER_PAGE if expanded else 0
+    shown = st.session_state[state_key]
+    if shown == 0:
+        if st.button(f"Show products ({len(products)})", key=f"show_{key}"):
+            st.session_state[state_key] = PRODUCTS_PER_PAGE
+            st.rerun()
+        return
+    visible = products[:shown]
+    for start in range(0, len(visible), 3):
+        columns = st.columns(3)
+        for column, product in zip(columns, visible[start:start + 3]):
+            with column:
+                thumbnail = load_thumbnail(product["image"]) if product.get("image") else None
+                if thumbnail:
+                    st.image(thumbnail, use_column_width=True)
+                price = f"{product['currency']} {product['price']:,.0f}" if product.get("price") is not None else ""
+                st.markdown(f"**[{product['name']}]({product['url']})**  \n{product['brand']} {price}")
+    if len(products) > shown:
+        if st.button(f"Show more ({len(products) - shown} left)", key=f"more_{key}"):
+            st.session_state[state_key] = shown + PRODUCTS_PER_PAGE
+            st.rerun()
+
+def metric_total(snapshot, name, **labels):
+    # Sum of a counter or gauge over the label sets matching labels
+    samples = (snapshot or {}).get(name, {}).get("samples", [])
+    return sum(sample["value"] for sample in samples
+               if all(sample["labels"].get(key) == value for key, value in labels.items()))
+
+def histogram_rows(snapshot):
+    rows = []
+    for name, metric in sorted((snapshot or {}).items()):
+        if metric["type"] != "histogram":
+            continue
+        for sample in metric["samples"]:
+            rows.append({
+                "metric": name,
+                "labels": ", ".join(f"{key}={value}" for key, value in sample["labels"].items()),
+                "count": sample["count"],
+                **{q: round(sample[q] * 1000, 1) if sample[q] is not None else None for q in ("p50", "p95", "p99")},
+            })
+    return rows
+
+def value_rows(snapshot):
+    rows = []
+    for name, metric in sorted((snapshot or {}).items()):
+        if metric["type"] == "histogram":
+            continue
+        for sample in metric["samples"]:
+            labels = ", ".join(f"{key}={value}" for key, value in sample["labels"].items())
+            rows.append({"metric": name, "labels": labels, "value": sample["value"]})
+    return rows
+
+def render_metrics(title, snapshot):
+    st.subheader(title)
+    if snapshot is None:
+        st.warning("Metrics endpoint unreachable.")
+        return
+    st.caption("Latencies in milliseconds")
+    st.dataframe(histogram_rows(snapshot), use_container_width=True)
+    st.dataframe(value_rows(snapshot), use_container_width=True)
+
+def render_admin():
+    st.header("Metrics")
+    service = query_client.metrics()
+    ingest = query_client.metrics(query_client.ingest_metrics_url)
+
+    queries = metric_total(service, "pakfashion_queries_total")
+    cache_hits = metric_total(service, "pakfashion_queries_total", path="cache")
+    fetched = metric_total(ingest, "pakfashion_pages_fetched_total")
+    failed = metric_total(ingest, "pakfashion_pages_fetched_total", outcome="failed")
+    columns = st.columns(5)
+    columns[0].metric("Questions", f"{queries:,.0f}")
+    columns[1].metric("Answer cache hit rate", f"{100 * cache_hits / queries:.0f}%" if queries else "-")
+    columns[2].metric("Chat sessions", f"{metric_total(service, 'pakfashion_chat_sessions'):,.0f}")
+    columns[3].metric("Pages fetched", f"{fetched:,.0f}", f"{failed:,.0f} failed", delta_color="inverse")
+    columns[4].metric("Index generation", f"{metric_total(ingest, 'pakfashion_index_generation'):,.0f}")
+
+    render_metrics("Query service", service)
+    render_metrics("Ingest worker", ingest)
+    render_metrics("This app replica", metrics.REGISTRY.snapshot())
+
+def forget_product_pages():
+    # Message ids restart with a new conversation, so their paging state must not carry over
+    for key in [key for key in st.session_state if key.startswith("products_shown_")]:
+        del st.session_state[key]
+
+def ask(question):
+    st.session_state.conversation.append({"role": "user", "content": question})
+    st.chat_message("user").write(question)
+
+    # Render tokens as they arrive instead of waiting for the whole answer
+    with st.chat_message("assistant"):
+        placeholder = st.empty()
+        placeholder.markdown("_Thinking..._")
+        response, products = "", []
+        for event in query_client.stream_response(question, session_id=st.session_state['user_email']):
+            if event["type"] == "text":
+                response += event["text"]
+                placeholder.markdown(response + "▌")
+            elif event["type"] == "products":
+                products.extend(event["products"])
+        placeholder.markdown(response)
+        message_id = len(st.session_state.conversation)
+        render_products(products, message_id)
+    st.session_state.conversation.append(
+        {"role": "bot", "content": response, "products": products, "id": message_id}
+    )
+    logger.info(f"Response generated for user {st.session_state['user_email']}")
+
 def main():
     # App Header
     st.title("Fashion Brand Query Bot")
     st.write("Welcome to the Fashion Brand Query Bot. Please log in or register to continue.")
     
     # Initialize session state
-    if 'authenticated' not in st.session_state:
-        st.session_state['authenticated'] = False
-    if 'user_email' not in st.session_state:
-        st.session_state['user_email'] = ''
+    if 'auth_token' not in st.session_state:
+        st.session_state['auth_token'] = None
+    current_user()
     if 'conversation' not in st.session_state:
         st.session_state['conversation'] = []
     
@@ -140,11 +245,16 @@ def main():
                 elif reg_password != reg_confirm_password:
                     st.error("Passwords do not match.")
                 else:
-                    success = register_user(reg_email, reg_username, reg_password)
+                    try:
+                        with trace():
+                            success = register_user(reg_email, reg_username, reg_password, client_ip())
+                    except AuthThrottled as e:
+                        st.error(str(e))
+                        success = None
                     if success:
                         st.success("Registration successful! You can now log in.")
                         logger.info(f"New user registered: {reg_email}")
-                    else:
+                    elif success is False:
                         st.error("User with this email or username already exists.")
                         logger.warning(f"Registration failed for email: {reg_email}")
         
@@ -159,13 +269,19 @@ def main():
                 if not login_email or not login_password:
                     st.error("Please enter both email and password.")
                 else:
-                    authenticated = authenticate_user(login_email, login_password)
-                    if authenticated:
-                        st.session_state['authenticated'] = True
-                        st.session_state['user_email'] = login_email
+                    try:
+                        with trace():
+                            token = authenticate_user(login_email, login_password, client_ip())
+                    except AuthThrottled as e:
+                        st.error(str(e))
+                        logger.warning(f"Throttled login attempt for email: {login_email}")
+                        token = False
+                    if token:
+                        st.session_state['auth_token'] = token
+                        current_user()
                         st.success("Logged in successfully!")
                         logger.info(f"User logged in: {login_email}")
-                    else:
+                    elif token is None:
                         st.error("Invalid email or password.")
                         logger.warning(f"Failed login attempt for email: {login_email}")
     
@@ -175,49 +291,46 @@ def main():
 
         if st.sidebar.button("Logout"):
             # Reset session state for user logout
+            st.session_state['auth_token'] = None
             st.session_state['authenticated'] = False
             st.session_state['user_email'] = ''
             st.session_state['conversation'] = []
+            forget_product_pages()
             st.sidebar.success("Logged out successfully!")
             logging.info(f"User logged out.")
 
             # Use st.experimental_set_query_params to force rerun after logout
             st.experimental_set_query_params(logged_out="true")
-        
+
+        if st.session_state['user_email'].lower() in ADMIN_EMAILS and st.sidebar.toggle("Admin: metrics"):
+            render_admin()
+            return
+
         st.header("Ask About Fashion Brands")
         user_input = st.chat_input("Type your question here...")
-        
-        if user_input:
-            logger.info(f"Received user input from {st.session_state['user_email']}: {user_input}")
-            st.session_state.conversation.append({"role": "user", "content": user_input})
-            with st.spinner("Generating response..."):
-                response = fashion_bot.get_response(user_input)
-            st.session_state.conversation.append({"role": "bot", "content": response})
-            logger.info(f"Response generated for user {st.session_state['user_email']}")
-        
-        # Display the conversation
-        for message in st.session_state.conversation:
+
+        # Display the conversation so far; only the latest answer's products are expanded
+        conversation = st.session_state.conversation
+        for index, message in enumerate(conversation):
             if message["role"] == "user":
                 st.chat_message("user").write(message["content"])
             else:
-                st.chat_message("assistant").write(message["content"])
-                
-                # Check if the message content is a dictionary
-                if isinstance(message["content"], dict):
-                    if "images" in message["content"]:
-                        # Ensure images is a list before iterating
-                        for img_url in message["content"]["images"]:
-                            if isinstance(img_url, str):  # Check if img_url is a string
-                                st.image(img_url, use_column_width=True)  # Display the image
-                                logger.debug(f"Image displayed: {img_url}")
-                    else:
-                        logger.warning("No 'images' key found in message['content']")
-                else:
-                    logger.error("message['content'] is not a dictionary: ", message["content"])
-        
+                with st.chat_message("assistant"):
+                    st.write(message["content"])
+                    render_products(message.get("products", []), message.get("id", index),
+                                    expanded=index == len(conversation) - 1 and not user_input)
+
+        if user_input:
+            # The trace id travels to the query service, so both sides log this question under it
+            with trace():
+                logger.info(f"Received user input from {st.session_state['user_email']}: {user_input}")
+                ask(user_input)
+
         # Clear chat history button
         if st.button("Clear Chat History"):
             st.session_state["conversation"] = []
+            forget_product_pages()
+            query_client.clear_session(st.session_state['user_email'])
             st.success("Chat history cleared.")
             logger.info(f"Chat history cleared for user {st.session_state['user_email']}")
 
@@ -0,0 +1,258 @@
+import os
+import hmac
+import json
+import time
+import base64
+import hashlib
+import threading
+import logging
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+import bcrypt
+from sqlalchemy import create_engine, event, Column, Integer, String
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import declarative_base, sessionmaker
+from sqlalchemy.pool import QueuePool
+from dotenv import load_dotenv
+import metrics
+
+logger = logging.getLogger(__name__)
+
+# The Streamlit app imports this module first thing, so settings from .env must be loaded here
+load_dotenv()
+
+# =======================
+# Database Configuration
+# =======================
+
+Base = declarative_base()
+
+class User(Base):
+    __tablename__ = 'users'
+
+    id = Column(Integer, primary_key=True)
+    email = Column(String(120), unique=True, nullable=False)
+    username = Column(String(150), unique=True, nullable=False)
+    password = Column(String(60), nullable=False)
+
+DATABASE_URL = os.getenv("AUTH_DATABASE_URL", "sqlite:///users.db")
+
+engine = create_engine(
+    DATABASE_URL,
+    connect_args={"check_same_thread": False, "timeout": 15},
+    poolclass=QueuePool,
+    pool_size=int(os.getenv("AUTH_DB_POOL_SIZE", "5")),
+    max_overflow=int(os.getenv("AUTH_DB_MAX_OVERFLOW", "10")),
+    pool_pre_ping=True,
+)
+
+@event.listens_for(engine, "connect")
+def configure_sqlite(dbapi_connection, connection_record):
+    # WAL lets logins read while a registration writes; busy_timeout waits instead of failing on a lock
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.execute("PRAGMA busy_timeout=5000")
+    cursor.close()
+
+Base.metadata.create_all(engine)
+SessionLocal = sessionmaker(autocommit=False, autoflush=False, expire_on_commit=False, bind=engine)
+
+@contextmanager
+def session_scope():
+    # One session per request, always returned to the pool
+    session = SessionLocal()
+    try:
+        yield session
+        session.commit()
+    except Exception:
+        session.rollback()
+        raise
+    finally:
+        session.close()
+
+# =======================
+# Password Hashing
+# =======================
+
+class AuthThrottled(Exception):
+    pass
+
+HASH_WORKERS = int(os.getenv("AUTH_HASH_WORKERS", "4"))
+HASH_QUEUE = int(os.getenv("AUTH_HASH_QUEUE", "16"))
+
+hash_executor = ThreadPoolExecutor(max_workers=HASH_WORKERS, thread_name_prefix="bcrypt")
+# Caps hashing work waiting or running; beyond it requests are refused rather than queued without bound
+hash_slots = threading.BoundedSemaphore(HASH_WORKERS + HASH_QUEUE)
+
+# Compared against when the account does not exist, so response time does not reveal which emails are registered
+DUMMY_HASH = bcrypt.hashpw(b"not-a-real-password", bcrypt.gensalt())
+
+def run_hashing(function, *args):
+    if not hash_slots.acquire(blocking=False):
+        raise AuthThrottled("The server is busy, please try again in a moment.")
+    try:
+        return hash_executor.submit(function, *args).result(timeout=30)
+    finally:
+        hash_slots.release()
+
+def hash_password(password: str) -> bytes:
+    return run_hashing(lambda: bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt()))
+
+def verify_password(password: str, hashed) -> bool:
+    if isinstance(hashed, str):
+        hashed = hashed.encode('utf-8')
+    return run_hashing(lambda: bcrypt.checkpw(password.encode('utf-8'), hashed))
+
+# =======================
+# Throttling
+# =======================
+
+class RateLimiter:
+    """Sliding-window counter per key."""
+
+    def __init__(self, max_events, window):
+        self.max_events = max_events
+        self.window = window
+        self.events = {}
+        self.lock = threading.Lock()
+
+    def prune(self, key, now):
+        # Caller holds the lock
+        events = self.events.get(key)
+        while events and now - events[0] > self.window:
+            events.popleft()
+        if events is not None and not events:
+            del self.events[key]
+
+    def allowed(self, key):
+        now = time.time()
+        with self.lock:
+            self.prune(key, now)
+            return len(self.events.get(key, ())) < self.max_events
+
+    def record(self, key):
+        with self.lock:
+            self.events.setdefault(key, deque()).append(time.time())
+
+    def reset(self, key):
+        with self.lock:
+            self.events.pop(key, None)
+
+ip_limiter = RateLimiter(int(os.getenv("AUTH_IP_ATTEMPTS", "20")), int(os.getenv("AUTH_IP_WINDOW", "60")))
+account_limiter = RateLimiter(int(os.getenv("AUTH_ACCOUNT_FAILURES", "5")), int(os.getenv("AUTH_ACCOUNT_WINDOW", "900")))
+
+def check_throttle(client_ip, email=None):
+    # Callers that cannot identify the client pass None; lumping them under one key would let a
+    # single client use up the budget of everyone else
+    if client_ip is not None and not ip_limiter.allowed(client_ip):
+        logger.warning(f"Throttled auth attempts from {client_ip}")
+        raise AuthThrottled("Too many attempts from your network. Please wait a minute and try again.")
+    if email is not None and not account_limiter.allowed(email.lower()):
+        logger.warning(f"Throttled login attempts for {email}")
+        raise AuthThrottled("Too many failed logins for this account. Please try again later.")
+    if client_ip is not None:
+        ip_limiter.record(client_ip)
+
+# =======================
+# Session Tokens
+# =======================
+
+SECRET_KEY = os.getenv("AUTH_SECRET_KEY")
+if not SECRET_KEY:
+    # A per-process random key would log everyone out on each restart and reject tokens from other replicas
+    raise RuntimeError("AUTH_SECRET_KEY is not set; set it to the same random string on every replica, "
+                       "e.g. python -c 'import secrets; print(secrets.token_hex(32))'")
+TOKEN_TTL = int(os.getenv("AUTH_TOKEN_TTL", str(12 * 3600)))
+
+def b64encode(data: bytes) -> str:
+    return base64.urlsafe_b64encode(data).rstrip(b"=").decode('ascii')
+
+def b64decode(data: str) -> bytes:
+    return base64.urlsafe_b64decode(data + "=" * (-len(data) % 4))
+
+def sign(payload: str) -> str:
+    return b64encode(hmac.new(SECRET_KEY.encode('utf-8'), payload.encode('ascii'), hashlib.sha256).digest())
+
+def issue_token(email: str) -> str:
+    payload = b64encode(json.dumps({"sub": email, "exp": int(time.time()) + TOKEN_TTL}).encode('utf-8'))
+    return f"{payload}.{sign(payload)}"
+
+def verify_token(token: str):
+    # Pure HMAC check: no database and no bcrypt on every Streamlit rerun
+    if not token or token.count('.') != 1:
+        return None
+    payload, signature = token.split('.')
+    if not hmac.compare_digest(signature, sign(payload)):
+        return None
+    try:
+        claims = json.loads(b64decode(payload))
+    except ValueError:
+        return None
+    if claims.get("exp", 0) < time.time():
+        return None
+    return claims.get("sub")
+
+# =======================
+# Authentication Functions
+# =======================
+
+AUTH_SECONDS = metrics.histogram(
+    "pakfashion_auth_seconds",
+    "Registration and login latency, by outcome",
+    ["operation", "outcome"],
+)
+
+@contextmanager
+def auth_timer(operation):
+    # The caller fills in outcome["value"]; throttling and errors are recorded here
+    outcome = {"value": "error"}
+    started = time.perf_counter()
+    try:
+        yield outcome
+    except AuthThrottled:
+        outcome["value"] = "throttled"
+        raise
+    finally:
+        AUTH_SECONDS.observe(time.perf_counter() - started, operation=operation, outcome=outcome["value"])
+
+def register_user(email: str, username: str, password: str, client_ip: str = None) -> bool:
+    with auth_timer("register") as outcome:
+        check_throttle(client_ip)
+        with session_scope() as session:
+            existing_user = session.query(User).filter((User.email == email) | (User.username == username)).first()
+            if existing_user:
+                outcome["value"] = "exists"
+                return False
+        # Hash outside the session so a slow bcrypt call does not hold a pooled connection
+        hashed_pw = hash_password(password)
+        try:
+            with session_scope() as session:
+                session.add(User(email=email, username=username, password=hashed_pw))
+        except IntegrityError:
+            # A concurrent sign-up took the email or username while this one was hashing
+            outcome["value"] = "exists"
+            return False
+        outcome["value"] = "success"
+        return True
+
+def authenticate_user(email: str, password: str, client_ip: str = None):
+    """Return a signed session token on success, None otherwise."""
+    with auth_timer("login") as outcome:
+        check_throttle(client_ip, email)
+        with session_scope() as session:
+            user = session.query(User).filter(User.email == email).first()
+            hashed = user.password if user else None
+        if hashed is None:
+            verify_password(password, DUMMY_HASH)
+            account_limiter.record(email.lower())
+            outcome["value"] = "failure"
+            return None
+        if not verify_password(password, hashed):
+            account_limiter.record(email.lower())
+            outcome["value"] = "failure"
+            return None
+        account_limiter.reset(email.lower())
+        outcome["value"] = "success"
+        return issue_token(email)
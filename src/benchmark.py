@@ -0,0 +1,351 @@
+import os
+import sys
+import json
+import time
+import random
+import asyncio
+import platform
+import argparse
+import tempfile
+import subprocess
+import logging
+import urllib.request
+from datetime import datetime, timezone
+from concurrent.futures import ThreadPoolExecutor
+
+# End-to-end benchmark of FashionBot against local synthetic brand sites (stub_brand_sites.py) with
+# stub embeddings and a stub LLM, so nothing touches real brand sites, Ollama or Groq:
+#
+#   python src/benchmark.py --brands 10 --products 100 --queries 200 --concurrency 8 --output bench.json
+#   python src/benchmark.py --results bench.json --compare baseline.json
+#
+# Scenarios: full scrape into an empty index, incremental refresh after --mutate of the products
+# changed, index rebuild with a cold and a warm embedding cache, and concurrent query load.
+
+logger = logging.getLogger(__name__)
+
+SRC_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+class StubSites:
+    """Runs stub_brand_sites.py in its own process, so serving pages never competes with the crawler's loop."""
+
+    def __init__(self, brands, products, port, latency_ms, jitter_ms, seed):
+        self.brands = brands
+        self.port = port
+        self.command = [
+            sys.executable, os.path.join(SRC_DIR, "stub_brand_sites.py"),
+            "--brands", str(brands), "--products", str(products), "--port", str(port),
+            "--latency-ms", str(latency_ms), "--jitter-ms", str(jitter_ms), "--seed", str(seed),
+        ]
+        self.process = None
+
+    @property
+    def urls(self):
+        return [f"http://127.0.0.{i + 2}:{self.port}/" for i in range(self.brands)]
+
+    def __enter__(self):
+        self.process = subprocess.Popen(self.command, stdout=subprocess.PIPE, text=True)
+        line = self.process.stdout.readline()
+        if not line.startswith("Serving"):
+            self.process.kill()
+            raise RuntimeError(f"Stub brand sites did not start (exit code {self.process.wait()})")
+        return self
+
+    def __exit__(self, *exc_info):
+        self.process.terminate()
+        self.process.wait(timeout=10)
+
+    def call(self, method, path):
+        request = urllib.request.Request(f"{self.urls[0].rstrip('/')}{path}", method=method)
+        with urllib.request.urlopen(request, timeout=30) as response:
+            return json.load(response)
+
+    def mutate(self, fraction):
+        return self.call("POST", f"/_stub/mutate?fraction={fraction}")["changed"]
+
+    def requests_served(self):
+        return self.call("GET", "/_stub/stats")["requests"]
+
+
+def percentile(values, pct):
+    # Nearest rank, so p99 of a small run is an observed value rather than an interpolation
+    ordered = sorted(values)
+    rank = max(1, -(-len(ordered) * pct // 100))
+    return ordered[int(rank) - 1]
+
+
+def latency_summary(seconds):
+    if not seconds:
+        return {"count": 0}
+    return {
+        "count": len(seconds),
+        "mean_ms": round(1000 * sum(seconds) / len(seconds), 1),
+        "p50_ms": round(1000 * percentile(seconds, 50), 1),
+        "p95_ms": round(1000 * percentile(seconds, 95), 1),
+        "p99_ms": round(1000 * percentile(seconds, 99), 1),
+        "max_ms": round(1000 * max(seconds), 1),
+    }
+
+
+def time_index_builds(bot):
+    # Wraps the bound method so the scrape scenarios can report the index build separately from the crawl
+    durations = []
+    prepare_vector_store = bot.prepare_vector_store
+
+    def timed():
+        started = time.perf_counter()
+        try:
+            prepare_vector_store()
+        finally:
+            durations.append(time.perf_counter() - started)
+
+    bot.prepare_vector_store = timed
+    return durations
+
+
+def index_report(bot, cache_before):
+    embedding = bot.last_embedding_stats
+    return {
+        "generation": bot.generation,
+        "chunks": sum(len(ids) for ids in bot.chunk_ids.values()),
+        "sources": len(bot.chunk_ids),
+        "products": len(bot.catalog),
+        "embedded_chunks": embedding.chunks if embedding else 0,
+        "embedding_s": round(embedding.elapsed, 3) if embedding else 0.0,
+        "embedding_chunks_per_s": round(embedding.chunks_per_second, 1) if embedding else 0.0,
+        "embedding_cache_hits": bot.embeddings.hits - cache_before[0],
+        "embedding_cache_misses": bot.embeddings.misses - cache_before[1],
+        "cleaning": bot.last_cleaning_stats.as_dict() if bot.last_cleaning_stats else None,
+    }
+
+
+def run_scrape(bot, sites, index_durations):
+    requests_before = sites.requests_served()
+    cache_before = (bot.embeddings.hits, bot.embeddings.misses)
+    bot.last_embedding_stats = None
+    del index_durations[:]
+    started = time.perf_counter()
+    asyncio.run(bot.scrape_data_from_urls(sites.urls))
+    elapsed = time.perf_counter() - started
+    index_seconds = sum(index_durations)
+    return {
+        "seconds": round(elapsed, 3),
+        "crawl_and_parse_s": round(elapsed - index_seconds, 3),
+        "index_s": round(index_seconds, 3),
+        "crawl": bot.last_crawl_stats.as_dict(),
+        "frontier": bot.last_frontier_summary,
+        "server_requests": sites.requests_served() - requests_before,
+        "changed_sources": len(bot.changed_sources),
+        "removed_sources": len(bot.removed_sources),
+        "index": index_report(bot, cache_before),
+    }
+
+
+def run_index_build(bot, index_durations):
+    results = {}
+    bot.incremental = False
+    try:
+        for label in ("cold_cache", "warm_cache"):
+            if label == "cold_cache":
+                bot.embeddings.clear()
+            cache_before = (bot.embeddings.hits, bot.embeddings.misses)
+            bot.last_embedding_stats = None
+            del index_durations[:]
+            bot.prepare_vector_store()
+            results[label] = {"seconds": round(sum(index_durations), 3), **index_report(bot, cache_before)}
+    finally:
+        bot.incremental = True
+    return results
+
+
+def build_questions(catalog, count, pool_size, llm_share, seed):
+    rng = random.Random(seed)
+    products = [catalog.record(row) for row in range(len(catalog))]
+    if not products:
+        raise RuntimeError("The catalog is empty; the scrape did not pick up any products")
+    pool = []
+    for i in range(pool_size):
+        product = rng.choice(products)
+        category = product["category"] or "suit"
+        if rng.random() < llm_share:
+            # Words the catalog parser cannot map to a filter send the question to the LLM
+            pool.append(f"Which {category} from {product['brand']} would suit a summer wedding guest, option {i}?")
+        else:
+            budget = int(product["price"] or 10000) // 1000 * 1000 + 1000
+            pool.append(f"{product['colour']} {category} from {product['brand']} under {budget}")
+    return [rng.choice(pool) for _ in range(count)]
+
+
+def run_query_load(bot, questions, concurrency, warmup=0):
+    from catalog import parse_catalog_query
+
+    def ask(item):
+        index, question = item
+        path = "catalog" if parse_catalog_query(question, bot.catalog).is_pure_filter else "open_ended"
+        started = time.perf_counter()
+        first_text = None
+        for event in bot.stream_response(question, session_id=f"bench-{index}"):
+            if first_text is None and event["type"] == "text":
+                first_text = time.perf_counter()
+        finished = time.perf_counter()
+        return path, (first_text or finished) - started, finished - started
+
+    # The first retrievals pay one-off costs (opening the collection, loading its index); report them apart
+    warmup_results = [ask((f"warmup-{i}", f"Which fabrics work for a warm-up question number {i}?"))
+                      for i in range(warmup)]
+    cache_before = bot.answer_cache.stats()
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="bench-query") as executor:
+        results = list(executor.map(ask, enumerate(questions)))
+    elapsed = time.perf_counter() - started
+    cache_after = bot.answer_cache.stats()
+    report = {
+        "queries": len(results),
+        "concurrency": concurrency,
+        "seconds": round(elapsed, 3),
+        "queries_per_s": round(len(results) / elapsed, 2) if elapsed else 0.0,
+        "warmup": latency_summary([total for _, _, total in warmup_results]),
+        "first_token": latency_summary([first for _, first, _ in results]),
+        "total": latency_summary([total for _, _, total in results]),
+        "answer_cache": {key: cache_after[key] - cache_before[key]
+                         for key in ("exact_hits", "semantic_hits", "misses")},
+    }
+    for path in ("catalog", "open_ended"):
+        report[path] = latency_summary([total for kind, _, total in results if kind == path])
+    return report
+
+
+def git_revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=SRC_DIR, capture_output=True,
+                              text=True, timeout=5).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def run_benchmark(args):
+    # Everything the bot persists goes to a scratch directory; must be set before main is imported
+    workdir = tempfile.mkdtemp(prefix="pakfashion-bench-")
+    os.environ["INDEX_DIR"] = os.path.join(workdir, "index")
+    os.environ["SCRAPE_STATE_PATH"] = os.path.join(workdir, "scrape_state.json")
+    os.environ["MEMORY_PERSIST_PATH"] = ""
+    from main import FashionBot
+    from stub_models import StubChatModel, StubEmbeddings
+
+    embeddings = StubEmbeddings(args.embed_dim, args.embed_latency_ms, args.embed_per_item_ms)
+    llm = StubChatModel(first_token_ms=args.llm_first_token_ms, per_token_ms=args.llm_per_token_ms,
+                        answer_tokens=args.llm_tokens)
+    results = {
+        "revision": git_revision(),
+        "started_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "environment": {"python": platform.python_version(), "platform": platform.platform(),
+                        "cpus": os.cpu_count()},
+        "config": {key: value for key, value in vars(args).items() if key not in ("output", "results", "compare")},
+        "scenarios": {},
+    }
+    scenarios = results["scenarios"]
+    with StubSites(args.brands, args.products, args.site_port, args.site_latency_ms, args.site_jitter_ms,
+                   args.seed) as sites:
+        bot = FashionBot(embeddings=embeddings, llm=llm)
+        index_durations = time_index_builds(bot)
+        try:
+            print("Full scrape ...", flush=True)
+            scenarios["full_scrape"] = run_scrape(bot, sites, index_durations)
+            changed = sites.mutate(args.mutate)
+            print(f"Incremental refresh ({changed} products changed) ...", flush=True)
+            scenarios["incremental_refresh"] = {"products_changed": changed,
+                                                **run_scrape(bot, sites, index_durations)}
+            print("Index build ...", flush=True)
+            scenarios["index_build"] = run_index_build(bot, index_durations)
+            print(f"Query load ({args.queries} queries, concurrency {args.concurrency}) ...", flush=True)
+            questions = build_questions(bot.catalog, args.queries, args.question_pool, args.llm_share, args.seed)
+            scenarios["query_load"] = run_query_load(bot, questions, args.concurrency, args.warmup)
+        finally:
+            bot.parse_pool.shutdown()
+    return results
+
+
+def flatten(data, prefix=""):
+    items = {}
+    for key, value in data.items():
+        name = f"{prefix}.{key}" if prefix else key
+        if isinstance(value, dict):
+            items.update(flatten(value, name))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            items[name] = value
+    return items
+
+
+def compare(baseline, results):
+    old, new = flatten(baseline["scenarios"]), flatten(results["scenarios"])
+    differing = sorted(key for key in baseline.get("config", {})
+                       if baseline["config"][key] != results.get("config", {}).get(key))
+    if differing:
+        print(f"\nNote: runs used different settings ({', '.join(differing)}); changes are not like for like")
+    print(f"\n{'metric':<58}{'baseline':>12}{'current':>12}{'change':>9}")
+    for name in sorted(old.keys() & new.keys()):
+        if not name.endswith(("_ms", "_s", "seconds")):
+            continue
+        change = f"{100 * (new[name] - old[name]) / old[name]:+.1f}%" if old[name] else "n/a"
+        print(f"{name:<58}{old[name]:>12}{new[name]:>12}{change:>9}")
+
+
+def print_summary(results):
+    scenarios = results["scenarios"]
+    for name in ("full_scrape", "incremental_refresh"):
+        scenario = scenarios[name]
+        print(f"{name}: {scenario['seconds']}s total, {scenario['crawl']['pages_per_s']} pages/s, "
+              f"index {scenario['index_s']}s, {scenario['index']['embedded_chunks']} chunks embedded")
+    for label, build in scenarios["index_build"].items():
+        print(f"index_build ({label}): {build['seconds']}s for {build['chunks']} chunks")
+    load = scenarios["query_load"]
+    print(f"query_load: {load['queries_per_s']} queries/s; total p50/p95/p99 "
+          f"{load['total'].get('p50_ms')}/{load['total'].get('p95_ms')}/{load['total'].get('p99_ms')} ms; "
+          f"first token p50 {load['first_token'].get('p50_ms')} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="End-to-end FashionBot benchmark against local stub sites and models")
+    parser.add_argument("--brands", type=int, default=10)
+    parser.add_argument("--products", type=int, default=100, help="Products per brand")
+    parser.add_argument("--site-port", type=int, default=8700)
+    parser.add_argument("--site-latency-ms", type=float, default=20.0)
+    parser.add_argument("--site-jitter-ms", type=float, default=10.0)
+    parser.add_argument("--mutate", type=float, default=0.1, help="Share of products changed before the refresh")
+    parser.add_argument("--embed-dim", type=int, default=1024)
+    parser.add_argument("--embed-latency-ms", type=float, default=40.0)
+    parser.add_argument("--embed-per-item-ms", type=float, default=2.0)
+    parser.add_argument("--llm-first-token-ms", type=float, default=300.0)
+    parser.add_argument("--llm-per-token-ms", type=float, default=15.0)
+    parser.add_argument("--llm-tokens", type=int, default=60)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--warmup", type=int, default=3, help="Sequential queries run first and reported apart")
+    parser.add_argument("--question-pool", type=int, default=100, help="Distinct questions; repeats hit the answer cache")
+    parser.add_argument("--llm-share", type=float, default=0.6, help="Share of questions that need the LLM")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--output", help="Write results as JSON to this path")
+    parser.add_argument("--results", help="Skip the run and load results from this JSON file")
+    parser.add_argument("--compare", help="Baseline results JSON to compare against")
+    parser.add_argument("--verbose", action="store_true")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO if args.verbose else logging.WARNING,
+                        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+
+    if args.results:
+        with open(args.results, 'r') as file:
+            results = json.load(file)
+    else:
+        results = run_benchmark(args)
+    print_summary(results)
+    if args.output:
+        with open(args.output, 'w') as file:
+            json.dump(results, file, indent=2)
+    if args.compare:
+        with open(args.compare, 'r') as file:
+            compare(json.load(file), results)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,466 @@
+import os
+import re
+import json
+import bisect
+import tempfile
+import logging
+from dataclasses import dataclass, field
+from urllib.parse import urljoin, urlparse
+from image_pipeline import clean_image_urls
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CURRENCY = os.getenv("CATALOG_DEFAULT_CURRENCY", "PKR")
+
+PRODUCT_FIELDS = ("name", "brand", "price", "currency", "colour", "category", "image", "images", "url")
+
+COLOURS = {
+    "black": "black", "white": "white", "off-white": "off-white", "offwhite": "off-white", "cream": "cream",
+    "ivory": "ivory", "beige": "beige", "skin": "skin", "brown": "brown", "rust": "rust", "blue": "blue",
+    "navy": "navy", "teal": "teal", "turquoise": "turquoise", "ferozi": "turquoise", "green": "green",
+    "olive": "olive", "mint": "mint", "emerald": "emerald", "red": "red", "maroon": "maroon", "pink": "pink",
+    "peach": "peach", "coral": "coral", "orange": "orange", "yellow": "yellow", "mustard": "mustard",
+    "purple": "purple", "lilac": "lilac", "lavender": "lavender", "magenta": "magenta", "grey": "grey",
+    "gray": "grey", "silver": "silver", "gold": "gold", "golden": "gold", "multi": "multi",
+}
+
+CATEGORIES = {
+    # Fabrics
+    "lawn": "lawn", "khaddar": "khaddar", "khadar": "khaddar", "chiffon": "chiffon", "cotton": "cotton",
+    "silk": "silk", "linen": "linen", "cambric": "cambric", "karandi": "karandi", "velvet": "velvet",
+    "organza": "organza", "jacquard": "jacquard", "marina": "marina", "net": "net", "denim": "denim",
+    # Garments and lines
+    "suit": "suit", "kurta": "kurta", "kurti": "kurti", "kameez": "kameez", "shalwar": "shalwar",
+    "trouser": "trouser", "pant": "trouser", "dupatta": "dupatta", "shirt": "shirt", "dress": "dress",
+    "abaya": "abaya", "saree": "saree", "lehenga": "lehenga", "gharara": "gharara", "sharara": "sharara",
+    "shawl": "shawl", "stole": "shawl", "scarf": "scarf", "top": "top", "tunic": "tunic", "co-ord": "co-ord",
+    "pret": "pret", "unstitched": "unstitched", "stitched": "stitched", "formal": "formal", "bridal": "bridal",
+    "shoe": "shoes", "shoes": "shoes", "sandal": "shoes", "khussa": "shoes", "bag": "bag", "clutch": "bag",
+    "jewellery": "jewellery", "jewelry": "jewellery", "fragrance": "fragrance", "perfume": "fragrance",
+}
+
+FILLER_WORDS = {
+    "show", "me", "find", "list", "get", "give", "see", "all", "any", "the", "a", "an", "some", "from", "by",
+    "in", "of", "for", "with", "under", "below", "above", "over", "less", "more", "than", "between", "and",
+    "to", "rs", "pkr", "price", "priced", "prices", "cheap", "cheaper", "cheapest", "lowest", "highest",
+    "expensive", "most", "least", "sorted", "sort", "order", "what", "which", "are", "is", "do", "does", "you",
+    "have", "has", "i", "want", "need", "looking", "please", "product", "products", "item", "items",
+    "available", "colour", "color", "colours", "colors", "range", "within", "upto", "up", "max", "maximum",
+    "min", "minimum", "least", "at", "high", "low", "top", "new", "latest", "brand", "brands", "collection",
+    "can", "buy", "shop", "options", "option", "there", "on", "sale", "or", "k", "rupees", "budget",
+}
+
+
+def parse_price(value):
+    if value is None:
+        return None
+    if isinstance(value, (int, float)):
+        return float(value)
+    match = re.search(r'\d[\d,]*(?:\.\d+)?', str(value))
+    if not match:
+        return None
+    try:
+        return float(match.group(0).replace(',', ''))
+    except ValueError:
+        return None
+
+
+def brand_from_url(url):
+    host = urlparse(url).netloc.lower()
+    labels = [label for label in host.split('.') if label not in ("www", "pk", "com", "co", "shop", "store", "online")]
+    return labels[0].capitalize() if labels else host
+
+
+def find_terms(text, vocabulary):
+    words = re.findall(r"[a-z][a-z\-]*", (text or "").lower())
+    found = []
+    for word in words:
+        term = vocabulary.get(word) or (vocabulary.get(word[:-1]) if word.endswith('s') else None)
+        if word.endswith('es') and not term:
+            term = vocabulary.get(word[:-2])
+        if term and term not in found:
+            found.append(term)
+    return found
+
+
+def make_product(url, name, brand=None, price=None, currency=None, colour=None, category=None, images=None, product_url=None):
+    if not name:
+        return None
+    images = clean_image_urls(url, images or [])
+    text = f"{name} {category or ''}"
+    colour = (colour or "").strip().lower() or next(iter(find_terms(name, COLOURS)), "")
+    categories = find_terms(text, CATEGORIES)
+    return {
+        "name": " ".join(str(name).split()),
+        "brand": (brand or brand_from_url(url)).strip(),
+        "price": parse_price(price),
+        "currency": (currency or DEFAULT_CURRENCY).upper(),
+        "colour": COLOURS.get(colour, colour),
+        "category": (category or (categories[0] if categories else "")).strip().lower(),
+        "tags": categories,
+        "image": images[0] if images else "",
+        "images": images,
+        "url": urljoin(url, product_url) if product_url else url,
+    }
+
+
+# =======================
+# Extraction
+# =======================
+
+def iter_json_ld_nodes(data):
+    if isinstance(data, list):
+        for item in data:
+            yield from iter_json_ld_nodes(item)
+    elif isinstance(data, dict):
+        yield data
+        if "@graph" in data:
+            yield from iter_json_ld_nodes(data["@graph"])
+        if isinstance(data.get("itemListElement"), list):
+            for element in data["itemListElement"]:
+                if isinstance(element, dict):
+                    yield from iter_json_ld_nodes(element.get("item", element))
+
+
+def first(value):
+    if isinstance(value, list):
+        return value[0] if value else None
+    return value
+
+
+def name_of(value):
+    value = first(value)
+    if isinstance(value, dict):
+        return value.get("name")
+    return value
+
+
+def extract_json_ld(url, soup):
+    products = []
+    for script in soup.find_all('script', type='application/ld+json'):
+        try:
+            data = json.loads(script.string or script.get_text() or "")
+        except ValueError:
+            continue
+        for node in iter_json_ld_nodes(data):
+            node_type = node.get("@type")
+            types = node_type if isinstance(node_type, list) else [node_type]
+            if "Product" not in types:
+                continue
+            offer = first(node.get("offers")) or {}
+            if isinstance(offer, dict) and offer.get("@type") == "AggregateOffer":
+                price = offer.get("lowPrice") or offer.get("price")
+            else:
+                price = offer.get("price") if isinstance(offer, dict) else None
+            images = node.get("image")
+            images = [image.get("url") if isinstance(image, dict) else image
+                      for image in (images if isinstance(images, list) else [images])]
+            product = make_product(
+                url,
+                name=node.get("name"),
+                brand=name_of(node.get("brand")),
+                price=price,
+                currency=offer.get("priceCurrency") if isinstance(offer, dict) else None,
+                colour=name_of(node.get("color")),
+                category=name_of(node.get("category")),
+                images=images,
+                product_url=node.get("url") or (offer.get("url") if isinstance(offer, dict) else None),
+            )
+            if product:
+                products.append(product)
+    return products
+
+
+def extract_open_graph(url, soup):
+    meta = {}
+    for tag in soup.find_all('meta'):
+        key = tag.get('property') or tag.get('name')
+        if key and tag.get('content') and key not in meta:
+            meta[key] = tag['content']
+    if meta.get("og:type", "").lower() not in ("product", "og:product", "product.item"):
+        return []
+    product = make_product(
+        url,
+        name=meta.get("og:title"),
+        brand=meta.get("product:brand") or meta.get("og:site_name"),
+        price=meta.get("product:price:amount") or meta.get("og:price:amount"),
+        currency=meta.get("product:price:currency") or meta.get("og:price:currency"),
+        colour=meta.get("product:color"),
+        category=meta.get("product:category"),
+        images=[meta.get("og:image")],
+        product_url=meta.get("og:url"),
+    )
+    return [product] if product else []
+
+
+def extract_products(url, soup):
+    # JSON-LD is the richest source; OpenGraph only fills in when a page has no structured product data
+    return extract_json_ld(url, soup) or extract_open_graph(url, soup)
+
+
+def shopify_products_url(url, page=1):
+    parsed = urlparse(url)
+    return f"{parsed.scheme}://{parsed.netloc}/products.json?limit=250&page={page}"
+
+
+def parse_shopify_products(url, text):
+    try:
+        data = json.loads(text)
+    except ValueError:
+        return None
+    if not isinstance(data, dict) or not isinstance(data.get("products"), list):
+        return None
+    products = []
+    for item in data["products"]:
+        variants = item.get("variants") or [{}]
+        prices = [parse_price(variant.get("price")) for variant in variants]
+        prices = [price for price in prices if price is not None]
+        colour = None
+        for option in item.get("options") or []:
+            if isinstance(option, dict) and option.get("name", "").lower() in ("color", "colour"):
+                colour = first(option.get("values"))
+        images = [image.get("src") if isinstance(image, dict) else image for image in item.get("images") or []]
+        product = make_product(
+            url,
+            name=item.get("title"),
+            brand=item.get("vendor"),
+            price=min(prices) if prices else None,
+            colour=colour,
+            category=item.get("product_type"),
+            images=images,
+            product_url=f"/products/{item['handle']}" if item.get("handle") else None,
+        )
+        if product:
+            products.append(product)
+    return products
+
+
+# =======================
+# Columnar catalog
+# =======================
+
+class ProductCatalog:
+    """Immutable column store of product records with brand, category, colour and price indexes."""
+
+    def __init__(self, records=()):
+        columns = {name: [] for name in PRODUCT_FIELDS}
+        self.by_brand, self.by_category, self.by_colour = {}, {}, {}
+        self.brand_names = {}
+        # The only images the thumbnail endpoint will fetch, so it cannot be used as an open proxy
+        self.image_urls = set()
+        seen = set()
+        for record in records:
+            # Listing pages share one URL across many products, so the name is part of the identity
+            key = (record.get("url"), record.get("name", "").lower())
+            if key in seen:
+                continue
+            seen.add(key)
+            row = len(columns["name"])
+            for name in PRODUCT_FIELDS:
+                columns[name].append(record.get(name))
+            # Records saved before "images" existed only carry the first image
+            if columns["images"][row] is None:
+                columns["images"][row] = [record["image"]] if record.get("image") else []
+            self.image_urls.update(columns["images"][row])
+            brand_key = record["brand"].lower()
+            self.brand_names.setdefault(brand_key, record["brand"])
+            self.by_brand.setdefault(brand_key, []).append(row)
+            for tag in set(record.get("tags") or []) | ({record["category"]} if record.get("category") else set()):
+                self.by_category.setdefault(tag, []).append(row)
+            if record.get("colour"):
+                self.by_colour.setdefault(record["colour"], []).append(row)
+        self.columns = columns
+        priced = sorted((price, row) for row, price in enumerate(columns["price"]) if price is not None)
+        self.sorted_prices = [price for price, _ in priced]
+        self.price_rows = [row for _, row in priced]
+        # Brand aliases with spaces removed, so "junaid jamshed" also matches junaidjamshed.com
+        self.brand_aliases = {key.replace(' ', ''): key for key in self.by_brand}
+
+    def __len__(self):
+        return len(self.columns["name"])
+
+    def record(self, row):
+        return {name: self.columns[name][row] for name in PRODUCT_FIELDS}
+
+    def rows_in_price_range(self, low=None, high=None):
+        start = 0 if low is None else bisect.bisect_left(self.sorted_prices, low)
+        end = len(self.sorted_prices) if high is None else bisect.bisect_right(self.sorted_prices, high)
+        return self.price_rows[start:end]
+
+    def search(self, query):
+        candidates = None
+        for rows in self.filter_sets(query):
+            candidates = set(rows) if candidates is None else candidates & set(rows)
+            if not candidates:
+                return []
+        rows = range(len(self)) if candidates is None else candidates
+        prices = self.columns["price"]
+        if query.sort == "desc":
+            rows = sorted(rows, key=lambda row: (prices[row] is None, -(prices[row] or 0)))
+        elif query.sort == "asc" or query.has_price_filter:
+            rows = sorted(rows, key=lambda row: (prices[row] is None, prices[row] or 0))
+        else:
+            rows = sorted(rows)
+        return [self.record(row) for row in rows[:query.limit]]
+
+    def filter_sets(self, query):
+        if query.brands:
+            yield [row for brand in query.brands for row in self.by_brand.get(brand, [])]
+        for category in query.categories:
+            yield self.by_category.get(category, [])
+        if query.colours:
+            yield [row for colour in query.colours for row in self.by_colour.get(colour, [])]
+        if query.has_price_filter:
+            yield self.rows_in_price_range(query.min_price, query.max_price)
+
+
+def load_product_sources(path):
+    if not os.path.exists(path):
+        return {}
+    try:
+        with open(path, 'r') as file:
+            return json.load(file)
+    except (OSError, ValueError) as e:
+        logger.warning(f"Could not read product catalog from {path}: {e}")
+        return {}
+
+
+def save_product_sources(path, product_sources):
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.catalog.')
+    with os.fdopen(fd, 'w') as file:
+        json.dump(product_sources, file)
+    os.replace(tmp_path, path)
+
+
+def build_catalog(product_sources):
+    return ProductCatalog(record for records in product_sources.values() for record in records)
+
+
+# =======================
+# Query parsing
+# =======================
+
+@dataclass
+class CatalogQuery:
+    brands: list = field(default_factory=list)
+    categories: list = field(default_factory=list)
+    colours: list = field(default_factory=list)
+    min_price: float = None
+    max_price: float = None
+    sort: str = None
+    limit: int = 10
+    residual: list = field(default_factory=list)
+
+    @property
+    def has_price_filter(self):
+        return self.min_price is not None or self.max_price is not None
+
+    @property
+    def has_filters(self):
+        return bool(self.brands or self.categories or self.colours or self.has_price_filter or self.sort)
+
+    @property
+    def is_pure_filter(self):
+        # Nothing left over that needs language understanding
+        return self.has_filters and not self.residual
+
+    @property
+    def entities(self):
+        # What the question names; two questions naming different things never share an answer
+        return (tuple(sorted(self.brands)), tuple(sorted(self.categories)), tuple(sorted(self.colours)),
+                self.min_price, self.max_price, self.sort)
+
+    def describe(self):
+        parts = []
+        if self.colours:
+            parts.append("/".join(self.colours))
+        if self.categories:
+            parts.append(" ".join(self.categories))
+        if self.brands:
+            parts.append("from " + "/".join(self.brands))
+        if self.min_price is not None and self.max_price is not None:
+            parts.append(f"between {self.min_price:,.0f} and {self.max_price:,.0f}")
+        elif self.max_price is not None:
+            parts.append(f"under {self.max_price:,.0f}")
+        elif self.min_price is not None:
+            parts.append(f"over {self.min_price:,.0f}")
+        return " ".join(parts) or "all products"
+
+
+# The "k" suffix must end the word, or "under 5000 khaadi" would read as 5,000,000 and lose the brand
+AMOUNT = r'(?:rs\.?|pkr)?\s*(\d[\d,]*(?:\.\d+)?)\s*(k\b)?'
+
+
+def parse_amount(number, thousands):
+    value = float(number.replace(',', ''))
+    return value * 1000 if thousands else value
+
+
+def parse_catalog_query(question, catalog):
+    text = question.lower()
+    query = CatalogQuery()
+
+    between = re.search(rf'between\s+{AMOUNT}\s+(?:and|to|-)\s+{AMOUNT}', text) or \
+        re.search(rf'(?:rs\.?|pkr)\s*(\d[\d,]*(?:\.\d+)?)\s*(k\b)?\s*(?:-|to)\s*{AMOUNT}', text)
+    if between:
+        query.min_price = parse_amount(between.group(1), between.group(2))
+        query.max_price = parse_amount(between.group(3), between.group(4))
+        text = text.replace(between.group(0), ' ')
+    for pattern, attribute in ((rf'(?:under|below|less than|cheaper than|up ?to|within|max(?:imum)?)\s+{AMOUNT}', "max_price"),
+                               (rf'(?:over|above|more than|at least|min(?:imum)?|starting from)\s+{AMOUNT}', "min_price")):
+        match = re.search(pattern, text)
+        if match:
+            setattr(query, attribute, parse_amount(match.group(1), match.group(2)))
+            text = text.replace(match.group(0), ' ')
+
+    top = re.search(r'\btop\s+(\d+)\b', text)
+    if top:
+        query.limit = max(1, min(50, int(top.group(1))))
+        text = text.replace(top.group(0), ' ')
+    if re.search(r'cheapest|lowest price|low to high|least expensive|affordable', text):
+        query.sort = "asc"
+    elif re.search(r'most expensive|highest price|high to low|priciest|premium', text):
+        query.sort = "desc"
+
+    words = re.findall(r"[a-z][a-z\-]*|\d+", text)
+    consumed = set()
+    # Brands can span several words ("junaid jamshed"), so try joined n-grams first
+    for size in (3, 2, 1):
+        for start in range(len(words) - size + 1):
+            span = range(start, start + size)
+            if consumed & set(span):
+                continue
+            alias = "".join(words[start:start + size])
+            brand = catalog.brand_aliases.get(alias)
+            if brand:
+                query.brands.append(brand)
+                consumed.update(span)
+    for index, word in enumerate(words):
+        if index in consumed:
+            continue
+        colour = find_terms(word, COLOURS)
+        category = find_terms(word, CATEGORIES)
+        if colour:
+            query.colours.extend(c for c in colour if c not in query.colours)
+        elif category:
+            query.categories.extend(c for c in category if c not in query.categories)
+        elif word not in FILLER_WORDS and not word.isdigit():
+            query.residual.append(word)
+    return query
+
+
+def format_products(products, currency_fallback=DEFAULT_CURRENCY):
+    lines = []
+    for i, product in enumerate(products, start=1):
+        price = f"{product['currency'] or currency_fallback} {product['price']:,.0f}" if product["price"] is not None else "price not listed"
+        details = ", ".join(part for part in (product["colour"], product["category"]) if part)
+        line = f"{i}. **{product['name']}** ({product['brand']}) - {price}"
+        if details:
+            line += f" - {details}"
+        line += f"\n   {product['url']}"
+        if product["image"]:
+            line += f"\n   Image: {product['image']}"
+        lines.append(line)
+    return "\n".join(lines)
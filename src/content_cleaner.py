@@ -0,0 +1,248 @@
+import os
+import re
+import json
+import hashlib
+import tempfile
+import logging
+from dataclasses import dataclass
+import numpy as np
+from frontier import site_of
+
+logger = logging.getLogger(__name__)
+
+# Regions that never hold product information
+BOILERPLATE_TAGS = ["script", "style", "noscript", "template", "svg", "iframe", "nav", "footer", "aside"]
+BOILERPLATE_ROLES = {"navigation", "banner", "contentinfo", "dialog", "alertdialog"}
+# Matched against whole class and id names: the hint itself or a name it prefixes ("cookie-banner",
+# "modal__overlay"), never a name that merely contains it, like Dawn's "product__modal-opener"
+# around the main product image
+BOILERPLATE_HINT = re.compile(
+    r"(cookie|consent|gdpr|newsletter|popup|modal|announcement|breadcrumbs?|navbar|nav-menu|mega-?menu"
+    r"|drawer|site-header|site-footer|social|share-buttons)([-_].*)?",
+    re.I,
+)
+
+
+def strip_boilerplate(soup):
+    """Remove markup regions (scripts, menus, footers, banners, dialogs) from a parsed page in place."""
+    for tag in soup.find_all(BOILERPLATE_TAGS):
+        tag.decompose()
+    # A <header> inside the main content is usually the product title, not the site header
+    for tag in soup.find_all("header"):
+        if not tag.find_parent(["main", "article"]):
+            tag.decompose()
+    for tag in soup.find_all(True):
+        if tag.decomposed or tag.name in ("html", "body", "main"):
+            continue
+        attrs = tag.attrs or {}
+        names = [attrs.get("id") or ""] + list(attrs.get("class") or [])
+        if attrs.get("role") in BOILERPLATE_ROLES or any(BOILERPLATE_HINT.fullmatch(name) for name in names):
+            tag.decompose()
+
+
+def block_hash(block):
+    return hashlib.blake2b(" ".join(block.lower().split()).encode('utf-8'), digest_size=8).hexdigest()
+
+
+class BoilerplateFilter:
+    """Learns text blocks repeated across a site's pages (promo bars, shipping notices, size guides).
+
+    A block is boilerplate for a site when it appears on at least min_share of the site's pages
+    parsed in a cycle, and on at least min_pages of them. Sites with too few pages parsed in a cycle
+    keep what was learned before. So do sites passed as keep_sites to learn(): an incremental
+    refresh only parses the pages that changed, often a few products sharing fabric and care text,
+    and the rules must stay the ones every indexed chunk was cleaned with.
+    """
+
+    def __init__(self, path=None, min_pages=5, min_share=0.5, min_chars=15):
+        self.path = path
+        self.min_pages = min_pages
+        self.min_share = min_share
+        self.min_chars = min_chars
+        self.learned = {}
+        self.observed = {}
+        self.load()
+
+    def load(self):
+        if not self.path or not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, 'r') as file:
+                self.learned = {site: set(blocks) for site, blocks in json.load(file).items()}
+        except (OSError, ValueError) as e:
+            logger.warning(f"Could not read learned boilerplate from {self.path}: {e}")
+
+    def save(self):
+        if not self.path:
+            return
+        directory = os.path.dirname(os.path.abspath(self.path))
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.boilerplate.')
+        with os.fdopen(fd, 'w') as file:
+            json.dump({site: sorted(blocks) for site, blocks in self.learned.items()}, file)
+        os.replace(tmp_path, self.path)
+
+    def candidate_blocks(self, text):
+        return {block_hash(block) for block in text.split("\n") if len(block) >= self.min_chars}
+
+    def observe(self, url, text):
+        entry = self.observed.setdefault(site_of(url), [0, {}])
+        entry[0] += 1
+        counts = entry[1]
+        for key in self.candidate_blocks(text):
+            counts[key] = counts.get(key, 0) + 1
+
+    def learn(self, keep_sites=()):
+        for site, (pages, counts) in self.observed.items():
+            if pages < self.min_pages or site in keep_sites:
+                continue
+            threshold = max(self.min_pages, pages * self.min_share)
+            self.learned[site] = {key for key, count in counts.items() if count >= threshold}
+            logger.info(f"Learned {len(self.learned[site])} repeated blocks for {site} from {pages} pages")
+        self.observed = {}
+        self.save()
+
+    def clean(self, url, text):
+        learned = self.learned.get(site_of(url))
+        if not learned:
+            return text
+        return "\n".join(block for block in text.split("\n")
+                         if len(block) < self.min_chars or block_hash(block) not in learned)
+
+
+def load_duplicate_sources(path, generation):
+    """Pages with chunks skipped as near duplicates, mapped to the source keys of the pages they duplicate.
+
+    Returns None when the file is missing or was written for another generation.
+    """
+    if not os.path.exists(path):
+        return None
+    try:
+        with open(path, 'r') as file:
+            data = json.load(file)
+    except (OSError, ValueError) as e:
+        logger.warning(f"Could not read near-duplicate sources from {path}: {e}")
+        return None
+    if data.get("generation") != generation:
+        return None
+    return {source: set(keys) for source, keys in data["sources"].items()}
+
+
+def save_duplicate_sources(path, generation, duplicate_sources):
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.duplicates.')
+    with os.fdopen(fd, 'w') as file:
+        json.dump({"generation": generation,
+                   "sources": {source: sorted(keys) for source, keys in duplicate_sources.items()}}, file)
+    os.replace(tmp_path, path)
+
+
+class NearDuplicateIndex:
+    """MinHash signatures over word shingles with LSH banding, updated per chunk like BM25Index.
+
+    Candidates sharing a band are confirmed by the fraction of matching signature values, an
+    estimate of the Jaccard similarity of their shingle sets.
+    """
+
+    PRIME = (1 << 31) - 1
+
+    def __init__(self, num_perm=64, bands=8, threshold=0.85, shingle_size=3, seed=1):
+        self.num_perm = num_perm
+        self.bands = bands
+        self.threshold = threshold
+        self.shingle_size = shingle_size
+        self.seed = seed
+        rng = np.random.default_rng(seed)
+        self.a = rng.integers(1, self.PRIME, num_perm, dtype=np.uint64)
+        self.b = rng.integers(0, self.PRIME, num_perm, dtype=np.uint64)
+        self.signatures = {}
+        self.buckets = {}
+
+    def __len__(self):
+        return len(self.signatures)
+
+    def copy(self):
+        clone = NearDuplicateIndex(self.num_perm, self.bands, self.threshold, self.shingle_size, self.seed)
+        clone.signatures = dict(self.signatures)
+        clone.buckets = {key: set(ids) for key, ids in self.buckets.items()}
+        return clone
+
+    def signature(self, text):
+        words = re.findall(r"\w+", text.lower())
+        size = self.shingle_size
+        shingles = {" ".join(words[i:i + size]) for i in range(max(1, len(words) - size + 1))}
+        hashes = np.array(
+            [int.from_bytes(hashlib.blake2b(s.encode('utf-8'), digest_size=8).digest(), 'little') % self.PRIME
+             for s in shingles],
+            dtype=np.uint64,
+        )
+        # a * x stays below 2**62, so the universal hash never overflows uint64
+        return ((self.a[:, None] * hashes[None, :] + self.b[:, None]) % self.PRIME).min(axis=1).astype(np.uint32)
+
+    def band_keys(self, signature):
+        return [(band, rows.tobytes()) for band, rows in enumerate(np.split(signature, self.bands))]
+
+    def find(self, signature):
+        """Id of an indexed chunk that is a near duplicate of signature, or None."""
+        candidates = set()
+        for key in self.band_keys(signature):
+            candidates |= self.buckets.get(key, set())
+        for doc_id in candidates:
+            if np.mean(self.signatures[doc_id] == signature) >= self.threshold:
+                return doc_id
+        return None
+
+    def add(self, doc_id, signature):
+        if doc_id in self.signatures:
+            self.remove(doc_id)
+        self.signatures[doc_id] = signature
+        for key in self.band_keys(signature):
+            self.buckets.setdefault(key, set()).add(doc_id)
+
+    def remove(self, doc_id):
+        signature = self.signatures.pop(doc_id, None)
+        if signature is None:
+            return
+        for key in self.band_keys(signature):
+            ids = self.buckets.get(key)
+            if ids is not None:
+                ids.discard(doc_id)
+                if not ids:
+                    del self.buckets[key]
+
+
+@dataclass
+class CleaningStats:
+    pages: int = 0
+    raw_chars: int = 0
+    page_chars: int = 0
+    chunks_before: int = 0
+    chunks_after_boilerplate: int = 0
+    chunks_indexed: int = 0
+    chunk_chars_before: int = 0
+    chunk_chars_indexed: int = 0
+
+    @staticmethod
+    def reduction(before, after):
+        return 100.0 * (before - after) / before if before else 0.0
+
+    def as_dict(self):
+        return {
+            "pages": self.pages,
+            "raw_chars": self.raw_chars,
+            "page_chars": self.page_chars,
+            "chunks_before": self.chunks_before,
+            "chunks_after_boilerplate": self.chunks_after_boilerplate,
+            "chunks_indexed": self.chunks_indexed,
+            "chunk_chars_before": self.chunk_chars_before,
+            "chunk_chars_indexed": self.chunk_chars_indexed,
+            "chunk_reduction_pct": round(self.reduction(self.chunks_before, self.chunks_indexed), 1),
+        }
+
+    def summary(self):
+        return (f"{self.pages} pages, page text {self.raw_chars / 1024:.0f} -> {self.page_chars / 1024:.0f} KiB "
+                f"after stripping markup regions (-{self.reduction(self.raw_chars, self.page_chars):.0f}%); "
+                f"chunks {self.chunks_before} -> {self.chunks_after_boilerplate} after repeated blocks -> "
+                f"{self.chunks_indexed} after near duplicates (-{self.reduction(self.chunks_before, self.chunks_indexed):.0f}%); "
+                f"indexed text {self.chunk_chars_before / 1024:.0f} -> {self.chunk_chars_indexed / 1024:.0f} KiB")
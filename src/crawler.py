@@ -0,0 +1,209 @@
+import os
+import time
+import random
+import asyncio
+import logging
+from dataclasses import dataclass, field
+from email.utils import parsedate_to_datetime
+from urllib.parse import urlparse
+import aiohttp
+
+logger = logging.getLogger(__name__)
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+def env_setting(name, default, cast=int):
+    # Read at construction time so values from .env (loaded by main) are honoured
+    return field(default_factory=lambda: cast(os.getenv(name, default)))
+
+
+@dataclass
+class CrawlConfig:
+    concurrency: int = env_setting("CRAWL_CONCURRENCY", "32")
+    per_host: int = env_setting("CRAWL_PER_HOST", "2")
+    connect_timeout: float = env_setting("CRAWL_CONNECT_TIMEOUT", "10", float)
+    read_timeout: float = env_setting("CRAWL_READ_TIMEOUT", "30", float)
+    total_timeout: float = env_setting("CRAWL_TOTAL_TIMEOUT", "60", float)
+    max_retries: int = env_setting("CRAWL_MAX_RETRIES", "3")
+    backoff_base: float = env_setting("CRAWL_BACKOFF_BASE", "1.0", float)
+    backoff_max: float = env_setting("CRAWL_BACKOFF_MAX", "30", float)
+    max_bytes: int = env_setting("CRAWL_MAX_BYTES", str(5 * 1024 * 1024))
+    user_agent: str = env_setting("CRAWL_USER_AGENT", "PakFashionBot/1.0 (+https://github.com/The-Hexaa/PakFashion)", str)
+    dns_cache_ttl: int = 300
+    keepalive_timeout: float = 30
+
+
+@dataclass
+class FetchResult:
+    url: str
+    status: int = 0
+    headers: dict = field(default_factory=dict)
+    body: str = None
+    size: int = 0
+    error: str = None
+
+    @property
+    def ok(self):
+        return self.status == 200 and self.body is not None
+
+
+@dataclass
+class CrawlStats:
+    pages: int = 0
+    not_modified: int = 0
+    failures: int = 0
+    retries: int = 0
+    bytes: int = 0
+    started: float = field(default_factory=time.monotonic)
+    finished: float = None
+
+    @property
+    def elapsed(self):
+        return (self.finished or time.monotonic()) - self.started
+
+    @property
+    def pages_per_second(self):
+        return self.pages / self.elapsed if self.elapsed > 0 else 0.0
+
+    def as_dict(self):
+        return {
+            "pages": self.pages,
+            "not_modified": self.not_modified,
+            "failures": self.failures,
+            "retries": self.retries,
+            "bytes": self.bytes,
+            "elapsed_s": round(self.elapsed, 3),
+            "pages_per_s": round(self.pages_per_second, 2),
+        }
+
+    def summary(self):
+        return (f"{self.pages} pages, {self.not_modified} not modified, {self.failures} failures, "
+                f"{self.retries} retries, {self.bytes / 1024:.0f} KiB in {self.elapsed:.1f}s "
+                f"({self.pages_per_second:.2f} pages/s)")
+
+
+class BodyTooLarge(Exception):
+    pass
+
+
+class Crawler:
+    """Pooled HTTP fetcher with global and per-host limits, timeouts, retries and a body size cap."""
+
+    def __init__(self, config=None):
+        self.config = config or CrawlConfig()
+        self.session = None
+        self.global_limit = None
+        self.host_limits = {}
+        self.stats = CrawlStats()
+
+    async def __aenter__(self):
+        connector = aiohttp.TCPConnector(
+            limit=self.config.concurrency,
+            limit_per_host=self.config.per_host,
+            ttl_dns_cache=self.config.dns_cache_ttl,
+            keepalive_timeout=self.config.keepalive_timeout,
+            enable_cleanup_closed=True,
+        )
+        timeout = aiohttp.ClientTimeout(
+            total=self.config.total_timeout,
+            sock_connect=self.config.connect_timeout,
+            sock_read=self.config.read_timeout,
+        )
+        self.session = aiohttp.ClientSession(
+            connector=connector,
+            timeout=timeout,
+            headers={"User-Agent": self.config.user_agent},
+        )
+        self.global_limit = asyncio.Semaphore(self.config.concurrency)
+        self.host_limits = {}
+        self.stats = CrawlStats()
+        return self
+
+    async def __aexit__(self, *exc_info):
+        self.stats.finished = time.monotonic()
+        await self.session.close()
+        self.session = None
+
+    def host_limit(self, url):
+        host = urlparse(url).netloc.lower()
+        if host not in self.host_limits:
+            self.host_limits[host] = asyncio.Semaphore(self.config.per_host)
+        return self.host_limits[host]
+
+    def backoff_delay(self, attempt, retry_after=None):
+        ceiling = min(self.config.backoff_max, self.config.backoff_base * (2 ** attempt))
+        # Full jitter keeps retries from many pages of the same host from lining up
+        delay = random.uniform(0, ceiling)
+        if retry_after:
+            delay = max(delay, min(self.parse_retry_after(retry_after), self.config.backoff_max))
+        return delay
+
+    @staticmethod
+    def parse_retry_after(value):
+        try:
+            return float(value)
+        except ValueError:
+            pass
+        try:
+            return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+        except (TypeError, ValueError):
+            return 0.0
+
+    async def read_body(self, response):
+        declared = response.content_length
+        if declared is not None and declared > self.config.max_bytes:
+            raise BodyTooLarge(f"declared size {declared} exceeds {self.config.max_bytes} bytes")
+        buffer = bytearray()
+        async for chunk in response.content.iter_chunked(64 * 1024):
+            buffer.extend(chunk)
+            if len(buffer) > self.config.max_bytes:
+                raise BodyTooLarge(f"body exceeds {self.config.max_bytes} bytes")
+        try:
+            encoding = response.get_encoding()
+        except RuntimeError:
+            encoding = 'utf-8'
+        return bytes(buffer).decode(encoding, errors='replace'), len(buffer)
+
+    async def fetch(self, url, headers=None):
+        result = FetchResult(url=url)
+        retry_after = None
+        for attempt in range(self.config.max_retries + 1):
+            if attempt:
+                # Back off outside the semaphores so other hosts keep making progress
+                self.stats.retries += 1
+                await asyncio.sleep(self.backoff_delay(attempt - 1, retry_after))
+                result = FetchResult(url=url)
+                retry_after = None
+            try:
+                async with self.host_limit(url), self.global_limit:
+                    async with self.session.get(url, headers=headers or {}) as response:
+                        result.status = response.status
+                        result.headers = response.headers.copy()
+                        if response.status in RETRY_STATUSES:
+                            retry_after = response.headers.get("Retry-After")
+                            logger.debug(f"Got {response.status} from {url} (attempt {attempt + 1})")
+                        elif response.status == 200:
+                            result.body, result.size = await self.read_body(response)
+                            self.stats.pages += 1
+                            self.stats.bytes += result.size
+                            return result
+                        elif response.status == 304:
+                            self.stats.not_modified += 1
+                            return result
+                        else:
+                            self.stats.failures += 1
+                            return result
+            except BodyTooLarge as e:
+                result.error = str(e)
+                self.stats.failures += 1
+                logger.warning(f"Skipping {url}: {e}")
+                return result
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                result.error = f"{type(e).__name__}: {e}"
+                logger.debug(f"Request to {url} failed (attempt {attempt + 1}): {result.error}")
+        # Only retryable statuses and network errors get here, once every attempt is used up
+        self.stats.failures += 1
+        logger.error(f"Giving up on {url} after {self.config.max_retries + 1} attempts: "
+                     f"{result.error or f'status {result.status}'}")
+        return result
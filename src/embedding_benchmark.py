@@ -0,0 +1,64 @@
+import os
+import json
+import argparse
+import logging
+from dotenv import load_dotenv
+from langchain_ollama import OllamaEmbeddings
+from langchain.schema import Document
+from embedding_pipeline import EmbeddingPipeline
+
+# Embedding throughput for a grid of batch sizes and in-flight limits. Point OLLAMA_URL at
+# stub_embed_server.py to benchmark the pipeline itself, or at a real Ollama host to size it.
+#
+#   OLLAMA_URL=http://localhost:11500 python src/embedding_benchmark.py --chunks 2000 --batch-sizes 8,32,64 --in-flight 1,4,8
+
+logger = logging.getLogger(__name__)
+
+
+def synthetic_chunks(count):
+    return [
+        Document(
+            page_content=f"Chunk {i}: embroidered lawn suit with chiffon dupatta, article KS-{i:05d}, "
+                         f"available in {('black', 'blue', 'maroon', 'green')[i % 4]}. " * 6,
+            metadata={"source": f"https://brand{i % 50}.example/page"},
+        )
+        for i in range(count)
+    ]
+
+
+def main():
+    load_dotenv()
+    logging.basicConfig(level=logging.WARNING)
+    parser = argparse.ArgumentParser(description="Benchmark the batched embedding pipeline")
+    parser.add_argument("--chunks", type=int, default=1000)
+    parser.add_argument("--batch-sizes", default="8,32,64")
+    parser.add_argument("--in-flight", default="1,4,8")
+    parser.add_argument("--model", default=os.getenv("EMBEDDING_MODEL", "mxbai-embed-large"))
+    parser.add_argument("--output", help="Write results as JSON to this path")
+    args = parser.parse_args()
+
+    embeddings = OllamaEmbeddings(base_url=os.getenv("OLLAMA_URL"), model=args.model)
+    chunks = synthetic_chunks(args.chunks)
+    ids = [f"bench-{i}" for i in range(len(chunks))]
+    results = []
+    print(f"{'batch':>6}{'in-flight':>11}{'seconds':>10}{'chunks/s':>11}")
+    for batch_size in [int(value) for value in args.batch_sizes.split(',')]:
+        for in_flight in [int(value) for value in args.in_flight.split(',')]:
+            pipeline = EmbeddingPipeline(embeddings, batch_size=batch_size, max_in_flight=in_flight)
+            stats = pipeline.run(chunks, ids, sink=lambda *batch: None)
+            results.append({
+                "batch_size": batch_size,
+                "max_in_flight": in_flight,
+                "chunks": stats.chunks,
+                "seconds": round(stats.elapsed, 3),
+                "chunks_per_s": round(stats.chunks_per_second, 1),
+                "retries": stats.retries,
+            })
+            print(f"{batch_size:>6}{in_flight:>11}{stats.elapsed:>10.2f}{stats.chunks_per_second:>11.1f}")
+    if args.output:
+        with open(args.output, 'w') as file:
+            json.dump(results, file, indent=2)
+
+
+if __name__ == "__main__":
+    main()
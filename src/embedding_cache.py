@@ -0,0 +1,137 @@
+import os
+import sqlite3
+import hashlib
+import threading
+import time
+import logging
+from array import array
+from langchain_core.embeddings import Embeddings
+import metrics
+
+logger = logging.getLogger(__name__)
+
+# Bump when the way vectors are stored or keyed changes; invalidates every cached entry
+CACHE_VERSION = 1
+
+EMBEDDING_CACHE_LOOKUPS = metrics.counter(
+    "pakfashion_embedding_cache_lookups_total",
+    "Chunk texts looked up in the embedding cache, by result",
+    ["result"],
+)
+
+
+def text_hash(text):
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
+class CachedEmbeddings(Embeddings):
+    """Embeddings wrapper backed by an on-disk cache keyed by (model name, chunk text hash)."""
+
+    def __init__(self, embeddings, model_name, path, max_entries=200000):
+        self.embeddings = embeddings
+        self.model_name = model_name
+        self.path = path
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings ("
+            "model TEXT NOT NULL, hash TEXT NOT NULL, vector BLOB NOT NULL, last_used REAL NOT NULL, "
+            "PRIMARY KEY (model, hash))"
+        )
+        self.conn.execute("CREATE INDEX IF NOT EXISTS embeddings_last_used ON embeddings (last_used)")
+        self.check_version()
+
+    def version_stamp(self):
+        return f"{CACHE_VERSION}:{self.model_name}"
+
+    def check_version(self):
+        with self.lock:
+            row = self.conn.execute("SELECT value FROM meta WHERE key = 'version'").fetchone()
+            if row and row[0] == self.version_stamp():
+                return
+            if row:
+                logger.info(f"Embedding cache version changed ({row[0]} -> {self.version_stamp()}), clearing cache")
+            self.conn.execute("DELETE FROM embeddings")
+            self.conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('version', ?)", (self.version_stamp(),))
+            self.conn.commit()
+
+    def lookup(self, hashes):
+        found = {}
+        with self.lock:
+            # SQLite caps the number of bound parameters, so look up in slices
+            for start in range(0, len(hashes), 500):
+                batch = hashes[start:start + 500]
+                placeholders = ",".join("?" * len(batch))
+                rows = self.conn.execute(
+                    f"SELECT hash, vector FROM embeddings WHERE model = ? AND hash IN ({placeholders})",
+                    [self.model_name, *batch],
+                ).fetchall()
+                for key, blob in rows:
+                    found[key] = array('f', blob).tolist()
+            if found:
+                now = time.time()
+                self.conn.executemany(
+                    "UPDATE embeddings SET last_used = ? WHERE model = ? AND hash = ?",
+                    [(now, self.model_name, key) for key in found],
+                )
+                self.conn.commit()
+        return found
+
+    def store(self, items):
+        now = time.time()
+        with self.lock:
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (model, hash, vector, last_used) VALUES (?, ?, ?, ?)",
+                [(self.model_name, key, array('f', vector).tobytes(), now) for key, vector in items],
+            )
+            self.conn.commit()
+        self.evict()
+
+    def evict(self):
+        with self.lock:
+            count = self.conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+            excess = count - self.max_entries
+            if excess <= 0:
+                return
+            self.conn.execute(
+                "DELETE FROM embeddings WHERE rowid IN "
+                "(SELECT rowid FROM embeddings ORDER BY last_used ASC LIMIT ?)",
+                (excess,),
+            )
+            self.conn.commit()
+        logger.info(f"Evicted {excess} least recently used embeddings from cache")
+
+    def clear(self):
+        with self.lock:
+            self.conn.execute("DELETE FROM embeddings")
+            self.conn.commit()
+
+    def embed_documents(self, texts):
+        hashes = [text_hash(text) for text in texts]
+        cached = self.lookup(list(set(hashes)))
+        missing = {}
+        for key, text in zip(hashes, texts):
+            if key not in cached and key not in missing:
+                missing[key] = text
+        with self.lock:
+            self.hits += len(texts) - len(missing)
+            self.misses += len(missing)
+        EMBEDDING_CACHE_LOOKUPS.inc(len(texts) - len(missing), result="hit")
+        EMBEDDING_CACHE_LOOKUPS.inc(len(missing), result="miss")
+        if missing:
+            vectors = self.embeddings.embed_documents(list(missing.values()))
+            fresh = list(zip(missing.keys(), vectors))
+            self.store(fresh)
+            cached.update(fresh)
+        logger.debug(f"Embedding cache: {len(texts) - len(missing)} hits, {len(missing)} misses")
+        return [cached[key] for key in hashes]
+
+    def embed_query(self, text):
+        return self.embeddings.embed_query(text)
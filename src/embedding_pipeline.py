@@ -0,0 +1,120 @@
+import time
+import random
+import logging
+import contextvars
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from dataclasses import dataclass, field
+import metrics
+
+logger = logging.getLogger(__name__)
+
+EMBEDDING_BATCH_SECONDS = metrics.histogram(
+    "pakfashion_embedding_batch_seconds",
+    "Time to embed one batch of chunks, retries included",
+)
+
+
+@dataclass
+class EmbeddingStats:
+    chunks: int = 0
+    batches: int = 0
+    retries: int = 0
+    started: float = field(default_factory=time.monotonic)
+    finished: float = None
+
+    @property
+    def elapsed(self):
+        return (self.finished or time.monotonic()) - self.started
+
+    @property
+    def chunks_per_second(self):
+        return self.chunks / self.elapsed if self.elapsed > 0 else 0.0
+
+    def summary(self):
+        return (f"{self.chunks} chunks in {self.batches} batches, {self.retries} retries, "
+                f"{self.elapsed:.1f}s ({self.chunks_per_second:.1f} chunks/s)")
+
+
+class EmbeddingFailed(Exception):
+    pass
+
+
+def chroma_sink(vector_store):
+    def write(ids, texts, metadatas, vectors):
+        vector_store._collection.upsert(ids=ids, embeddings=vectors, documents=texts, metadatas=metadatas)
+    return write
+
+
+class EmbeddingPipeline:
+    """Embeds chunks in fixed-size batches with a bounded number of requests in flight.
+
+    Finished batches are handed to the sink as they arrive, so the store fills while later
+    batches are still being embedded and memory never holds more than max_in_flight batches.
+    """
+
+    def __init__(self, embeddings, batch_size=32, max_in_flight=4, max_retries=3, backoff_base=1.0):
+        self.embeddings = embeddings
+        self.batch_size = max(1, batch_size)
+        self.max_in_flight = max(1, max_in_flight)
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+
+    def embed_batch(self, texts, stats):
+        with EMBEDDING_BATCH_SECONDS.time():
+            return self.embed_with_retries(texts, stats)
+
+    def embed_with_retries(self, texts, stats):
+        for attempt in range(self.max_retries + 1):
+            try:
+                vectors = self.embeddings.embed_documents(texts)
+                if len(vectors) != len(texts):
+                    raise EmbeddingFailed(f"expected {len(texts)} vectors, got {len(vectors)}")
+                return vectors
+            except Exception as e:
+                if attempt >= self.max_retries:
+                    raise EmbeddingFailed(f"batch of {len(texts)} chunks failed after {attempt + 1} attempts: {e}") from e
+                stats.retries += 1
+                delay = random.uniform(0, self.backoff_base * (2 ** attempt))
+                logger.warning(f"Embedding batch failed ({e}), retrying in {delay:.1f}s")
+                time.sleep(delay)
+
+    def batches(self, chunks, ids):
+        for start in range(0, len(chunks), self.batch_size):
+            batch = chunks[start:start + self.batch_size]
+            yield (
+                ids[start:start + self.batch_size],
+                [chunk.page_content for chunk in batch],
+                [chunk.metadata for chunk in batch],
+            )
+
+    def run(self, chunks, ids, sink):
+        stats = EmbeddingStats()
+        pending = {}
+        batches = self.batches(chunks, ids)
+        with ThreadPoolExecutor(max_workers=self.max_in_flight, thread_name_prefix="embed") as executor:
+            try:
+                while True:
+                    # Only submit while there is room; this is the backpressure on the producer side
+                    while len(pending) < self.max_in_flight:
+                        batch = next(batches, None)
+                        if batch is None:
+                            break
+                        # Copy the context so log lines from embedding threads keep the refresh's trace id
+                        task = executor.submit(contextvars.copy_context().run, self.embed_batch, batch[1], stats)
+                        pending[task] = batch
+                    if not pending:
+                        break
+                    done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        batch_ids, texts, metadatas = pending.pop(future)
+                        vectors = future.result()
+                        sink(batch_ids, texts, metadatas, vectors)
+                        stats.chunks += len(batch_ids)
+                        stats.batches += 1
+            except Exception:
+                for future in pending:
+                    future.cancel()
+                raise
+        stats.finished = time.monotonic()
+        logger.info(f"Embedding pipeline: {stats.summary()}")
+        return stats
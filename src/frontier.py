@@ -0,0 +1,306 @@
+import math
+import heapq
+import asyncio
+import hashlib
+import logging
+import itertools
+import re
+import xml.etree.ElementTree as ET
+from collections import deque
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
+from urllib.robotparser import RobotFileParser
+from crawler import env_setting
+
+logger = logging.getLogger(__name__)
+
+TRACKING_PARAMS = {"gclid", "fbclid", "msclkid", "yclid", "igshid", "ref", "ref_src", "_ga", "mc_cid", "mc_eid"}
+
+PRODUCT_PATH = re.compile(r"/(products?|p|item)/[^/]+", re.I)
+COLLECTION_PATH = re.compile(r"/(collections?|categor(y|ies)|shop|catalog)(/|$)", re.I)
+SKIP_PATH = re.compile(
+    r"/(cart|checkout|account|login|register|wishlist|search|cdn-cgi|policies)(/|$)"
+    r"|\.(jpe?g|png|gif|webp|svg|ico|pdf|css|js|json|xml|gz|zip|mp4)$",
+    re.I,
+)
+# Shopify serves every product under each collection too; /products/<handle> is the canonical page
+SHOPIFY_COLLECTION_PRODUCT = re.compile(r"^/collections/[^/]+(/products/[^/]+)$", re.I)
+
+# Queue order: home pages, then product and collection pages, then everything else
+SEED, CATALOG, OTHER = 0, 1, 2
+
+
+def normalize_url(url, keep_path=True):
+    """Canonical form of a URL: lower-case host, no fragment, tracking parameters or trailing slash."""
+    parts = urlsplit(url.strip())
+    if parts.scheme not in ("http", "https") or not parts.hostname:
+        return None
+    host = parts.hostname.lower()
+    if parts.port and parts.port not in (80, 443):
+        host = f"{host}:{parts.port}"
+    # The scheme is kept so plain-http sites stay fetchable; url_key treats both schemes as one URL
+    if not keep_path:
+        return f"{parts.scheme}://{host}"
+    query = [(key, value) for key, value in parse_qsl(parts.query, keep_blank_values=True)
+             if key.lower() not in TRACKING_PARAMS and not key.lower().startswith("utm_")]
+    return urlunsplit((parts.scheme, host, parts.path.rstrip('/'), urlencode(query), ""))
+
+
+def url_key(url):
+    # http and https, www. and non-www. serve the same site, so they count as one URL when deduplicating
+    normalized = normalize_url(url)
+    if normalized is None:
+        return None
+    return re.sub(r"^https?://(www\.)?", "https://", normalized, count=1)
+
+
+def site_of(url):
+    host = (urlsplit(url).hostname or "").lower()
+    return host[4:] if host.startswith("www.") else host
+
+
+def page_kind(url):
+    path = urlsplit(url).path
+    if PRODUCT_PATH.search(path) or COLLECTION_PATH.search(path):
+        return CATALOG
+    return OTHER
+
+
+def parse_lastmod(value):
+    if not value:
+        return 0.0
+    try:
+        parsed = datetime.fromisoformat(value.strip().replace("Z", "+00:00"))
+    except ValueError:
+        return 0.0
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed.timestamp()
+
+
+def parse_sitemap(body):
+    """Return ("index", [(loc, lastmod)]) for a sitemap index or ("urlset", [(loc, lastmod)]) for a sitemap."""
+    try:
+        root = ET.fromstring(body.encode('utf-8'))
+    except ET.ParseError as e:
+        logger.debug(f"Unparseable sitemap: {e}")
+        return None, []
+    kind = "index" if root.tag.endswith("sitemapindex") else "urlset"
+    entries = []
+    for element in root:
+        loc, lastmod = None, None
+        for child in element:
+            if child.tag.endswith("loc"):
+                loc = (child.text or "").strip()
+            elif child.tag.endswith("lastmod"):
+                lastmod = child.text
+        if loc:
+            entries.append((loc, parse_lastmod(lastmod)))
+    return kind, entries
+
+
+class BloomFilter:
+    """Fixed-size seen-set: about 1.8 MB per million URLs at a 0.1% false positive rate."""
+
+    def __init__(self, capacity, error_rate=0.001):
+        self.size = max(8, int(-capacity * math.log(error_rate) / (math.log(2) ** 2)))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+    def positions(self, item):
+        digest = hashlib.blake2b(item.encode('utf-8'), digest_size=16).digest()
+        first, second = int.from_bytes(digest[:8], 'little'), int.from_bytes(digest[8:], 'little') | 1
+        return [(first + i * second) % self.size for i in range(self.hashes)]
+
+    def __contains__(self, item):
+        return all(self.bits[p >> 3] & (1 << (p & 7)) for p in self.positions(item))
+
+    def add(self, item):
+        """Add item; return False if it was (probably) already present."""
+        new = False
+        for p in self.positions(item):
+            if not self.bits[p >> 3] & (1 << (p & 7)):
+                self.bits[p >> 3] |= 1 << (p & 7)
+                new = True
+        self.count += new
+        return new
+
+
+@dataclass
+class FrontierConfig:
+    max_pages_per_site: int = env_setting("CRAWL_PAGES_PER_SITE", "500")
+    max_revisits_per_site: int = env_setting("CRAWL_REVISITS_PER_SITE", "2000")
+    max_depth: int = env_setting("CRAWL_MAX_DEPTH", "3")
+    max_sitemaps: int = env_setting("CRAWL_MAX_SITEMAPS", "20")
+    seen_capacity: int = env_setting("CRAWL_SEEN_CAPACITY", "2000000")
+    seen_error_rate: float = 0.001
+
+
+@dataclass
+class SiteQueue:
+    seed: str
+    robots: RobotFileParser = None
+    heap: list = field(default_factory=list)
+    revisits: deque = field(default_factory=deque)
+    revisit_keys: set = field(default_factory=set)
+    revisited: int = 0
+    scheduled: int = 0
+    outstanding: int = 0
+    sitemap_urls: int = 0
+    changed: asyncio.Condition = field(default_factory=asyncio.Condition)
+
+
+class CrawlFrontier:
+    """Per-site priority queues of pages to fetch, seeded from robots.txt and sitemaps.
+
+    Seeds come first, then pages already in the index, then product and collection pages with the
+    newest sitemap lastmod, then everything else. Revisits of indexed pages have their own budget of
+    max_revisits_per_site per cycle, so a large sitemap can never starve them and pages that were
+    deleted are still found; everything else is limited to max_pages_per_site fetches per cycle and
+    max_depth link hops from the home page.
+    """
+
+    def __init__(self, config=None, user_agent="*"):
+        self.config = config or FrontierConfig()
+        self.user_agent = user_agent
+        self.seen = BloomFilter(self.config.seen_capacity, self.config.seen_error_rate)
+        self.sites = {}
+        self.order = itertools.count()
+
+    def site_for(self, url):
+        site = site_of(url)
+        return site if site in self.sites else None
+
+    def push(self, url, depth, kind=None, lastmod=0.0):
+        """Queue url if it belongs to a known site, passes the filters and was not seen this cycle."""
+        url = normalize_url(url)
+        if url is None:
+            return False
+        match = SHOPIFY_COLLECTION_PRODUCT.match(urlsplit(url).path)
+        if match:
+            url = urlunsplit(urlsplit(url)._replace(path=match.group(1), query=""))
+        site = self.sites.get(site_of(url))
+        if site is None or depth > self.config.max_depth or SKIP_PATH.search(urlsplit(url).path):
+            return False
+        if site.robots is not None and not site.robots.can_fetch(self.user_agent, url):
+            return False
+        if not self.seen.add(url_key(url)):
+            return False
+        kind = page_kind(url) if kind is None else kind
+        heapq.heappush(site.heap, (kind, -lastmod, depth, next(self.order), url))
+        # Only the best few pages can ever be fetched; drop the tail rather than hold every sitemap entry
+        cap = self.config.max_pages_per_site * 2
+        if len(site.heap) > cap * 2:
+            site.heap = heapq.nsmallest(cap, site.heap)
+        return True
+
+    def revisit(self, url, depth=1):
+        """Queue an indexed page for a refresh fetch, ahead of new pages and outside their budget.
+
+        depth is the one the page was first found at, so its links are queued as deep as they were then.
+        """
+        url = normalize_url(url)
+        site = self.sites.get(site_of(url)) if url else None
+        if site is None or SKIP_PATH.search(urlsplit(url).path):
+            return False
+        if site.robots is not None and not site.robots.can_fetch(self.user_agent, url):
+            return False
+        key = url_key(url)
+        if key in site.revisit_keys:
+            return False
+        # Marked seen so links to it are not queued again; a sitemap copy already queued is skipped in next()
+        self.seen.add(key)
+        site.revisit_keys.add(key)
+        site.revisits.append((url, depth))
+        return True
+
+    async def add_links(self, url, links, depth):
+        site = self.sites.get(site_of(url))
+        if site is None or depth > self.config.max_depth:
+            return 0
+        added = sum(self.push(link, depth) for link in links)
+        if added:
+            async with site.changed:
+                site.changed.notify_all()
+        return added
+
+    async def seed(self, crawler, seed_url):
+        site = SiteQueue(seed=seed_url)
+        self.sites[site_of(seed_url)] = site
+        root = normalize_url(seed_url, keep_path=False)
+        sitemaps = []
+        result = await crawler.fetch(f"{root}/robots.txt")
+        if result.ok:
+            site.robots = RobotFileParser()
+            site.robots.parse(result.body.splitlines())
+            sitemaps = list(site.robots.site_maps() or [])
+        self.push(seed_url, 0, kind=SEED)
+        try:
+            await self.read_sitemaps(crawler, site, sitemaps or [f"{root}/sitemap.xml"])
+        except Exception as e:
+            logger.warning(f"Failed to read sitemaps of {seed_url}: {e}")
+        logger.info(f"Frontier seeded for {seed_url}: {site.sitemap_urls} sitemap URLs, {len(site.heap)} queued")
+
+    async def read_sitemaps(self, crawler, site, sitemaps):
+        loop = asyncio.get_running_loop()
+        # Product and collection sitemaps first, so the sitemap budget is spent where the catalogue is
+        pending = [(0 if re.search(r"product|collection", url, re.I) else 1, 0.0, url) for url in sitemaps]
+        visited = 0
+        while pending and visited < self.config.max_sitemaps:
+            pending.sort()
+            _, _, sitemap_url = pending.pop(0)
+            visited += 1
+            if sitemap_url.endswith(".gz"):
+                logger.debug(f"Skipping compressed sitemap {sitemap_url}")
+                continue
+            result = await crawler.fetch(sitemap_url)
+            if not result.ok:
+                continue
+            kind, entries = await loop.run_in_executor(None, parse_sitemap, result.body)
+            if kind == "index":
+                pending.extend((0 if re.search(r"product|collection", loc, re.I) else 1, -lastmod, loc)
+                               for loc, lastmod in entries)
+                continue
+            site.sitemap_urls += len(entries)
+            for loc, lastmod in entries:
+                self.push(loc, 1, lastmod=lastmod)
+
+    async def next(self, site_key):
+        """Next (url, depth) to fetch for a site, or None once its budgets are spent or nothing is left."""
+        site = self.sites[site_key]
+        async with site.changed:
+            while True:
+                seed_first = site.heap and site.heap[0][0] == SEED and site.scheduled < self.config.max_pages_per_site
+                if site.revisits and site.revisited < self.config.max_revisits_per_site and not seed_first:
+                    site.revisited += 1
+                    site.outstanding += 1
+                    return site.revisits.popleft()
+                if site.heap and site.scheduled < self.config.max_pages_per_site:
+                    _, _, depth, _, url = heapq.heappop(site.heap)
+                    if url_key(url) in site.revisit_keys:
+                        continue
+                    site.scheduled += 1
+                    site.outstanding += 1
+                    return url, depth
+                # Pages still being fetched or parsed may yet add links
+                if site.outstanding == 0:
+                    return None
+                await site.changed.wait()
+
+    async def done(self, url):
+        site = self.sites.get(site_of(url))
+        if site is None:
+            return
+        async with site.changed:
+            site.outstanding -= 1
+            site.changed.notify_all()
+
+    def summary(self):
+        scheduled = sum(site.scheduled for site in self.sites.values())
+        revisited = sum(site.revisited for site in self.sites.values())
+        left = sum(len(site.heap) + len(site.revisits) for site in self.sites.values())
+        return (f"{scheduled} new pages and {revisited} revisits scheduled across {len(self.sites)} sites, "
+                f"{left} left queued, "
+                f"{self.seen.count} URLs seen ({len(self.seen.bits) / 1024 / 1024:.1f} MiB seen-set)")
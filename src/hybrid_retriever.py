@@ -0,0 +1,162 @@
+import re
+import math
+import logging
+from typing import Any, List
+from langchain_core.callbacks import CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+
+logger = logging.getLogger(__name__)
+
+STOPWORDS = {
+    "a", "an", "and", "are", "as", "at", "be", "by", "for", "from", "has", "have", "i", "in", "is", "it",
+    "me", "of", "on", "or", "show", "that", "the", "this", "to", "was", "what", "which", "with", "you",
+}
+
+
+def tokenize(text):
+    # Keeps SKU-style tokens such as "ks-2401" whole and also indexes their parts
+    tokens = []
+    for token in re.findall(r"[a-z0-9]+(?:-[a-z0-9]+)*", text.lower()):
+        if token in STOPWORDS:
+            continue
+        tokens.append(token)
+        if '-' in token:
+            tokens.extend(part for part in token.split('-') if part and part not in STOPWORDS)
+    return tokens
+
+
+class BM25Index:
+    """Inverted index with Okapi BM25 scoring, updated per chunk rather than rebuilt."""
+
+    def __init__(self, k1=1.5, b=0.75):
+        self.k1 = k1
+        self.b = b
+        self.postings = {}
+        self.doc_lengths = {}
+        self.documents = {}
+        self.total_length = 0
+
+    def __len__(self):
+        return len(self.doc_lengths)
+
+    def copy(self):
+        # Copy-on-write for the next index generation; readers of this one are never disturbed
+        clone = BM25Index(self.k1, self.b)
+        clone.postings = {term: dict(docs) for term, docs in self.postings.items()}
+        clone.doc_lengths = dict(self.doc_lengths)
+        clone.documents = dict(self.documents)
+        clone.total_length = self.total_length
+        return clone
+
+    def add(self, doc_id, document):
+        if doc_id in self.doc_lengths:
+            self.remove(doc_id)
+        tokens = tokenize(document.page_content)
+        counts = {}
+        for token in tokens:
+            counts[token] = counts.get(token, 0) + 1
+        for token, count in counts.items():
+            self.postings.setdefault(token, {})[doc_id] = count
+        self.doc_lengths[doc_id] = len(tokens)
+        self.documents[doc_id] = document
+        self.total_length += len(tokens)
+
+    def remove(self, doc_id):
+        document = self.documents.pop(doc_id, None)
+        if document is None:
+            return
+        for token in set(tokenize(document.page_content)):
+            docs = self.postings.get(token)
+            if docs is not None:
+                docs.pop(doc_id, None)
+                if not docs:
+                    del self.postings[token]
+        self.total_length -= self.doc_lengths.pop(doc_id)
+
+    def idf(self, term):
+        df = len(self.postings.get(term, ()))
+        return math.log(1 + (len(self.doc_lengths) - df + 0.5) / (df + 0.5))
+
+    def search(self, query, k=20):
+        if not self.doc_lengths:
+            return []
+        average_length = self.total_length / len(self.doc_lengths)
+        scores = {}
+        for term in set(tokenize(query)):
+            docs = self.postings.get(term)
+            if not docs:
+                continue
+            idf = self.idf(term)
+            for doc_id, tf in docs.items():
+                norm = self.k1 * (1 - self.b + self.b * self.doc_lengths[doc_id] / average_length)
+                scores[doc_id] = scores.get(doc_id, 0.0) + idf * tf * (self.k1 + 1) / (tf + norm)
+        ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)[:k]
+        return [(doc_id, self.documents[doc_id], score) for doc_id, score in ranked]
+
+
+class LexicalReranker:
+    """Cheap CPU reranker: IDF-weighted query coverage, phrase and exact-token bonuses on top of the fused rank."""
+
+    def __init__(self, bm25):
+        self.bm25 = bm25
+
+    def score(self, query_terms, query_text, document, fused_score):
+        text = document.page_content.lower()
+        chunk_terms = set(tokenize(text))
+        weights = {term: self.bm25.idf(term) for term in query_terms}
+        total = sum(weights.values()) or 1.0
+        coverage = sum(weight for term, weight in weights.items() if term in chunk_terms) / total
+        phrase = 1.0 if len(query_terms) > 1 and query_text in text else 0.0
+        # Codes and brand names tend to be rare terms; reward chunks that contain all of them
+        rare = [term for term, weight in weights.items() if weight >= 2.0]
+        exact = 1.0 if rare and all(term in chunk_terms for term in rare) else 0.0
+        return 0.5 * coverage + 0.2 * phrase + 0.2 * exact + 0.1 * fused_score
+
+    def rerank(self, query, scored_documents, top_k):
+        query_terms = list(dict.fromkeys(tokenize(query)))
+        query_text = " ".join(query.lower().split())
+        best = max((score for _, score in scored_documents), default=1.0) or 1.0
+        rescored = [
+            (document, self.score(query_terms, query_text, document, score / best))
+            for document, score in scored_documents
+        ]
+        rescored.sort(key=lambda item: item[1], reverse=True)
+        return [document for document, _ in rescored[:top_k]]
+
+
+def document_key(document):
+    return (document.metadata.get("source"), document.page_content)
+
+
+class HybridRetriever(BaseRetriever):
+    """Dense + BM25 retrieval fused with reciprocal rank fusion, then reranked down to top_k."""
+
+    vector_store: Any
+    bm25: Any
+    fetch_k: int = 20
+    top_k: int = 5
+    rrf_k: int = 60
+    # "hybrid_rerank" in production; the other modes exist for the retrieval report
+    mode: str = "hybrid_rerank"
+
+    def fuse(self, ranked_lists):
+        scores, documents = {}, {}
+        for ranked in ranked_lists:
+            for rank, document in enumerate(ranked):
+                key = document_key(document)
+                documents.setdefault(key, document)
+                scores[key] = scores.get(key, 0.0) + 1.0 / (self.rrf_k + rank + 1)
+        ordered = sorted(scores, key=scores.get, reverse=True)
+        return [(documents[key], scores[key]) for key in ordered]
+
+    def _get_relevant_documents(self, query: str, *, run_manager: CallbackManagerForRetrieverRun) -> List[Document]:
+        ranked_lists = []
+        if self.mode in ("hybrid", "hybrid_rerank", "dense"):
+            ranked_lists.append(self.vector_store.similarity_search(query, k=self.fetch_k))
+        if self.mode in ("hybrid", "hybrid_rerank", "lexical"):
+            ranked_lists.append([document for _, document, _ in self.bm25.search(query, self.fetch_k)])
+        fused = self.fuse(ranked_lists)
+        if self.mode == "hybrid_rerank":
+            return LexicalReranker(self.bm25).rerank(query, fused, self.top_k)
+        return [document for document, _ in fused[:self.top_k]]
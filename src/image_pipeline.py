@@ -0,0 +1,230 @@
+import io
+import os
+import re
+import time
+import asyncio
+import hashlib
+import sqlite3
+import threading
+import logging
+from urllib.parse import urljoin, urlsplit
+import aiohttp
+from PIL import Image
+
+logger = logging.getLogger(__name__)
+
+MAX_IMAGES = 20
+MIN_DIMENSION = 100
+# Lazy-load placeholders, spacers, tracking pixels and site chrome rather than product photos. Words are
+# matched whole against the file name, so "Iconic-Lawn-Kurta.jpg" and "blanket-shawl.jpg" are kept
+PLACEHOLDER_WORDS = {"placeholder", "spacer", "lazyload", "loader", "loading", "1x1", "favicon", "sprite", "tracking"}
+# These also name products ("transparent organza", "pixel print"), so they only mark chrome when the rest
+# of the name is numbers, sizes or colours, as in "blank.png" or "logo-white_200x.png"
+CHROME_WORDS = {"blank", "pixel", "transparent", "lazy", "logo", "icon", "badge", "payment", "flag"}
+FILLER_WORD = re.compile(r"\d+|\d*x\d*|white|black|light|dark|small|default")
+CHROME_DIRECTORIES = {"icons", "logos", "flags", "badges", "payment", "payments", "placeholders", "sprites"}
+PLACEHOLDER_TYPES = (".svg", ".gif", ".ico")
+TRACKING_HOSTS = ("facebook.com", "google-analytics.com", "doubleclick.net", "googletagmanager.com", "bat.bing.com")
+# Shopify serves one image at many sizes: photo_200x.jpg, photo_large.jpg, photo_1024x1024@2x.jpg
+SHOPIFY_SIZE_SUFFIX = re.compile(r"_(\d+x\d*|\d*x\d+|pico|icon|thumb|small|compact|medium|large|grande|master)(@\dx)?(?=\.\w+$)", re.I)
+ALLOWED_CONTENT_TYPES = ("image/jpeg", "image/png", "image/webp")
+
+
+def image_key(url):
+    parts = urlsplit(url)
+    return f"{parts.netloc.lower()}{SHOPIFY_SIZE_SUFFIX.sub('', parts.path)}"
+
+
+def is_shopify_image(url):
+    parts = urlsplit(url)
+    return parts.netloc.lower() == "cdn.shopify.com" or parts.path.startswith("/cdn/shop/")
+
+
+def sized_image_url(url, width):
+    """Shopify variant of url at most width pixels wide; other URLs are returned unchanged."""
+    if not is_shopify_image(url):
+        return url
+    parts = urlsplit(url)
+    stem, extension = os.path.splitext(SHOPIFY_SIZE_SUFFIX.sub('', parts.path))
+    if not extension:
+        return url
+    return parts._replace(path=f"{stem}_{width}x{extension}").geturl()
+
+
+def is_placeholder(url):
+    parts = urlsplit(url)
+    if parts.scheme not in ("http", "https"):
+        return True
+    path = parts.path.lower()
+    host = parts.netloc.lower()
+    if path.endswith(PLACEHOLDER_TYPES):
+        return True
+    if any(host == tracker or host.endswith("." + tracker) for tracker in TRACKING_HOSTS):
+        return True
+    directories, _, filename = path.rpartition("/")
+    if CHROME_DIRECTORIES.intersection(directories.split("/")):
+        return True
+    words = [word for word in re.split(r"[-_.@]+", os.path.splitext(filename)[0]) if word]
+    if PLACEHOLDER_WORDS.intersection(words):
+        return True
+    return (any(word in CHROME_WORDS for word in words)
+            and all(word in CHROME_WORDS or FILLER_WORD.fullmatch(word) for word in words))
+
+
+def clean_image_urls(page_url, candidates, limit=MAX_IMAGES):
+    """Resolve relative and protocol-relative URLs, drop placeholders and keep one URL per image."""
+    images, keys = [], set()
+    for candidate in candidates:
+        if not candidate or not isinstance(candidate, str) or candidate.startswith("data:"):
+            continue
+        url = urljoin(page_url, candidate.strip())
+        if is_placeholder(url):
+            continue
+        if is_shopify_image(url):
+            # One URL per image whichever size the theme picked; thumbnails request a sized variant of it
+            parts = urlsplit(url)
+            url = parts._replace(path=SHOPIFY_SIZE_SUFFIX.sub('', parts.path)).geturl()
+        key = image_key(url)
+        if key not in keys:
+            keys.add(key)
+            images.append(url)
+            if len(images) >= limit:
+                break
+    return images
+
+
+class ThumbnailCache:
+    """Bounded on-disk cache of resized images, named by the SHA-256 of the source image.
+
+    Several URLs for the same picture share one file. Shopify images are fetched at twice the
+    thumbnail size rather than as the original upload, which is often larger than max_source_bytes.
+    Least recently used files are evicted once the directory exceeds max_bytes. URLs that turned
+    out to be placeholders or failed are remembered for retry_after seconds so they are not fetched
+    on every render.
+    """
+
+    def __init__(self, directory, max_bytes=256 * 1024 * 1024, size=320, max_source_bytes=10 * 1024 * 1024,
+                 retry_after=86400, max_concurrency=8):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.size = size
+        self.max_source_bytes = max_source_bytes
+        self.retry_after = retry_after
+        self.max_concurrency = max_concurrency
+        self.fetch_limit = None
+        self.lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+        self.conn = sqlite3.connect(os.path.join(directory, "thumbnails.sqlite"), check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("CREATE TABLE IF NOT EXISTS urls (url TEXT PRIMARY KEY, name TEXT, checked REAL NOT NULL)")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS files (name TEXT PRIMARY KEY, size INTEGER NOT NULL, last_used REAL NOT NULL)"
+        )
+        self.conn.execute("CREATE INDEX IF NOT EXISTS files_last_used ON files (last_used)")
+        self.conn.commit()
+
+    def path(self, name):
+        return os.path.join(self.directory, name)
+
+    def lookup(self, url):
+        """Return (known, path): path is None for a remembered failure or a file that was evicted."""
+        with self.lock:
+            row = self.conn.execute("SELECT name, checked FROM urls WHERE url = ?", (url,)).fetchone()
+            if row is None:
+                return False, None
+            name, checked = row
+            if name is None:
+                return time.time() - checked < self.retry_after, None
+            if not os.path.exists(self.path(name)):
+                return False, None
+            self.conn.execute("UPDATE files SET last_used = ? WHERE name = ?", (time.time(), name))
+            self.conn.commit()
+        return True, self.path(name)
+
+    def remember_failure(self, url):
+        with self.lock:
+            self.conn.execute("INSERT OR REPLACE INTO urls (url, name, checked) VALUES (?, NULL, ?)", (url, time.time()))
+            self.conn.commit()
+
+    def make_thumbnail(self, data):
+        with Image.open(io.BytesIO(data)) as image:
+            if min(image.size) < MIN_DIMENSION:
+                return None
+            image = image.convert("RGB")
+            image.thumbnail((self.size, self.size))
+            output = io.BytesIO()
+            image.save(output, format="WEBP", quality=80)
+            return output.getvalue()
+
+    def store(self, url, data):
+        name = hashlib.sha256(data).hexdigest()[:32] + ".webp"
+        if not os.path.exists(self.path(name)):
+            try:
+                thumbnail = self.make_thumbnail(data)
+            except (OSError, ValueError, Image.DecompressionBombError) as e:
+                logger.debug(f"Could not decode image {url}: {e}")
+                thumbnail = None
+            if thumbnail is None:
+                self.remember_failure(url)
+                return None
+            tmp_path = self.path(f".{name}.tmp")
+            with open(tmp_path, 'wb') as file:
+                file.write(thumbnail)
+            os.replace(tmp_path, self.path(name))
+        now = time.time()
+        with self.lock:
+            self.conn.execute("INSERT OR REPLACE INTO urls (url, name, checked) VALUES (?, ?, ?)", (url, name, now))
+            self.conn.execute(
+                "INSERT OR REPLACE INTO files (name, size, last_used) VALUES (?, ?, ?)",
+                (name, os.path.getsize(self.path(name)), now),
+            )
+            self.conn.commit()
+        self.evict()
+        return self.path(name)
+
+    def evict(self):
+        with self.lock:
+            total = self.conn.execute("SELECT COALESCE(SUM(size), 0) FROM files").fetchone()[0]
+            if total <= self.max_bytes:
+                return
+            evicted = 0
+            for name, size in self.conn.execute("SELECT name, size FROM files ORDER BY last_used ASC").fetchall():
+                if total <= self.max_bytes * 0.9:
+                    break
+                try:
+                    os.remove(self.path(name))
+                except FileNotFoundError:
+                    pass
+                self.conn.execute("DELETE FROM files WHERE name = ?", (name,))
+                self.conn.execute("DELETE FROM urls WHERE name = ?", (name,))
+                total -= size
+                evicted += 1
+            self.conn.commit()
+        logger.info(f"Evicted {evicted} least recently used thumbnails")
+
+    async def get(self, session, url):
+        """Path of the thumbnail for url, fetching and resizing it on first use; None if unusable."""
+        known, path = self.lookup(url)
+        if known:
+            return path
+        if self.fetch_limit is None:
+            self.fetch_limit = asyncio.Semaphore(self.max_concurrency)
+        async with self.fetch_limit:
+            try:
+                async with session.get(sized_image_url(url, self.size * 2)) as response:
+                    content_type = response.headers.get("Content-Type", "").split(";")[0].strip().lower()
+                    if response.status != 200 or content_type not in ALLOWED_CONTENT_TYPES:
+                        self.remember_failure(url)
+                        return None
+                    buffer = bytearray()
+                    async for chunk in response.content.iter_chunked(64 * 1024):
+                        buffer.extend(chunk)
+                        if len(buffer) > self.max_source_bytes:
+                            self.remember_failure(url)
+                            return None
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                logger.debug(f"Failed to fetch image {url}: {e}")
+                return None
+        data = bytes(buffer)
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, self.store, url, data)
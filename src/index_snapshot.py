@@ -0,0 +1,194 @@
+import os
+import json
+import time
+import tempfile
+import threading
+import logging
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class IndexSnapshot:
+    """One published index generation: everything a query needs, never mutated after publish."""
+    generation: int
+    collection_name: str
+    vector_store: object
+    lexical_index: object
+    retriever: object
+    conversation: object
+    chunk_ids: dict
+    created_at: float = field(default_factory=time.time)
+
+
+class SnapshotHolder:
+    """Double buffer for index generations.
+
+    Readers pin the current snapshot with acquire(); publish() swaps in a new one
+    atomically, and a replaced generation is handed to on_retire once its last reader leaves.
+    """
+
+    def __init__(self, on_retire=None):
+        self.lock = threading.Lock()
+        self.current = None
+        self.readers = {}
+        self.retired = {}
+        self.on_retire = on_retire
+
+    @contextmanager
+    def acquire(self):
+        with self.lock:
+            snapshot = self.current
+            if snapshot is not None:
+                self.readers[snapshot.generation] = self.readers.get(snapshot.generation, 0) + 1
+        try:
+            yield snapshot
+        finally:
+            if snapshot is not None:
+                self.release(snapshot)
+
+    def release(self, snapshot):
+        drained = None
+        with self.lock:
+            self.readers[snapshot.generation] -= 1
+            if self.readers[snapshot.generation] == 0:
+                del self.readers[snapshot.generation]
+                drained = self.retired.pop(snapshot.generation, None)
+        if drained is not None:
+            self.retire(drained)
+
+    def publish(self, snapshot):
+        drained = None
+        with self.lock:
+            previous = self.current
+            self.current = snapshot
+            if previous is not None:
+                if self.readers.get(previous.generation):
+                    self.retired[previous.generation] = previous
+                else:
+                    drained = previous
+        logger.info(f"Published index generation {snapshot.generation} ({snapshot.collection_name})")
+        if drained is not None:
+            self.retire(drained)
+
+    def retire(self, snapshot):
+        logger.info(f"Index generation {snapshot.generation} drained, releasing it")
+        if self.on_retire is not None:
+            try:
+                self.on_retire(snapshot)
+            except Exception as e:
+                logger.exception(f"Failed to release index generation {snapshot.generation}: {e}")
+
+    def generations(self):
+        """Generations this holder still serves: the current one and replaced ones with readers left."""
+        with self.lock:
+            held = set(self.retired)
+            if self.current is not None:
+                held.add(self.current.generation)
+            return sorted(held)
+
+    @property
+    def pending_retirement(self):
+        with self.lock:
+            return len(self.retired)
+
+
+# Every generation's chunks live in one collection. A chunk carries the generation that wrote it and the
+# one that replaced it, so a refresh writes only what changed and each snapshot filters to its own chunks
+NOT_RETIRED = 2 ** 62
+# Suffix of the shared collection; collections without it are per-generation ones from older versions
+SHARED_COLLECTION_SUFFIX = "-chunks"
+
+
+def generation_filter(generation):
+    """Chroma where clause selecting the chunks that make up one index generation."""
+    return {"$and": [{"generation": {"$lte": generation}}, {"retired": {"$gt": generation}}]}
+
+
+class GenerationView:
+    """The part of the shared collection one generation sees; chunks of later builds stay invisible."""
+
+    def __init__(self, vector_store, generation):
+        self.vector_store = vector_store
+        self.generation = generation
+
+    def similarity_search(self, query, k=4, **kwargs):
+        return self.vector_store.similarity_search(query, k=k, filter=generation_filter(self.generation), **kwargs)
+
+    def get(self, **kwargs):
+        return self.vector_store.get(where=generation_filter(self.generation), **kwargs)
+
+
+def read_pointer(index_dir):
+    path = os.path.join(index_dir, "CURRENT.json")
+    if not os.path.exists(path):
+        return None
+    try:
+        with open(path, 'r') as file:
+            return json.load(file)
+    except (OSError, ValueError) as e:
+        logger.warning(f"Could not read index pointer {path}: {e}")
+        return None
+
+
+def write_pointer(index_dir, generation, collection_name):
+    os.makedirs(index_dir, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=index_dir, prefix='.CURRENT.')
+    with os.fdopen(fd, 'w') as file:
+        json.dump({"generation": generation, "collection_name": collection_name}, file)
+    # os.replace is atomic, so a restart always sees either the old or the new generation
+    os.replace(tmp_path, os.path.join(index_dir, "CURRENT.json"))
+
+
+def chroma_client(index_dir):
+    """Client for the index collections: the Chroma server at CHROMA_HOST, else files under index_dir.
+
+    An embedded PersistentClient must only be used by one process, so deployments that run the
+    ingest worker and query services side by side point all of them at one Chroma server.
+    """
+    import chromadb
+    host = os.getenv("CHROMA_HOST")
+    if host:
+        return chromadb.HttpClient(host=host, port=int(os.getenv("CHROMA_PORT", "8000")))
+    return chromadb.PersistentClient(path=index_dir)
+
+
+def write_reader_state(index_dir, reader_id, generations):
+    """Record which generations a query service still reads, so the ingest worker keeps them."""
+    directory = os.path.join(index_dir, "readers")
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.reader.')
+    with os.fdopen(fd, 'w') as file:
+        json.dump({"generations": list(generations), "updated": time.time()}, file)
+    os.replace(tmp_path, os.path.join(directory, f"{reader_id}.json"))
+
+
+def generations_in_use(index_dir, max_age):
+    """Generations listed by query services that reported within max_age seconds; older reports are removed."""
+    directory = os.path.join(index_dir, "readers")
+    if not os.path.isdir(directory):
+        return set()
+    in_use = set()
+    now = time.time()
+    for name in os.listdir(directory):
+        if not name.endswith(".json"):
+            continue
+        path = os.path.join(directory, name)
+        try:
+            with open(path, 'r') as file:
+                state = json.load(file)
+        except (OSError, ValueError) as e:
+            logger.warning(f"Could not read index reader state {path}: {e}")
+            continue
+        if now - state.get("updated", 0) > max_age:
+            # A query service that stopped reporting has exited or hung; it holds nothing any more
+            logger.info(f"Index reader {name[:-5]} last reported {now - state.get('updated', 0):.0f}s ago, ignoring it")
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            continue
+        in_use.update(state.get("generations", []))
+    return in_use
@@ -0,0 +1,53 @@
+import os
+import asyncio
+import argparse
+import threading
+import logging
+from dotenv import load_dotenv
+
+# Scrapes the brand sites, rebuilds the catalog and publishes new index generations on a schedule.
+# Run exactly one of these per INDEX_DIR; query_service.py instances pick up what it publishes.
+#
+#   python src/ingest_worker.py            # every SCRAPE_INTERVAL seconds
+#   python src/ingest_worker.py --once     # a single refresh, e.g. from cron
+
+logger = logging.getLogger(__name__)
+
+
+def start_url_finder():
+    from urls_finder import URLFinder, queries_from_env
+    url_finder = URLFinder()
+    logger.info("URL Finder started")
+    # New sites land in urls.txt, which the next scrape cycle picks up
+    url_finder.run_periodic(queries_from_env(), int(os.getenv("DISCOVERY_INTERVAL", "86400")))
+
+
+def main():
+    load_dotenv()
+    parser = argparse.ArgumentParser(description="Scrape brand sites and publish the FashionBot index")
+    parser.add_argument("--once", action="store_true", help="Run one refresh and exit")
+    args = parser.parse_args()
+
+    from main import FashionBot
+    from tracing import configure_logging
+    import metrics
+    configure_logging('ingest_worker.log')
+    bot = FashionBot()
+
+    # Prometheus scrapes the worker here; METRICS_PORT=0 turns the endpoint off
+    metrics_port = int(os.getenv("METRICS_PORT", "9600"))
+    if metrics_port:
+        metrics.start_http_server(metrics_port)
+
+    if os.getenv("URL_DISCOVERY", "true").lower() != "false":
+        threading.Thread(target=start_url_finder, daemon=True).start()
+        logger.info("URL Finder thread initialized")
+
+    if args.once:
+        asyncio.run(bot.initialize_data())
+        return
+    bot.run_periodic_scraping()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,58 +1,232 @@
 import os
-import requests
+import hashlib
 import asyncio
-import aiohttp
-from bs4 import BeautifulSoup
 from langchain_ollama import OllamaEmbeddings
-from langchain.embeddings import HuggingFaceEmbeddings
 from langchain.vectorstores import Chroma
 from langchain.schema import Document
 from langchain.text_splitter import RecursiveCharacterTextSplitter
-from langchain.chains import ConversationalRetrievalChain
+from langchain.chains.conversational_retrieval.prompts import CONDENSE_QUESTION_PROMPT
 from langchain_groq import ChatGroq
-from langchain.memory import ConversationBufferMemory
 from langchain.prompts import (
     ChatPromptTemplate,
     SystemMessagePromptTemplate,
     HumanMessagePromptTemplate,
 )
+from langchain_core.output_parsers import StrOutputParser
+from langchain_core.runnables import RunnableLambda, RunnablePassthrough
 from dotenv import load_dotenv
 import threading
 import time
+import re
+import socket
 import logging
-
-# Configure logging
-logging.basicConfig(level=logging.DEBUG,
-                    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-                    filename='fashion_bot.log',
-                    filemode='w')
-
-console_handler = logging.StreamHandler()
-console_handler.setLevel(logging.INFO)
-formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
-console_handler.setFormatter(formatter)
-logging.getLogger('').addHandler(console_handler)
+from scrape_state import ScrapeState, content_hash
+from embedding_cache import CachedEmbeddings
+from crawler import Crawler, CrawlConfig
+from frontier import CrawlFrontier, FrontierConfig, site_of
+from page_parser import ParsePool
+from answer_cache import AnswerCache
+from session_memory import SessionMemoryStore
+from embedding_pipeline import EmbeddingPipeline, chroma_sink
+from hybrid_retriever import BM25Index, HybridRetriever
+from content_cleaner import BoilerplateFilter, CleaningStats, NearDuplicateIndex, load_duplicate_sources, save_duplicate_sources
+from index_snapshot import (
+    NOT_RETIRED,
+    SHARED_COLLECTION_SUFFIX,
+    GenerationView,
+    IndexSnapshot,
+    SnapshotHolder,
+    chroma_client,
+    generations_in_use,
+    read_pointer,
+    write_pointer,
+    write_reader_state,
+)
+from tracing import record_stage, span, trace
+import metrics
+from catalog import (
+    build_catalog,
+    format_products,
+    load_product_sources,
+    parse_catalog_query,
+    parse_shopify_products,
+    save_product_sources,
+    shopify_products_url,
+)
 
 logger = logging.getLogger(__name__)
 
+PAGES_FETCHED = metrics.counter("pakfashion_pages_fetched_total", "Page fetches, by outcome", ["outcome"])
+FETCHED_BYTES = metrics.counter("pakfashion_fetched_bytes_total", "Bytes of page content downloaded")
+REFRESHES = metrics.counter("pakfashion_refreshes_total", "Refresh cycles, by outcome", ["outcome"])
+REFRESH_IN_PROGRESS = metrics.gauge("pakfashion_refresh_in_progress", "1 while a refresh cycle is running")
+CHUNKS = metrics.counter("pakfashion_chunks_total", "Chunks handled by index builds, by what happened to them", ["result"])
+INDEX_GENERATION = metrics.gauge("pakfashion_index_generation", "Published index generation")
+INDEX_CHUNKS = metrics.gauge("pakfashion_index_chunks", "Chunks in the published index generation")
+CATALOG_PRODUCTS = metrics.gauge("pakfashion_catalog_products", "Products in the loaded catalog")
+CHAT_SESSIONS = metrics.gauge("pakfashion_chat_sessions", "Chat sessions held in memory")
+QUERIES = metrics.counter("pakfashion_queries_total", "Questions answered, by how they were answered", ["path"])
+QUERY_SECONDS = metrics.histogram("pakfashion_query_seconds", "Time to answer a question, by path", ["path"])
+FIRST_TOKEN_SECONDS = metrics.histogram("pakfashion_first_token_seconds", "Time until the first text of an answer", ["path"])
+
 load_dotenv()
 
 API_KEY = os.getenv("GROQ_API_KEY")
 os.environ["TOKENIZERS_PARALLELISM"] = "false"
 
+EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "mxbai-embed-large")
+INDEX_DIR = os.getenv("INDEX_DIR", "index")
+EMBEDDING_CACHE_MAX_ENTRIES = int(os.getenv("EMBEDDING_CACHE_MAX_ENTRIES", "200000"))
+RETRIEVAL_FETCH_K = int(os.getenv("RETRIEVAL_FETCH_K", "20"))
+RETRIEVAL_TOP_K = int(os.getenv("RETRIEVAL_TOP_K", "5"))
+# Query services that have not reported the generations they read for this long are treated as gone
+INDEX_READER_TIMEOUT = int(os.getenv("INDEX_READER_TIMEOUT", "120"))
+
+def source_key(source):
+    return hashlib.sha1(source.encode('utf-8')).hexdigest()[:16]
+
+def chunk_id(source, generation, index):
+    # Unique across generations: a page's old chunks stay readable while its new ones are written beside them
+    return f"{source_key(source)}-{generation}-{index}"
+
+def source_key_of(cid):
+    return cid.split('-', 1)[0]
+
 class FashionBot:
-    def __init__(self):
-        self.documents = []
-        self.vector_store = None
-        self.llm = ChatGroq(temperature=0, groq_api_key=API_KEY, model_name="llama3-70b-8192")
-        self.retriever = None
-        self.memory = ConversationBufferMemory(memory_key="chat_history", return_messages=True)
-        self.conversation = None
+    def __init__(self, read_only=False, embeddings=None, llm=None):
+        # A read-only bot serves queries from the index that an ingest worker publishes; it never scrapes
+        self.read_only = read_only
+        # Latest document per source URL; replaced in place on every refresh
+        self.documents = {}
+        # embeddings and llm default to Ollama and Groq; the benchmark passes deterministic stand-ins
+        self.embeddings = CachedEmbeddings(
+            embeddings or OllamaEmbeddings(base_url=os.getenv("OLLAMA_URL"), model=EMBEDDING_MODEL),
+            model_name=EMBEDDING_MODEL,
+            path=os.path.join(INDEX_DIR, "embedding_cache.sqlite"),
+            max_entries=EMBEDDING_CACHE_MAX_ENTRIES,
+        )
+        self.embedding_pipeline = EmbeddingPipeline(
+            self.embeddings,
+            batch_size=int(os.getenv("EMBEDDING_BATCH_SIZE", "32")),
+            max_in_flight=int(os.getenv("EMBEDDING_MAX_IN_FLIGHT", "4")),
+            max_retries=int(os.getenv("EMBEDDING_MAX_RETRIES", "3")),
+        )
+        # One collection per embedding model so switching models never mixes vector spaces
+        self.collection_prefix = "pakfashion-" + re.sub(r'[^a-zA-Z0-9_-]+', '-', EMBEDDING_MODEL).strip('-')
+        self.collection_name = self.collection_prefix + SHARED_COLLECTION_SUFFIX
+        self.llm = llm or ChatGroq(temperature=0, groq_api_key=API_KEY, model_name="llama3-70b-8192")
+        # Chat history is kept per user session and bounded, so prompt size stays flat over time
+        self.sessions = SessionMemoryStore(
+            summarizer=self.summarize_history,
+            max_tokens=int(os.getenv("MEMORY_MAX_TOKENS", "1200")),
+            max_sessions=int(os.getenv("MEMORY_MAX_SESSIONS", "500")),
+            idle_ttl=int(os.getenv("MEMORY_IDLE_TTL", "3600")),
+            path=os.getenv("MEMORY_PERSIST_PATH") or None,
+        )
+        # Queries read the published snapshot; refreshes build the next generation beside it
+        self.index = SnapshotHolder(on_retire=self.retire_generation)
+        self.generation = 0
+        self.chroma = chroma_client(INDEX_DIR)
+        # Chunks of every generation; snapshots read it through a GenerationView
+        self.chunk_store = self.open_vector_store(self.collection_name)
+        # Read-only bots report the generations they read under this id; the ingest worker keeps those
+        self.reader_id = f"{socket.gethostname()}-{os.getpid()}"
+        # Replaced generations as (generation, retired at); their chunks are purged once no query service reads them
+        self.lingering = []
         self.data_fetching = False
         self.first_fetch = True
-        self.fetch_interval = 3600  # 1 hour in seconds
+        self.fetch_interval = int(os.getenv("SCRAPE_INTERVAL", "3600"))
+        self.incremental = os.getenv("INCREMENTAL_SCRAPE", "true").lower() != "false"
+        self.scrape_state = ScrapeState()
+        # Sources touched by the current refresh cycle
+        self.changed_sources = set()
+        self.removed_sources = set()
+        # Chunk ids of the published generation, per source URL (owned by the scraping thread)
+        self.chunk_ids = {}
+        self.crawl_config = CrawlConfig()
+        self.frontier_config = FrontierConfig()
+        self.last_frontier_summary = None
+        # Indexed pages that answered 404/410 this cycle
+        self.gone_sources = set()
+        self.last_crawl_stats = None
+        self.parse_pool = ParsePool()
+        # Site-wide repeated text blocks are learned from each cycle's pages and cut before chunking
+        self.boilerplate = BoilerplateFilter(os.path.join(INDEX_DIR, "boilerplate.json"))
+        # MinHash signatures of the published generation's chunks (owned by the scraping thread)
+        self.near_duplicates = NearDuplicateIndex()
+        # Pages with chunks skipped as near duplicates -> source keys of the pages holding the kept copy;
+        # when one of those changes or goes away the skipped text must be indexed again
+        self.duplicates_path = os.path.join(INDEX_DIR, "duplicates.json")
+        self.duplicate_sources = {}
+        # Page text length before markup regions were stripped, for the cleaning report
+        self.raw_sizes = {}
+        self.last_cleaning_stats = None
+        self.last_embedding_stats = None
+        self.parse_queue_size = int(os.getenv("PARSE_QUEUE_SIZE", "64"))
+        # Structured product records per source (page URL or Shopify products.json URL)
+        self.catalog_path = os.path.join(INDEX_DIR, "catalog.json")
+        self.catalog_mtime = self.file_mtime(self.catalog_path)
+        self.product_sources = load_product_sources(self.catalog_path)
+        self.catalog = build_catalog(self.product_sources)
+        self.catalog_version = 0
+        self.catalog_dirty = False
+        self.shopify_pages = int(os.getenv("CATALOG_SHOPIFY_PAGES", "4"))
+        logger.info(f"Product catalog loaded with {len(self.catalog)} products")
+        self.answer_cache = AnswerCache(
+            self.embeddings,
+            max_entries=int(os.getenv("ANSWER_CACHE_MAX_ENTRIES", "1000")),
+            ttl=int(os.getenv("ANSWER_CACHE_TTL", "3600")),
+            threshold=float(os.getenv("ANSWER_CACHE_SIMILARITY", "0.92")),
+        )
+        self.load_vector_store()
+        metrics.REGISTRY.on_collect(self.collect_metrics)
         logger.info("FashionBot initialized")
 
+    def collect_metrics(self):
+        INDEX_GENERATION.set(self.generation)
+        INDEX_CHUNKS.set(sum(len(ids) for ids in self.chunk_ids.values()))
+        CATALOG_PRODUCTS.set(len(self.catalog))
+        CHAT_SESSIONS.set(len(self.sessions))
+        REFRESH_IN_PROGRESS.set(1 if self.data_fetching else 0)
+
+    @property
+    def vector_store(self):
+        snapshot = self.index.current
+        return snapshot.vector_store if snapshot else None
+
+    @property
+    def retriever(self):
+        snapshot = self.index.current
+        return snapshot.retriever if snapshot else None
+
+    @property
+    def conversation(self):
+        snapshot = self.index.current
+        return snapshot.conversation if snapshot else None
+
+    @staticmethod
+    def file_mtime(path):
+        try:
+            return os.path.getmtime(path)
+        except OSError:
+            return None
+
+    def sync_from_disk(self):
+        """Pick up index generations and catalogs published by the ingest worker."""
+        pointer = read_pointer(INDEX_DIR)
+        if pointer and pointer.get("generation") != self.generation:
+            logger.info(f"Index generation {pointer.get('generation')} published on disk, loading it")
+            self.load_vector_store()
+        # Also a heartbeat: the ingest worker stops waiting for readers that go quiet
+        self.acknowledge_generations()
+        mtime = self.file_mtime(self.catalog_path)
+        if mtime != self.catalog_mtime:
+            self.catalog_mtime = mtime
+            self.product_sources = load_product_sources(self.catalog_path)
+            self.catalog = build_catalog(self.product_sources)
+            self.catalog_version += 1
+            logger.info(f"Product catalog reloaded with {len(self.catalog)} products")
+
     def get_urls(self):
         logger.info("Reading URLs from file")
         with open('urls.txt', 'r') as file:
@@ -62,44 +236,386 @@ class FashionBot:
     async def scrape_data_from_urls(self, urls):
         self.data_fetching = True
         logger.info("Starting data scraping")
-        async with aiohttp.ClientSession() as session:
-            tasks = [self.fetch_content(session, url) for url in urls]
+        self.drop_released_generations()
+        self.changed_sources = set()
+        self.gone_sources = set()
+        frontier = CrawlFrontier(self.frontier_config, user_agent=self.crawl_config.user_agent)
+        # Fetchers feed a bounded queue so downloads wait instead of piling up unparsed pages
+        parse_queue = asyncio.Queue(maxsize=self.parse_queue_size)
+        crawl_started = time.perf_counter()
+        async with Crawler(self.crawl_config) as crawler:
+            parsers = [asyncio.create_task(self.parse_worker(parse_queue, frontier)) for _ in range(self.parse_pool.consumers)]
+            await asyncio.gather(*[frontier.seed(crawler, url) for url in urls])
+            # Pages already in the index are revisited so they are refreshed, or dropped if they are gone
+            for source in self.chunk_ids:
+                frontier.revisit(source, self.scrape_state.get(source).get("depth", 1))
+            tasks = [self.crawl_site(crawler, frontier, site, parse_queue) for site in list(frontier.sites)]
+            tasks += [self.fetch_catalog(crawler, url) for url in urls]
             await asyncio.gather(*tasks)
-        self.prepare_vector_store()
+            for _ in parsers:
+                await parse_queue.put(None)
+            await asyncio.gather(*parsers)
+        record_stage("crawl", time.perf_counter() - crawl_started)
+        self.last_crawl_stats = crawler.stats
+        self.last_frontier_summary = frontier.summary()
+        logger.info(f"Crawl finished: {crawler.stats.summary()}; frontier: {self.last_frontier_summary}")
+        # Pages outside the budget this cycle keep their chunks; only dropped brands and dead pages go
+        self.removed_sources = {source for source in self.chunk_ids if frontier.site_for(source) is None}
+        self.removed_sources |= self.gone_sources
+        for url in self.removed_sources:
+            self.documents.pop(url, None)
+            self.raw_sizes.pop(url, None)
+            self.scrape_state.forget(url)
+        # Only a full rebuild re-cleans every chunk, so sites already indexed keep their rules until then
+        rebuild = self.index.current is None or not self.incremental
+        self.boilerplate.learn(keep_sites=set() if rebuild else {site_of(source) for source in self.chunk_ids})
+        logger.info(f"Refresh summary: {len(self.changed_sources)} changed, "
+                    f"{len(self.removed_sources)} removed")
+        try:
+            self.prepare_vector_store()
+        except Exception:
+            # Pages that changed this cycle never reached the index; fetch them in full next cycle
+            self.scrape_state.discard()
+            for url in self.changed_sources:
+                self.scrape_state.forget(url)
+            self.scrape_state.save()
+            self.data_fetching = False
+            raise
+        # Catalog, validators and hashes describe what is indexed, so they only land once the generation is published
+        self.refresh_catalog(lambda source: frontier.site_for(source) is not None and source not in self.gone_sources)
+        self.scrape_state.commit()
+        self.scrape_state.save()
         self.data_fetching = False
         self.first_fetch = False
         logger.info("Data scraping completed")
 
-    async def fetch_content(self, session, url):
+    async def crawl_site(self, crawler, frontier, site, parse_queue):
+        # As many fetchers per site as the crawler lets run against one host
+        async def fetcher():
+            while True:
+                item = await frontier.next(site)
+                if item is None:
+                    return
+                url, depth = item
+                if not await self.fetch_content(crawler, url, depth, parse_queue):
+                    await frontier.done(url)
+
+        await asyncio.gather(*[fetcher() for _ in range(self.crawl_config.per_host)])
+
+    async def fetch_content(self, crawler, url, depth, parse_queue):
+        """Fetch one page; return True if it was handed to the parsers."""
+        # Conditional requests only make sense once the page is actually in the index
+        use_conditional = self.incremental and url in self.chunk_ids
+        headers = self.scrape_state.conditional_headers(url) if use_conditional else {}
+        outcome = "failed"
         try:
-            async with session.get(url) as response:
-                if response.status == 200:
-                    text = await response.text()
-                    soup = BeautifulSoup(text, 'html.parser')
-
-                    # Extracting text content
-                    content = soup.get_text(separator=' ', strip=True)
-
-                    # Extracting image URLs
-                    images = [img['src'] for img in soup.find_all('img') if img.get('src')]
-                    image_urls = ", ".join(images)
-
-                    if len(content) > 500:
-                        self.documents.append(Document(page_content=content, metadata={"source": url, "image_urls": image_urls}))
-                        logger.debug(f"Content and images fetched from {url}")
-                    else:
-                        logger.warning(f"Content from {url} is too short to be useful.")
-                else:
-                    logger.error(f"Failed to retrieve content from {url}, status code: {response.status}")
+            with span("fetch"):
+                result = await crawler.fetch(url, headers=headers)
+            FETCHED_BYTES.inc(result.size)
+            if result.status == 304:
+                outcome = "not_modified"
+                self.scrape_state.update(url)
+                logger.debug(f"Not modified since last scrape: {url}")
+            elif result.ok:
+                outcome = "ok"
+                await parse_queue.put((url, depth, result, use_conditional))
+                return True
+            elif result.status in (404, 410):
+                outcome = "gone"
+                if url in self.chunk_ids or url in self.documents:
+                    self.gone_sources.add(url)
+                logger.info(f"Page is gone ({result.status}): {url}")
+            elif result.error:
+                logger.error(f"Failed to retrieve content from {url}: {result.error}")
+            else:
+                logger.error(f"Failed to retrieve content from {url}, status code: {result.status}")
         except Exception as e:
             logger.exception(f"An error occurred while fetching {url}: {e}")
+        finally:
+            PAGES_FETCHED.inc(outcome=outcome)
+        return False
+
+    async def fetch_catalog(self, crawler, url):
+        # Many brand sites run on Shopify, which lists every product as JSON
+        catalog_url = shopify_products_url(url)
+        state = self.scrape_state.get(catalog_url)
+        if state.get("not_shopify") and time.time() - state.get("checked_at", 0) < 86400:
+            return
+        try:
+            bodies, products = [], []
+            for page in range(1, self.shopify_pages + 1):
+                result = await crawler.fetch(shopify_products_url(url, page))
+                page_products = parse_shopify_products(url, result.body) if result.ok else None
+                if page_products is None:
+                    if result.status == 0 or result.status >= 500:
+                        # Network trouble says nothing about the feed; keep what we had and try next cycle
+                        return
+                    if page == 1:
+                        self.scrape_state.update(catalog_url, not_shopify=True)
+                        logger.debug(f"No Shopify product feed at {url}")
+                        return
+                    break
+                if not page_products:
+                    break
+                bodies.append(result.body)
+                products.extend(page_products)
+            new_hash = content_hash("".join(bodies))
+            if self.scrape_state.has_changed(catalog_url, new_hash) or catalog_url not in self.product_sources:
+                self.product_sources[catalog_url] = products
+                self.catalog_dirty = True
+                logger.debug(f"Fetched {len(products)} products from the Shopify feed of {url}")
+            self.scrape_state.stage(catalog_url, new_hash=new_hash, not_shopify=False)
+        except Exception as e:
+            logger.exception(f"An error occurred while fetching the product feed of {url}: {e}")
+
+    def refresh_catalog(self, keep_source):
+        for source in [source for source in self.product_sources if not keep_source(source)]:
+            del self.product_sources[source]
+            self.scrape_state.forget(source)
+            self.catalog_dirty = True
+        if not self.catalog_dirty:
+            return
+        # Build the new catalog fully before swapping the reference, so queries never see a partial one
+        self.catalog = build_catalog(self.product_sources)
+        self.catalog_version += 1
+        save_product_sources(self.catalog_path, self.product_sources)
+        self.catalog_dirty = False
+        logger.info(f"Product catalog rebuilt with {len(self.catalog)} products "
+                    f"from {len(self.product_sources)} sources")
+
+    async def parse_worker(self, parse_queue, frontier):
+        while True:
+            item = await parse_queue.get()
+            if item is None:
+                break
+            url, depth, result, use_conditional = item
+            try:
+                with span("parse"):
+                    parsed = await self.parse_pool.parse(url, result.body)
+                self.store_parsed_page(url, depth, result, parsed, use_conditional)
+                await frontier.add_links(url, parsed["links"], depth + 1)
+            except Exception as e:
+                logger.exception(f"An error occurred while parsing {url}: {e}")
+            finally:
+                await frontier.done(url)
+
+    def store_parsed_page(self, url, depth, result, parsed, use_conditional):
+        content = parsed["content"]
+
+        if parsed["products"] != self.product_sources.get(url, []):
+            self.product_sources[url] = parsed["products"]
+            self.catalog_dirty = True
+
+        self.boilerplate.observe(url, content)
+        if len(content) <= 500:
+            logger.warning(f"Content from {url} is too short to be useful.")
+            return
+        new_hash = content_hash(content)
+        changed = not use_conditional or self.scrape_state.has_changed(url, new_hash)
+        self.scrape_state.stage(
+            url,
+            etag=result.headers.get("ETag"),
+            last_modified=result.headers.get("Last-Modified"),
+            new_hash=new_hash,
+            depth=depth,
+        )
+        if changed:
+            self.documents[url] = Document(page_content=content, metadata={"source": url})
+            self.raw_sizes[url] = parsed["raw_chars"]
+            self.changed_sources.add(url)
+            logger.debug(f"Content and images fetched from {url}")
+        else:
+            logger.debug(f"Content unchanged for {url}")
+
+    def open_vector_store(self, collection_name):
+        return Chroma(
+            client=self.chroma,
+            collection_name=collection_name,
+            embedding_function=self.embeddings,
+        )
+
+    def legacy_collection_name(self, generation):
+        # Before generations shared one collection each had its own; the first used the bare prefix
+        return f"{self.collection_prefix}-g{generation}" if generation else self.collection_prefix
+
+    def make_snapshot(self, generation, collection_name, vector_store, lexical_index, chunk_ids):
+        retriever = HybridRetriever(
+            vector_store=vector_store,
+            bm25=lexical_index,
+            fetch_k=RETRIEVAL_FETCH_K,
+            top_k=RETRIEVAL_TOP_K,
+        )
+        conversation = self.setup_conversation_chain(retriever)
+        return IndexSnapshot(
+            generation=generation,
+            collection_name=collection_name,
+            vector_store=vector_store,
+            lexical_index=lexical_index,
+            retriever=retriever,
+            conversation=conversation,
+            chunk_ids=chunk_ids,
+        )
+
+    def load_vector_store(self):
+        started = time.time()
+        pointer = read_pointer(INDEX_DIR)
+        if pointer and pointer.get("collection_name") == self.collection_name:
+            generation, collection_name = pointer["generation"], self.collection_name
+            vector_store = GenerationView(self.chunk_store, generation)
+        else:
+            if pointer and pointer.get("collection_name", "").startswith(self.collection_prefix):
+                generation, collection_name = pointer["generation"], pointer["collection_name"]
+            else:
+                generation, collection_name = 0, self.legacy_collection_name(0)
+            # Written before generations shared one collection; served as is until the next refresh rebuilds it
+            vector_store = self.open_vector_store(collection_name)
+        if not self.read_only:
+            # Chunks of a build that crashed before publishing, and of generations nobody reads any more
+            self.discard_generations_after(generation)
+            in_use = generations_in_use(INDEX_DIR, INDEX_READER_TIMEOUT)
+            self.purge_retired_chunks(min(in_use | {generation}))
+            self.remove_legacy_collections(keep={collection_name} | {self.legacy_collection_name(g) for g in in_use})
+        existing = vector_store.get(include=["documents", "metadatas"])
+        chunk_ids = {}
+        # The BM25 index is cheap to rebuild from the stored chunk texts, so it is not persisted
+        lexical_index = BM25Index()
+        near_duplicates = NearDuplicateIndex()
+        for cid, text, metadata in zip(existing["ids"], existing["documents"], existing["metadatas"]):
+            chunk_ids.setdefault(metadata["source"], []).append(cid)
+            lexical_index.add(cid, Document(page_content=text, metadata=metadata))
+            if not self.read_only:
+                near_duplicates.add(cid, near_duplicates.signature(text))
+        self.generation = generation
+        self.near_duplicates = near_duplicates
+        if not self.read_only and chunk_ids:
+            self.duplicate_sources = load_duplicate_sources(self.duplicates_path, generation)
+            if self.duplicate_sources is None:
+                logger.warning("No near-duplicate record for this index generation; text skipped as a duplicate "
+                               "will only come back on a full rebuild (INCREMENTAL_SCRAPE=false)")
+                self.duplicate_sources = {}
+        if chunk_ids:
+            self.chunk_ids = chunk_ids
+            self.index.publish(self.make_snapshot(generation, collection_name, vector_store, lexical_index, chunk_ids))
+            if self.read_only:
+                self.acknowledge_generations()
+            logger.info(f"Loaded persisted index generation {generation} with {len(existing['ids'])} chunks "
+                        f"from {len(chunk_ids)} sources in {time.time() - started:.2f}s")
+        else:
+            logger.info("No persisted index found, it will be built on the first scrape")
+
+    def remove_legacy_collections(self, keep):
+        # Per-generation collections from before generations shared one, once no query service reads them
+        pattern = re.compile(re.escape(self.collection_prefix) + r'(-g\d+)?')
+        for collection in self.chroma.list_collections():
+            # chromadb 0.6 lists bare names (a str subclass without attributes), other versions Collection objects
+            name = collection if isinstance(collection, str) else collection.name
+            if name not in keep and pattern.fullmatch(name):
+                self.chroma.delete_collection(name)
+                logger.info(f"Removed legacy index collection {name}")
+
+    def acknowledge_generations(self):
+        write_reader_state(INDEX_DIR, self.reader_id, self.index.generations())
+
+    def retire_generation(self, snapshot):
+        if self.read_only:
+            # Chunks belong to the ingest worker; tell it this process has stopped reading this generation
+            self.acknowledge_generations()
+            return
+        # Query services in other processes may still be reading the replaced generation, so its chunks are
+        # only purged once none of them reports it
+        self.lingering.append((snapshot.generation, time.time()))
+        self.drop_released_generations()
+
+    def drop_released_generations(self):
+        if not self.lingering:
+            return
+        in_use = generations_in_use(INDEX_DIR, INDEX_READER_TIMEOUT)
+        now = time.time()
+        # The grace period covers query services that read the pointer but have not reported yet
+        self.lingering = [(generation, retired_at) for generation, retired_at in self.lingering
+                          if generation in in_use or now - retired_at < INDEX_READER_TIMEOUT]
+        self.purge_retired_chunks(min([generation for generation, _ in self.lingering] + [self.generation]))
+        if not self.lingering:
+            try:
+                self.remove_legacy_collections(keep={self.collection_name})
+            except Exception as e:
+                logger.warning(f"Could not remove legacy index collections: {e}")
+
+    def purge_retired_chunks(self, oldest):
+        """Delete chunks replaced at or before oldest, the oldest generation anyone still reads."""
+        try:
+            self.chunk_store._collection.delete(where={"retired": {"$lte": oldest}})
+        except Exception as e:
+            logger.warning(f"Could not purge chunks replaced by generation {oldest} or earlier: {e}")
+
+    def retire_chunks(self, ids, generation, batch_size=500):
+        # Replaced chunks stay visible to the generations before this one; only their metadata changes
+        for start in range(0, len(ids), batch_size):
+            batch = ids[start:start + batch_size]
+            self.chunk_store._collection.update(ids=batch, metadatas=[{"retired": generation}] * len(batch))
+
+    def discard_generations_after(self, generation):
+        """Undo builds newer than generation that were never published: drop their chunks, un-retire the rest."""
+        collection = self.chunk_store._collection
+        collection.delete(where={"generation": {"$gt": generation}})
+        retired = collection.get(where={"$and": [{"retired": {"$gt": generation}}, {"retired": {"$lt": NOT_RETIRED}}]},
+                                 include=[])["ids"]
+        for start in range(0, len(retired), 500):
+            batch = retired[start:start + 500]
+            collection.update(ids=batch, metadatas=[{"retired": NOT_RETIRED}] * len(batch))
+
+    def split_into_chunks(self, sources, near_duplicates, generation):
+        text_splitter = RecursiveCharacterTextSplitter(chunk_size=512, chunk_overlap=128)
+        stats = CleaningStats()
+        chunks, ids, duplicates = [], {}, {}
+        for source in sources:
+            document = self.documents[source]
+            stats.pages += 1
+            stats.raw_chars += self.raw_sizes.get(source, len(document.page_content))
+            stats.page_chars += len(document.page_content)
+            # Split once uncleaned purely so the report can show what cleaning saved
+            uncleaned = text_splitter.split_text(document.page_content)
+            stats.chunks_before += len(uncleaned)
+            stats.chunk_chars_before += sum(len(text) for text in uncleaned)
+
+            cleaned = Document(page_content=self.boilerplate.clean(source, document.page_content), metadata=document.metadata)
+            source_chunks = text_splitter.split_documents([cleaned])
+            stats.chunks_after_boilerplate += len(source_chunks)
+            ids[source] = []
+            for i, chunk in enumerate(source_chunks):
+                signature = near_duplicates.signature(chunk.page_content)
+                original = near_duplicates.find(signature)
+                if original is not None:
+                    if source_key_of(original) != source_key(source):
+                        duplicates.setdefault(source, set()).add(source_key_of(original))
+                    continue
+                cid = chunk_id(source, generation, i)
+                near_duplicates.add(cid, signature)
+                ids[source].append(cid)
+                chunks.append(chunk)
+                stats.chunk_chars_indexed += len(chunk.page_content)
+        stats.chunks_indexed = len(chunks)
+        return chunks, ids, duplicates, stats
+
+    def restore_duplicates(self, stale_sources):
+        """Pages to re-chunk because text of theirs was skipped as a duplicate of a page now changed or gone."""
+        stale_keys = {source_key(source) for source in stale_sources}
+        dependents = {source for source, keys in self.duplicate_sources.items()
+                      if keys & stale_keys and source not in stale_sources}
+        # Unchanged pages are only in memory if they were parsed since this process started; the rest are
+        # fetched unconditionally next cycle, which finds them changed
+        missing = {source for source in dependents if source not in self.documents}
+        for source in missing:
+            self.scrape_state.forget(source)
+        if dependents:
+            logger.info(f"Re-chunking {len(dependents) - len(missing)} pages whose text was skipped as a duplicate "
+                        f"of a changed or removed page; {len(missing)} more are refetched next cycle")
+        return dependents - missing
 
     def prepare_vector_store(self):
+        """Build and publish the next index generation; raises if the build fails, keeping the current one."""
         logger.info("Preparing vector store")
-        embeddings = OllamaEmbeddings(
-            base_url=os.getenv("OLLAMA_URL"),
-            model="mxbai-embed-large"
-        )
+        started = time.perf_counter()
 
         # embeddings = HuggingFaceEmbeddings(
         #     model_name="sentence-transformers/all-MiniLM-L6-v2",
@@ -107,19 +623,95 @@ class FashionBot:
         #     encode_kwargs={'normalize_embeddings': False}
         # )
 
-        text_splitter = RecursiveCharacterTextSplitter(chunk_size=512, chunk_overlap=128)
-        chunks = text_splitter.split_documents(self.documents)
-
+        current = self.index.current
+        # A generation from before the shared collection is rebuilt into it once
+        legacy = current is not None and current.collection_name != self.collection_name
+        rebuild = current is None or legacy or not self.incremental
+        stale_sources = (self.changed_sources | self.removed_sources) & set(self.chunk_ids)
+        if not rebuild and not self.changed_sources and not stale_sources:
+            logger.info(f"No content changes detected, keeping index generation {current.generation}")
+            return
+
+        sources = self.documents if rebuild else set(self.changed_sources)
+        if not rebuild:
+            sources |= self.restore_duplicates(stale_sources)
+            stale_sources |= sources & set(self.chunk_ids)
+
+        # Near duplicates are checked against every chunk the new generation will hold
+        if rebuild:
+            near_duplicates = NearDuplicateIndex()
+        else:
+            near_duplicates = self.near_duplicates.copy()
+            for source in stale_sources:
+                for cid in self.chunk_ids[source]:
+                    near_duplicates.remove(cid)
+        with span("chunking"):
+            chunks, ids, duplicates, cleaning_stats = self.split_into_chunks(sources, near_duplicates, self.generation + 1)
+        logger.info(f"Content cleaning: {cleaning_stats.summary()}")
+        if rebuild and not chunks:
+            logger.warning("No documents to index")
+            return
         for i, chunk in enumerate(chunks[:5]):
             logger.debug(f"Chunk {i} from {chunk.metadata['source']}:\n{chunk.page_content[:500]}...")
 
-        self.vector_store = Chroma.from_documents(chunks, embeddings)
-        self.retriever = self.vector_store.as_retriever(k=20)
-        self.setup_conversation_chain()
-        self.data_fetching = False
-        logger.info("Vector store prepared")
-
-    def setup_conversation_chain(self):
+        # The next generation is written into the shared collection beside the current one, which cannot see
+        # it; unchanged chunks are neither copied nor rewritten, so the cost follows what changed
+        generation = self.generation + 1
+        try:
+            chunk_ids = {}
+            new_ids = [cid for source_ids in ids.values() for cid in source_ids]
+            if rebuild:
+                lexical_index = BM25Index()
+                replaced = [] if legacy else [cid for source_ids in self.chunk_ids.values() for cid in source_ids]
+            else:
+                chunk_ids.update({source: source_ids for source, source_ids in self.chunk_ids.items()
+                                  if source not in stale_sources and source not in ids})
+                lexical_index = current.lexical_index.copy()
+                replaced = [cid for source in stale_sources for cid in self.chunk_ids[source]]
+                for cid in replaced:
+                    lexical_index.remove(cid)
+            if chunks:
+                for chunk in chunks:
+                    chunk.metadata.update(generation=generation, retired=NOT_RETIRED)
+                # Unchanged text is served from the embedding cache, so only new text reaches the model
+                with span("embedding"):
+                    self.last_embedding_stats = self.embedding_pipeline.run(chunks, new_ids, sink=chroma_sink(self.chunk_store))
+                for cid, chunk in zip(new_ids, chunks):
+                    lexical_index.add(cid, chunk)
+            self.retire_chunks(replaced, generation)
+            CHUNKS.inc(len(replaced), result="replaced")
+            chunk_ids.update(ids)
+            snapshot = self.make_snapshot(generation, self.collection_name, GenerationView(self.chunk_store, generation),
+                                          lexical_index, chunk_ids)
+        except Exception:
+            logger.exception(f"Failed to build index generation {generation}, keeping the current one")
+            self.discard_generations_after(self.generation)
+            raise
+
+        if rebuild:
+            duplicate_sources = duplicates
+        else:
+            duplicate_sources = {source: keys for source, keys in self.duplicate_sources.items()
+                                 if source not in ids and source not in self.removed_sources}
+            duplicate_sources.update(duplicates)
+        save_duplicate_sources(self.duplicates_path, generation, duplicate_sources)
+        write_pointer(INDEX_DIR, generation, self.collection_name)
+        self.index.publish(snapshot)
+        self.generation = generation
+        self.chunk_ids = chunk_ids
+        self.near_duplicates = near_duplicates
+        self.duplicate_sources = duplicate_sources
+        self.last_cleaning_stats = cleaning_stats
+        record_stage("index_build", time.perf_counter() - started)
+        CHUNKS.inc(len(chunks), result="embedded")
+        CHUNKS.inc(cleaning_stats.chunks_before - cleaning_stats.chunks_after_boilerplate, result="boilerplate")
+        CHUNKS.inc(cleaning_stats.chunks_after_boilerplate - cleaning_stats.chunks_indexed, result="near_duplicate")
+        logger.info(f"Index generation {generation} ready: {'rebuilt' if rebuild else 'updated'} with "
+                    f"{sum(len(v) for v in chunk_ids.values())} chunks, embedded {len(chunks)} chunks from "
+                    f"{len(ids)} sources, dropped {len(stale_sources)} stale sources "
+                    f"(embedding cache: {self.embeddings.hits} hits, {self.embeddings.misses} misses)")
+
+    def setup_conversation_chain(self, retriever):
         logger.info("Setting up conversation chain")
 
         general_system_template = """
@@ -151,65 +743,216 @@ class FashionBot:
         ]
         aqa_prompt = ChatPromptTemplate.from_messages(messages)
 
-        self.conversation = ConversationalRetrievalChain.from_llm(
-            self.llm, retriever=self.retriever, memory=self.memory, combine_docs_chain_kwargs={"prompt": aqa_prompt}, verbose=True
+        def retrieve_context(inputs):
+            with span("retrieval", inputs.get("timings")):
+                documents = retriever.invoke(inputs["standalone_question"])
+            return "\n\n".join(f"[{document.metadata.get('source', '')}] {document.page_content}" for document in documents)
+
+        # Written as a runnable pipeline rather than ConversationalRetrievalChain so the final LLM step can stream
+        conversation = (
+            RunnablePassthrough.assign(standalone_question=RunnableLambda(self.condense_question))
+            | RunnablePassthrough.assign(context=RunnableLambda(retrieve_context))
+            | aqa_prompt
+            | self.llm
+            | StrOutputParser()
         )
         logger.info("Conversation chain set up")
+        return conversation
+
+    def condense_question(self, inputs):
+        # Follow-ups are rewritten into a standalone question before retrieval, as ConversationalRetrievalChain did
+        if not inputs["chat_history"]:
+            return inputs["question"]
+        with span("condense", inputs.get("timings")):
+            return self.llm.invoke(CONDENSE_QUESTION_PROMPT.format(
+                chat_history=inputs["chat_history"],
+                question=inputs["question"],
+            )).content.strip()
 
     async def initialize_data(self):
-        logger.info("Initializing data")
-        self.data_fetching = True
-        urls = self.get_urls()
-        await self.scrape_data_from_urls(urls)
-
-    def get_response(self, question, num_results=20):
-        if self.data_fetching:
-            logger.warning("Data fetching in progress, unable to respond")
-            return "Currently fetching data. Please try again in a few moments."
-        elif not self.vector_store:
-            logger.warning("Vector store not available, unable to respond")
-            return "Data is not yet available. Please wait a moment and try again."
-        
-        self.first_fetch = False
-        
-        if not self.vector_store:
-            logger.warning("Vector store not available, unable to respond")
-            return "Data is not yet available. Please try again in a few moments."
-        
+        if self.read_only:
+            raise RuntimeError("A read-only FashionBot does not scrape; run ingest_worker.py instead")
+        # One trace id per refresh cycle; tasks started inside it inherit the id
+        with trace() as trace_id:
+            logger.info(f"Initializing data (refresh {trace_id})")
+            self.data_fetching = True
+            started = time.perf_counter()
+            outcome = "failed"
+            try:
+                urls = self.get_urls()
+                await self.scrape_data_from_urls(urls)
+                outcome = "ok"
+            finally:
+                REFRESHES.inc(outcome=outcome)
+                record_stage("refresh", time.perf_counter() - started)
+
+    def answer_from_catalog(self, question):
+        catalog = self.catalog
+        if not len(catalog):
+            return None, None, None
+        started = time.perf_counter()
+        query = parse_catalog_query(question, catalog)
+        if not query.is_pure_filter:
+            return query, None, None
+        products = catalog.search(query)
+        if products:
+            answer = f"Here are {len(products)} products ({query.describe()}):"
+        else:
+            answer = f"I couldn't find any products matching {query.describe()}."
+        logger.info(f"Answered from the product catalog in {(time.perf_counter() - started) * 1000:.1f} ms")
+        return query, answer, products
+
+    def summarize_history(self, previous_summary, turns):
+        transcript = "\n".join(f"User: {question}\nAssistant: {answer}" for question, answer in turns)
+        prompt = (
+            "Update the running summary of a shopping conversation about Pakistani fashion brands. "
+            "Keep the brands, products, colours, sizes and budgets the user cares about, in at most 80 words.\n\n"
+            f"Current summary: {previous_summary or 'none'}\n\nNew turns:\n{transcript}\n\nUpdated summary:"
+        )
+        with span("summarize_history"):
+            return self.llm.invoke(prompt).content.strip()
+
+    def remember(self, session_id, question, answer):
+        self.sessions.add_turn(session_id, question, answer)
+        return answer
+
+    def stream_response(self, question, session_id="default"):
+        """Yield {"type": "text", "text": ...} deltas and {"type": "products", "products": [...]} cards."""
+        started = time.perf_counter()
+        outcome = {"path": "error"}
+        timings = {}
+        first_text_at = None
         try:
-            logger.info(f"Generating response for question: {question}")
-            search_results = []
-            
-            # Iterate over each URL in urls.txt and generate search URLs
-            urls = self.get_urls()
-            for url in urls:
-                search_url = f"{url}/search?q={question.replace(' ', '+')}"
-                search_results.append(f"Check out products at: {search_url}")
-
-            # Return formatted response with URLs
-            formatted_response = "\n".join(search_results)
-            logger.info(f"Response generated for question: {question}")
-            return formatted_response
-        except Exception as e:
-            logger.exception(f"An error occurred while generating the response: {e}")
-            return "An error occurred while processing your request. Please try again later."
-
-    def start_periodic_scraping(self):
-        def run_scraping():
-            while True:
-                logger.info("Starting periodic scraping")
+            for event in self.answer_events(question, session_id, outcome, timings):
+                if first_text_at is None and event["type"] == "text":
+                    first_text_at = time.perf_counter()
+                yield event
+        except GeneratorExit:
+            # Closed early by the caller, e.g. the client disconnected mid-answer
+            outcome["path"] = "abandoned"
+            raise
+        finally:
+            path = outcome["path"]
+            total = time.perf_counter() - started
+            QUERIES.inc(path=path)
+            QUERY_SECONDS.observe(total, path=path)
+            # Observed once the answer is done, so it carries the path the answer finally took
+            if first_text_at is not None:
+                FIRST_TOKEN_SECONDS.observe(first_text_at - started, path=path)
+            logger.info(f"Answered via {path} in {total * 1000:.0f} ms",
+                        extra={"path": path, "total_ms": round(total * 1000, 1),
+                               "stages": {stage: round(seconds * 1000, 1) for stage, seconds in timings.items()}})
+
+    def answer_events(self, question, session_id, outcome, timings):
+        memory = self.sessions.get(session_id)
+
+        # Filter and sort questions never need the LLM
+        with span("catalog", timings):
+            query, answer, products = self.answer_from_catalog(question)
+        if answer is not None:
+            outcome["path"] = "catalog"
+            yield {"type": "text", "text": answer}
+            if products:
+                yield {"type": "products", "products": products}
+            self.remember(session_id, question, f"{answer}\n\n{format_products(products)}" if products else answer)
+            return
+
+        # Pin the published generation so a refresh swapping in a new one cannot pull it away mid-query
+        with self.index.acquire() as snapshot:
+            if snapshot is None:
+                outcome["path"] = "unavailable"
+                if self.data_fetching:
+                    logger.warning("Data fetching in progress, unable to respond")
+                    yield {"type": "text", "text": "Currently fetching data. Please try again in a few moments."}
+                    return
+                logger.warning("Vector store not available, unable to respond")
+                yield {"type": "text", "text": "Data is not yet available. Please wait a moment and try again."}
+                return
+
+            self.first_fetch = False
+
+            # Cached answers are only valid for the index and catalog they were generated from
+            cache_version = (snapshot.generation, self.catalog_version)
+            # Questions naming no brand, category, colour or price only get exact matches
+            entities = query.entities if query is not None and query.has_filters else None
+            use_cache = self.answer_cache.cacheable(question, memory.has_history())
+            vector = None
+            if use_cache:
+                with span("answer_cache", timings):
+                    cached, vector = self.answer_cache.lookup(question, cache_version, entities)
+                if cached is not None:
+                    outcome["path"] = "cache"
+                    yield {"type": "text", "text": cached["text"]}
+                    if cached["products"]:
+                        yield {"type": "products", "products": cached["products"]}
+                    self.remember(session_id, question, cached["text"])
+                    return
+
+            started = time.perf_counter()
+            first_token_at = None
+            parts = []
+            outcome["path"] = "llm"
+            try:
+                logger.info(f"Generating response for question: {question} (index generation {snapshot.generation})")
+                history = memory.transcript()
+                inputs = {"question": question, "chat_history": history, "timings": timings}
+                for token in snapshot.conversation.stream(inputs):
+                    if not token:
+                        continue
+                    if first_token_at is None:
+                        first_token_at = time.perf_counter()
+                        # Condense and retrieval run before the LLM call inside the same stream
+                        llm_wait = first_token_at - started - timings.get("condense", 0.0) - timings.get("retrieval", 0.0)
+                        record_stage("llm_first_token", max(llm_wait, 0.0), timings)
+                    parts.append(token)
+                    yield {"type": "text", "text": token}
+            except Exception as e:
+                outcome["path"] = "error"
+                logger.exception(f"An error occurred while generating the response: {e}")
+                yield {"type": "text", "text": "An error occurred while processing your request. Please try again later."}
+                return
+            if first_token_at is not None:
+                record_stage("llm_generation", time.perf_counter() - first_token_at, timings)
+
+            formatted_response = "".join(parts)
+            # The LLM handles the open-ended part; structured filters still come from the catalog
+            products = self.catalog.search(query) if query is not None and query.has_filters else []
+            if products:
+                yield {"type": "products", "products": products}
+            # The cache is shared by every user, so an answer shaped by one user's chat history is never stored
+            if use_cache and not history:
+                self.answer_cache.store(question, {"text": formatted_response, "products": products}, cache_version,
+                                        vector, entities)
+            memory_text = formatted_response
+            if products:
+                memory_text += f"\n\nMatching products from the catalog:\n\n{format_products(products)}"
+            self.remember(session_id, question, memory_text)
+
+    def get_response(self, question, num_results=20, session_id="default"):
+        parts, products = [], []
+        for event in self.stream_response(question, session_id=session_id):
+            if event["type"] == "text":
+                parts.append(event["text"])
+            else:
+                products.extend(event["products"])
+        response = "".join(parts)
+        if products:
+            response += f"\n\n{format_products(products)}"
+        return response
+
+    def run_periodic_scraping(self):
+        while True:
+            logger.info("Starting periodic scraping")
+            try:
                 asyncio.run(self.initialize_data())
-                logger.info(f"Sleeping for {self.fetch_interval} seconds before next scrape")
-                time.sleep(self.fetch_interval)
+            except Exception as e:
+                # Keep serving the published generation and try again next cycle
+                logger.exception(f"Periodic scraping failed: {e}")
+                self.data_fetching = False
+            logger.info(f"Sleeping for {self.fetch_interval} seconds before next scrape")
+            time.sleep(self.fetch_interval)
 
-        thread = threading.Thread(target=run_scraping, daemon=True)
+    def start_periodic_scraping(self):
+        thread = threading.Thread(target=self.run_periodic_scraping, daemon=True)
         thread.start()
         logger.info("Periodic scraping thread started")
-
-# Initialize the bot and start periodic scraping
-fashion_bot = FashionBot()
-fashion_bot.start_periodic_scraping()
-
-# Expose the fashion_bot instance
-def get_fashion_bot():
-    return fashion_bot
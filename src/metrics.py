@@ -0,0 +1,243 @@
+import json
+import time
+import bisect
+import threading
+import logging
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Counters, gauges and latency histograms rendered in the Prometheus text format. Each process
+# (ingest worker, query service, Streamlit app) has its own registry and serves it on /metrics.
+
+logger = logging.getLogger(__name__)
+
+# Seconds; covers cache hits (milliseconds) through full refresh cycles (minutes)
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 900)
+
+
+def escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def format_labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{name}="{escape(value)}"' for name, value in labels.items()) + "}"
+
+
+def format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Metric:
+    kind = None
+
+    def __init__(self, name, description, labels=()):
+        self.name = name
+        self.description = description
+        self.label_names = tuple(labels)
+        self.lock = threading.Lock()
+        self.values = {}
+
+    def key(self, labels):
+        if set(labels) != set(self.label_names):
+            raise ValueError(f"{self.name} takes labels {self.label_names}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.label_names)
+
+    def labels_of(self, key):
+        return dict(zip(self.label_names, key))
+
+    def items(self):
+        with self.lock:
+            return [(key, value) for key, value in self.values.items()]
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = self.key(labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def value(self, **labels):
+        with self.lock:
+            return self.values.get(self.key(labels), 0)
+
+    def samples(self):
+        for key, value in self.items():
+            yield self.name, self.labels_of(key), value
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def set(self, value, **labels):
+        key = self.key(labels)
+        with self.lock:
+            self.values[key] = value
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name, description, labels=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, description, labels)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        key = self.key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self.lock:
+            entry = self.values.get(key)
+            if entry is None:
+                entry = self.values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            entry[0][index] += 1
+            entry[1] += value
+            entry[2] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def items(self):
+        with self.lock:
+            return [(key, (list(counts), total, count)) for key, (counts, total, count) in self.values.items()]
+
+    def quantile(self, q, counts, count):
+        """Estimate a quantile from bucket counts the way Prometheus' histogram_quantile does."""
+        if not count:
+            return None
+        rank = q * count
+        seen = 0
+        for index, bucket_count in enumerate(counts):
+            if seen + bucket_count >= rank and bucket_count:
+                lower = self.buckets[index - 1] if index > 0 else 0.0
+                if index == len(self.buckets):
+                    return lower
+                return lower + (self.buckets[index] - lower) * (rank - seen) / bucket_count
+            seen += bucket_count
+        return self.buckets[-1]
+
+    def samples(self):
+        for key, (counts, total, count) in self.items():
+            labels = self.labels_of(key)
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += bucket_count
+                yield f"{self.name}_bucket", {**labels, "le": format_value(float(bound))}, cumulative
+            yield f"{self.name}_sum", labels, total
+            yield f"{self.name}_count", labels, count
+
+    def summary(self, key, counts, total, count):
+        return {
+            "labels": self.labels_of(key),
+            "count": count,
+            "sum": round(total, 6),
+            **{f"p{int(q * 100)}": self.quantile(q, counts, count) for q in (0.5, 0.95, 0.99)},
+        }
+
+
+class Registry:
+    def __init__(self):
+        self.metrics = {}
+        self.collectors = []
+        self.lock = threading.Lock()
+
+    def register(self, cls, name, description, labels=(), **kwargs):
+        # Get-or-create, so a module executed twice (Streamlit reruns, reloads) shares its metrics
+        with self.lock:
+            metric = self.metrics.get(name)
+            if metric is None:
+                metric = self.metrics[name] = cls(name, description, labels, **kwargs)
+            elif type(metric) is not cls or metric.label_names != tuple(labels):
+                raise ValueError(f"Metric {name} is already registered with a different type or labels")
+            return metric
+
+    def counter(self, name, description, labels=()):
+        return self.register(Counter, name, description, labels)
+
+    def gauge(self, name, description, labels=()):
+        return self.register(Gauge, name, description, labels)
+
+    def histogram(self, name, description, labels=(), buckets=DEFAULT_BUCKETS):
+        return self.register(Histogram, name, description, labels, buckets=buckets)
+
+    def on_collect(self, callback):
+        """Run callback before every render, e.g. to set gauges that mirror another object's state."""
+        self.collectors.append(callback)
+
+    def collect(self):
+        for callback in list(self.collectors):
+            try:
+                callback()
+            except Exception as e:
+                logger.warning(f"Metrics collector {callback} failed: {e}")
+        with self.lock:
+            return sorted(self.metrics.values(), key=lambda metric: metric.name)
+
+    def render(self):
+        lines = []
+        for metric in self.collect():
+            lines.append(f"# HELP {metric.name} {metric.description}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            for name, labels, value in metric.samples():
+                lines.append(f"{name}{format_labels(labels)} {format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+    def snapshot(self):
+        """Plain-dict view for the admin page: values per label set, histograms as count/sum/p50/p95/p99."""
+        snapshot = {}
+        for metric in self.collect():
+            if isinstance(metric, Histogram):
+                samples = [metric.summary(key, *entry) for key, entry in metric.items()]
+            else:
+                samples = [{"labels": metric.labels_of(key), "value": value} for key, value in metric.items()]
+            snapshot[metric.name] = {"type": metric.kind, "help": metric.description, "samples": samples}
+        return snapshot
+
+
+REGISTRY = Registry()
+counter = REGISTRY.counter
+gauge = REGISTRY.gauge
+histogram = REGISTRY.histogram
+
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def start_http_server(port, host="0.0.0.0", registry=REGISTRY):
+    """Serve /metrics (Prometheus text) and /metrics.json (snapshot) from a daemon thread."""
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?")[0] == "/metrics":
+                body, content_type = registry.render().encode('utf-8'), PROMETHEUS_CONTENT_TYPE
+            elif self.path.split("?")[0] == "/metrics.json":
+                body, content_type = json.dumps(registry.snapshot()).encode('utf-8'), "application/json"
+            else:
+                self.send_error(404)
+                return
+            self.send_response(200)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            # Scrapes every few seconds would drown the application log
+            pass
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
+    logger.info(f"Serving metrics on http://{host}:{port}/metrics")
+    return server
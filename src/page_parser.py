@@ -0,0 +1,81 @@
+import os
+import asyncio
+import logging
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from urllib.parse import urljoin
+from bs4 import BeautifulSoup
+from catalog import extract_products
+from content_cleaner import strip_boilerplate
+
+logger = logging.getLogger(__name__)
+
+MAX_LINKS = 1000
+
+
+def parse_page(url, html):
+    # Runs in a worker process, so it must stay a plain top-level function of picklable values
+    soup = BeautifulSoup(html, 'html.parser')
+    raw_chars = len(soup.get_text(separator=' ', strip=True))
+
+    # Structured product records from JSON-LD / OpenGraph, read before scripts are stripped
+    products = extract_products(url, soup)
+
+    # Outgoing links for the crawl frontier, which filters them by site, depth and budget; menus included
+    links = list(dict.fromkeys(urljoin(url, a['href']) for a in soup.find_all('a', href=True)))[:MAX_LINKS]
+
+    strip_boilerplate(soup)
+
+    # One text block per line, so repeated blocks can be recognised across a site's pages
+    content = soup.get_text(separator='\n', strip=True)
+
+    return {
+        "url": url,
+        "content": content,
+        "raw_chars": raw_chars,
+        "products": products,
+        "links": links,
+    }
+
+
+class ParsePool:
+    """Runs parse_page on a process pool, or inline when PARSE_WORKERS is 0."""
+
+    def __init__(self, workers=None):
+        if workers is None:
+            workers = int(os.getenv("PARSE_WORKERS", str(os.cpu_count() or 1)))
+        self.workers = max(0, workers)
+        self.executor = None
+
+    def get_executor(self):
+        if self.executor is None and self.workers > 0:
+            # spawn keeps workers from inheriting the scraping thread and the bot's open handles
+            self.executor = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+            logger.info(f"Started HTML parse pool with {self.workers} processes")
+        return self.executor
+
+    @property
+    def consumers(self):
+        # Two consumers per process keeps every worker busy while results are handed back
+        return max(1, self.workers * 2)
+
+    async def parse(self, url, html):
+        executor = self.get_executor()
+        if executor is None:
+            return parse_page(url, html)
+        loop = asyncio.get_running_loop()
+        try:
+            return await loop.run_in_executor(executor, parse_page, url, html)
+        except BrokenProcessPool:
+            logger.error(f"Parse pool broke while parsing {url}, restarting it")
+            self.shutdown()
+            return parse_page(url, html)
+
+    def shutdown(self):
+        if self.executor is not None:
+            self.executor.shutdown(wait=False, cancel_futures=True)
+            self.executor = None
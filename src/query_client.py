@@ -0,0 +1,82 @@
+import os
+import json
+import threading
+import logging
+import requests
+from tracing import current_trace_id
+
+logger = logging.getLogger(__name__)
+
+BUSY_TEXT = "The assistant is busy or still loading. Please try again in a moment."
+UNAVAILABLE_TEXT = "The assistant is unavailable right now. Please try again later."
+
+
+class QueryClient:
+    """Talks to query_service.py; deliberately free of any LangChain or index imports."""
+
+    def __init__(self, base_url=None, timeout=120, ingest_metrics_url=None):
+        self.base_url = (base_url or os.getenv("QUERY_SERVICE_URL", "http://localhost:8600")).rstrip('/')
+        self.ingest_metrics_url = (ingest_metrics_url or os.getenv("INGEST_METRICS_URL", "http://localhost:9600")).rstrip('/')
+        self.timeout = timeout
+        # requests.Session is not thread-safe; Streamlit runs each user's script on its own thread
+        self.local = threading.local()
+
+    @property
+    def session(self):
+        if not hasattr(self.local, "session"):
+            self.local.session = requests.Session()
+        return self.local.session
+
+    def stream_response(self, question, session_id="default"):
+        """Yield the same events as FashionBot.stream_response."""
+        # Forward the caller's trace id so the service logs the request under the same id
+        trace_id = current_trace_id()
+        try:
+            with self.session.post(
+                f"{self.base_url}/query",
+                json={"question": question, "session_id": session_id},
+                headers={"X-Request-ID": trace_id} if trace_id else None,
+                stream=True,
+                timeout=(5, self.timeout),
+            ) as response:
+                if response.status_code == 503:
+                    yield {"type": "text", "text": BUSY_TEXT}
+                    return
+                response.raise_for_status()
+                for line in response.iter_lines():
+                    if line:
+                        yield json.loads(line)
+        except requests.RequestException as e:
+            logger.error(f"Query service request failed: {e}")
+            yield {"type": "text", "text": UNAVAILABLE_TEXT}
+
+    def clear_session(self, session_id):
+        try:
+            self.session.delete(f"{self.base_url}/sessions/{requests.utils.quote(session_id, safe='')}", timeout=5)
+        except requests.RequestException as e:
+            logger.error(f"Failed to clear chat session {session_id}: {e}")
+
+    def thumbnail(self, image_url):
+        """Resized image bytes from the service's thumbnail cache, or None if it cannot serve one."""
+        try:
+            response = self.session.get(f"{self.base_url}/thumbnails", params={"url": image_url}, timeout=(5, 30))
+        except requests.RequestException as e:
+            logger.debug(f"Thumbnail request failed for {image_url}: {e}")
+            return None
+        return response.content if response.status_code == 200 else None
+
+    def metrics(self, base_url=None):
+        """Metrics snapshot of the query service, or of another process serving /metrics.json; None if unreachable."""
+        try:
+            response = self.session.get(f"{(base_url or self.base_url).rstrip('/')}/metrics.json", timeout=5)
+            response.raise_for_status()
+            return response.json()
+        except (requests.RequestException, ValueError) as e:
+            logger.debug(f"Metrics request failed: {e}")
+            return None
+
+    def ready(self):
+        try:
+            return self.session.get(f"{self.base_url}/readyz", timeout=2).status_code == 200
+        except requests.RequestException:
+            return False
@@ -0,0 +1,248 @@
+import os
+import re
+import json
+import asyncio
+import argparse
+import logging
+import threading
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+import aiohttp
+from aiohttp import web
+from dotenv import load_dotenv
+from crawler import CrawlConfig
+from tracing import new_trace_id, trace
+import metrics
+
+# HTTP API over the published index. Any number of Streamlit replicas share one of these; the
+# index itself is built by ingest_worker.py, so adding UI replicas never adds scraping or embedding.
+#
+#   python src/query_service.py --port 8600
+#
+#   POST   /query              {"question": ..., "session_id": ...} -> NDJSON stream of answer events
+#   DELETE /sessions/{id}      forget a user's chat history
+#   GET    /thumbnails?url=    cached thumbnail of a catalog product image
+#   GET    /healthz            process is up
+#   GET    /readyz             index or catalog loaded, 503 until then
+#   GET    /metrics            Prometheus metrics; /metrics.json for the admin page
+
+logger = logging.getLogger(__name__)
+
+ACTIVE_QUERIES = metrics.gauge("pakfashion_query_active", "Queries being answered")
+WAITING_QUERIES = metrics.gauge("pakfashion_query_waiting", "Queries waiting for a free slot")
+REJECTED_QUERIES = metrics.counter("pakfashion_query_rejected_total", "Queries turned away with a 503", ["reason"])
+
+# Callers may pass their own X-Request-ID; anything else gets a fresh trace id
+TRACE_ID_PATTERN = re.compile(r"^[A-Za-z0-9._-]{1,64}$")
+
+ERROR_EVENT = {"type": "text", "text": "An error occurred while processing your request. Please try again later."}
+
+
+async def stream_events(bot, executor, question, session_id):
+    # stream_response is a blocking generator (LLM, Chroma); run it on a worker thread and hand events back
+    loop = asyncio.get_running_loop()
+    events = asyncio.Queue()
+    done = object()
+    # Set when the consumer goes away, so the worker stops at the next token instead of finishing an answer nobody reads
+    stop = threading.Event()
+
+    def produce():
+        answer = bot.stream_response(question, session_id=session_id)
+        try:
+            for event in answer:
+                if stop.is_set():
+                    break
+                loop.call_soon_threadsafe(events.put_nowait, event)
+        except Exception as e:
+            logger.exception(f"Query failed: {e}")
+            loop.call_soon_threadsafe(events.put_nowait, ERROR_EVENT)
+        finally:
+            # Closed on this thread, which is the one running it; this also ends the LLM stream
+            answer.close()
+            loop.call_soon_threadsafe(events.put_nowait, done)
+
+    # The worker thread runs in a copy of this context so its log records keep the request's trace id
+    producer = loop.run_in_executor(executor, contextvars.copy_context().run, produce)
+    try:
+        while True:
+            event = await events.get()
+            if event is done:
+                break
+            yield event
+    finally:
+        stop.set()
+        # Hold the caller's slot until the worker thread is actually free
+        await asyncio.shield(producer)
+
+
+def create_app(bot_factory, max_concurrency=4, max_queue=32, poll_interval=10.0, thumbnail_cache=None):
+    app = web.Application()
+    executor = ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix="query")
+    app["bot"] = None
+    app["active"] = 0
+    app["waiting"] = 0
+
+    def collect_metrics():
+        ACTIVE_QUERIES.set(app["active"])
+        WAITING_QUERIES.set(app["waiting"])
+    metrics.REGISTRY.on_collect(collect_metrics)
+
+    async def load_and_watch():
+        loop = asyncio.get_running_loop()
+        # Loading the index takes a while; the port is already open so /healthz answers meanwhile
+        app["bot"] = await loop.run_in_executor(None, bot_factory)
+        logger.info("Query service ready")
+        while True:
+            await asyncio.sleep(poll_interval)
+            try:
+                await loop.run_in_executor(None, app["bot"].sync_from_disk)
+            except Exception as e:
+                logger.exception(f"Failed to load the published index: {e}")
+
+    async def on_startup(app):
+        # Created here so it belongs to the loop run_app starts
+        app["slots"] = asyncio.Semaphore(max_concurrency)
+        app["loader"] = asyncio.create_task(load_and_watch())
+        app["image_session"] = aiohttp.ClientSession(
+            timeout=aiohttp.ClientTimeout(total=20),
+            headers={"User-Agent": CrawlConfig().user_agent},
+        )
+
+    async def on_cleanup(app):
+        app["loader"].cancel()
+        await app["image_session"].close()
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    def is_ready():
+        bot = app["bot"]
+        return bot is not None and (bot.index.current is not None or len(bot.catalog) > 0)
+
+    def busy(reason):
+        REJECTED_QUERIES.inc(reason=reason)
+        return web.json_response({"error": reason}, status=503, headers={"Retry-After": "1"})
+
+    async def query(request):
+        trace_id = request.headers.get("X-Request-ID", "")
+        with trace(trace_id if TRACE_ID_PATTERN.match(trace_id) else new_trace_id()) as trace_id:
+            return await answer(request, trace_id)
+
+    async def answer(request, trace_id):
+        try:
+            payload = await request.json()
+        except ValueError:
+            return web.json_response({"error": "body must be JSON"}, status=400)
+        if not isinstance(payload, dict):
+            return web.json_response({"error": "body must be a JSON object"}, status=400)
+        question = str(payload.get("question") or "").strip()
+        if not question:
+            return web.json_response({"error": "question is required"}, status=400)
+        session_id = str(payload.get("session_id") or "default")
+        if app["bot"] is None:
+            return busy("loading")
+        # Bounded queue: shed load early instead of letting requests pile up behind slow LLM calls
+        if app["waiting"] >= max_queue:
+            logger.warning(f"Query queue full ({app['waiting']} waiting), rejecting request")
+            return busy("queue full")
+
+        app["waiting"] += 1
+        try:
+            await app["slots"].acquire()
+        finally:
+            app["waiting"] -= 1
+        app["active"] += 1
+        try:
+            response = web.StreamResponse(headers={"Content-Type": "application/x-ndjson", "X-Trace-Id": trace_id})
+            await response.prepare(request)
+            events = stream_events(app["bot"], executor, question, session_id)
+            try:
+                async for event in events:
+                    await response.write((json.dumps(event, default=str) + "\n").encode('utf-8'))
+                await response.write_eof()
+            except ConnectionResetError:
+                # aiohttp's ClientConnectionResetError included; the user closed the tab or the client timed out
+                logger.info("Client disconnected, abandoning the answer")
+            finally:
+                await events.aclose()
+            return response
+        finally:
+            app["active"] -= 1
+            app["slots"].release()
+
+    async def clear_session(request):
+        if app["bot"] is None:
+            return busy("loading")
+        app["bot"].sessions.clear(request.match_info["session_id"])
+        return web.Response(status=204)
+
+    async def thumbnail(request):
+        url = request.query.get("url", "")
+        bot = app["bot"]
+        if thumbnail_cache is None or bot is None or url not in bot.catalog.image_urls:
+            return web.json_response({"error": "unknown image"}, status=404)
+        path = await thumbnail_cache.get(app["image_session"], url)
+        if path is None:
+            return web.json_response({"error": "image unavailable"}, status=404)
+        # Thumbnails are content-addressed, so a URL's bytes only change if the brand replaces the image
+        return web.FileResponse(path, headers={"Content-Type": "image/webp", "Cache-Control": "public, max-age=86400"})
+
+    async def healthz(request):
+        return web.json_response({"status": "ok"})
+
+    async def readyz(request):
+        bot = app["bot"]
+        status = {
+            "ready": is_ready(),
+            "generation": bot.generation if bot else None,
+            "products": len(bot.catalog) if bot else 0,
+            "active": app["active"],
+            "waiting": app["waiting"],
+        }
+        return web.json_response(status, status=200 if status["ready"] else 503)
+
+    async def prometheus_metrics(request):
+        return web.Response(body=metrics.REGISTRY.render().encode('utf-8'),
+                            headers={"Content-Type": metrics.PROMETHEUS_CONTENT_TYPE})
+
+    async def metrics_snapshot(request):
+        return web.json_response(metrics.REGISTRY.snapshot())
+
+    app.on_startup.append(on_startup)
+    app.on_cleanup.append(on_cleanup)
+    app.router.add_post("/query", query)
+    app.router.add_delete("/sessions/{session_id}", clear_session)
+    app.router.add_get("/thumbnails", thumbnail)
+    app.router.add_get("/healthz", healthz)
+    app.router.add_get("/readyz", readyz)
+    app.router.add_get("/metrics", prometheus_metrics)
+    app.router.add_get("/metrics.json", metrics_snapshot)
+    return app
+
+
+def main():
+    load_dotenv()
+    parser = argparse.ArgumentParser(description="Serve FashionBot answers over HTTP")
+    parser.add_argument("--host", default=os.getenv("QUERY_SERVICE_HOST", "0.0.0.0"))
+    parser.add_argument("--port", type=int, default=int(os.getenv("QUERY_SERVICE_PORT", "8600")))
+    parser.add_argument("--concurrency", type=int, default=int(os.getenv("QUERY_CONCURRENCY", "4")))
+    parser.add_argument("--queue", type=int, default=int(os.getenv("QUERY_QUEUE_SIZE", "32")))
+    parser.add_argument("--poll-interval", type=float, default=float(os.getenv("INDEX_POLL_INTERVAL", "10")))
+    args = parser.parse_args()
+
+    from main import FashionBot, INDEX_DIR
+    from image_pipeline import ThumbnailCache
+    from tracing import configure_logging
+    configure_logging('query_service.log')
+    thumbnails = ThumbnailCache(
+        os.getenv("THUMBNAIL_DIR", os.path.join(INDEX_DIR, "thumbnails")),
+        max_bytes=int(os.getenv("THUMBNAIL_CACHE_MAX_MB", "256")) * 1024 * 1024,
+        size=int(os.getenv("THUMBNAIL_SIZE", "320")),
+    )
+    web.run_app(
+        create_app(lambda: FashionBot(read_only=True), args.concurrency, args.queue, args.poll_interval, thumbnails),
+        host=args.host,
+        port=args.port,
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,150 @@
+import os
+import sys
+import json
+import time
+import argparse
+import logging
+from dotenv import load_dotenv
+from langchain_ollama import OllamaEmbeddings
+from langchain.vectorstores import Chroma
+from langchain.schema import Document
+from embedding_cache import CachedEmbeddings
+from hybrid_retriever import BM25Index, HybridRetriever
+from index_snapshot import SHARED_COLLECTION_SUFFIX, GenerationView, chroma_client, read_pointer
+from frontier import site_of, url_key
+
+# Recall and latency of each retrieval mode against a held-out query set, read from the persisted index.
+#
+#   python src/retrieval_report.py --queries retrieval_queries.jsonl --k 5 --output retrieval_report.json
+#   python src/retrieval_report.py --pool candidates.jsonl    # pages to judge for unlabelled queries
+
+logger = logging.getLogger(__name__)
+
+MODES = ("dense", "lexical", "hybrid", "hybrid_rerank")
+
+
+def load_queries(path):
+    with open(path, 'r') as file:
+        return [json.loads(line) for line in file if line.strip()]
+
+
+def is_labelled(judgment):
+    return bool(judgment.get("relevant_urls") or judgment.get("relevant_sites"))
+
+
+def is_relevant(document, judgment):
+    # Only judged labels count; matching the query's own words would favour keyword retrieval by construction
+    source = document.metadata.get("source", "")
+    if url_key(source) in {url_key(url) for url in judgment.get("relevant_urls") or []}:
+        return True
+    site = site_of(source)
+    return any(site == label or site.endswith("." + label) for label in judgment.get("relevant_sites") or [])
+
+
+def percentile(values, fraction):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))]
+
+
+def open_index():
+    index_dir = os.getenv("INDEX_DIR", "index")
+    model = os.getenv("EMBEDDING_MODEL", "mxbai-embed-large")
+    pointer = read_pointer(index_dir)
+    if pointer is None:
+        sys.exit(f"No published index found in {index_dir}; run the bot once to build it")
+    embeddings = CachedEmbeddings(
+        OllamaEmbeddings(base_url=os.getenv("OLLAMA_URL"), model=model),
+        model_name=model,
+        path=os.path.join(index_dir, "embedding_cache.sqlite"),
+    )
+    vector_store = Chroma(
+        client=chroma_client(index_dir),
+        collection_name=pointer["collection_name"],
+        embedding_function=embeddings,
+    )
+    if pointer["collection_name"].endswith(SHARED_COLLECTION_SUFFIX):
+        # Other generations share the collection; read only the published one
+        vector_store = GenerationView(vector_store, pointer["generation"])
+    existing = vector_store.get(include=["documents", "metadatas"])
+    bm25 = BM25Index()
+    for cid, text, metadata in zip(existing["ids"], existing["documents"], existing["metadatas"]):
+        bm25.add(cid, Document(page_content=text, metadata=metadata))
+    return vector_store, bm25
+
+
+def evaluate(retriever, queries):
+    hits, reciprocal_ranks, latencies = 0, [], []
+    for judgment in queries:
+        started = time.perf_counter()
+        documents = retriever.invoke(judgment["query"])
+        latencies.append((time.perf_counter() - started) * 1000)
+        rank = next((i for i, document in enumerate(documents, start=1) if is_relevant(document, judgment)), None)
+        hits += rank is not None
+        reciprocal_ranks.append(1.0 / rank if rank else 0.0)
+    return {
+        "recall_at_k": round(hits / len(queries), 3),
+        "mrr": round(sum(reciprocal_ranks) / len(queries), 3),
+        "latency_p50_ms": round(percentile(latencies, 0.5), 1),
+        "latency_p95_ms": round(percentile(latencies, 0.95), 1),
+    }
+
+
+def write_pool(retrievers, queries, path):
+    # Union of every mode's top k, in source order and without the modes that found each page, so
+    # whoever judges them cannot favour one retriever
+    with open(path, 'w') as file:
+        for judgment in queries:
+            candidates = {}
+            for retriever in retrievers:
+                for document in retriever.invoke(judgment["query"]):
+                    source = document.metadata.get("source", "")
+                    candidates.setdefault(source, document.page_content[:300])
+            pages = [{"url": source, "text": text} for source, text in sorted(candidates.items())]
+            file.write(json.dumps({"query": judgment["query"], "candidates": pages}) + "\n")
+
+
+def main():
+    load_dotenv()
+    logging.basicConfig(level=logging.WARNING)
+    parser = argparse.ArgumentParser(description="Compare dense, lexical and hybrid retrieval on a held-out query set")
+    parser.add_argument("--queries", default="retrieval_queries.jsonl")
+    parser.add_argument("--k", type=int, default=int(os.getenv("RETRIEVAL_TOP_K", "5")))
+    parser.add_argument("--fetch-k", type=int, default=int(os.getenv("RETRIEVAL_FETCH_K", "20")))
+    parser.add_argument("--output", help="Write the report as JSON to this path")
+    parser.add_argument("--pool", help="Write candidate pages of the unlabelled queries to this path for judging, then exit")
+    args = parser.parse_args()
+
+    queries = load_queries(args.queries)
+    vector_store, bm25 = open_index()
+    retrievers = {
+        mode: HybridRetriever(vector_store=vector_store, bm25=bm25, fetch_k=args.fetch_k, top_k=args.k, mode=mode)
+        for mode in MODES
+    }
+    unlabelled = [judgment for judgment in queries if not is_labelled(judgment)]
+    if args.pool:
+        write_pool(retrievers.values(), unlabelled, args.pool)
+        print(f"Wrote candidates for {len(unlabelled)} unlabelled queries to {args.pool}")
+        return
+    queries = [judgment for judgment in queries if is_labelled(judgment)]
+    if not queries:
+        sys.exit(f"No labelled queries in {args.queries}; label some with --pool first")
+    if unlabelled:
+        print(f"Skipping {len(unlabelled)} unlabelled queries; run with --pool to collect pages to judge")
+    report = {"queries": len(queries), "chunks": len(bm25), "k": args.k, "modes": {}}
+    for mode, retriever in retrievers.items():
+        report["modes"][mode] = evaluate(retriever, queries)
+
+    print(f"{len(queries)} queries over {len(bm25)} chunks, k={args.k}")
+    print(f"{'mode':<15}{'recall@k':>10}{'mrr':>8}{'p50 ms':>10}{'p95 ms':>10}")
+    for mode, result in report["modes"].items():
+        print(f"{mode:<15}{result['recall_at_k']:>10.3f}{result['mrr']:>8.3f}"
+              f"{result['latency_p50_ms']:>10.1f}{result['latency_p95_ms']:>10.1f}")
+    if args.output:
+        with open(args.output, 'w') as file:
+            json.dump(report, file, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+import os
+import json
+import hashlib
+import threading
+import tempfile
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+def content_hash(text):
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
+class ScrapeState:
+    """Per-URL validators (ETag, Last-Modified) and content hashes from the last scrape.
+
+    Updates made with stage() are held back until commit(), so a refresh whose index build fails
+    leaves the state describing what is actually indexed.
+    """
+
+    def __init__(self, path=None):
+        self.path = path or os.getenv("SCRAPE_STATE_PATH", "scrape_state.json")
+        self.lock = threading.Lock()
+        self.entries = {}
+        self.pending = {}
+        self.load()
+
+    def load(self):
+        if not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, 'r') as file:
+                self.entries = json.load(file)
+            logger.info(f"Loaded scrape state for {len(self.entries)} URLs from {self.path}")
+        except (OSError, ValueError) as e:
+            logger.warning(f"Could not read scrape state from {self.path}, starting fresh: {e}")
+            self.entries = {}
+
+    def save(self):
+        with self.lock:
+            data = json.dumps(self.entries, indent=2, sort_keys=True)
+        directory = os.path.dirname(os.path.abspath(self.path))
+        # Write to a temp file first so a crash never leaves a truncated state file
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.scrape_state.')
+        try:
+            with os.fdopen(fd, 'w') as file:
+                file.write(data)
+            os.replace(tmp_path, self.path)
+        except OSError:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    def get(self, url):
+        with self.lock:
+            return dict(self.entries.get(url, {}))
+
+    def conditional_headers(self, url):
+        entry = self.get(url)
+        headers = {}
+        if entry.get("etag"):
+            headers["If-None-Match"] = entry["etag"]
+        if entry.get("last_modified"):
+            headers["If-Modified-Since"] = entry["last_modified"]
+        return headers
+
+    def has_changed(self, url, new_hash):
+        return self.get(url).get("content_hash") != new_hash
+
+    def update(self, url, etag=None, last_modified=None, new_hash=None, **extra):
+        with self.lock:
+            entry = self.entries.setdefault(url, {})
+            entry.update(extra)
+            if new_hash is not None:
+                # A full response replaces the validators; one it did not send must not be replayed
+                entry.pop("etag", None)
+                entry.pop("last_modified", None)
+            if etag is not None:
+                entry["etag"] = etag
+            if last_modified is not None:
+                entry["last_modified"] = last_modified
+            if new_hash is not None:
+                entry["content_hash"] = new_hash
+                entry["changed_at"] = time.time()
+            entry["checked_at"] = time.time()
+
+    def stage(self, url, **values):
+        # Conditional headers and has_changed keep answering from the committed entry until commit()
+        with self.lock:
+            self.pending.setdefault(url, {}).update(values)
+
+    def commit(self):
+        with self.lock:
+            pending, self.pending = self.pending, {}
+        for url, values in pending.items():
+            self.update(url, **values)
+
+    def discard(self):
+        with self.lock:
+            self.pending = {}
+
+    def forget(self, url):
+        with self.lock:
+            self.entries.pop(url, None)
+            self.pending.pop(url, None)
+
+    def urls(self):
+        with self.lock:
+            return set(self.entries)
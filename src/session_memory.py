@@ -0,0 +1,175 @@
+import os
+import json
+import time
+import sqlite3
+import threading
+import contextvars
+import logging
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+
+def estimate_tokens(text):
+    # Roughly four characters per token for English text; close enough to budget a prompt
+    return max(1, len(text) // 4)
+
+
+class SessionMemory:
+    """Chat history for one user: a rolling summary plus the most recent turns within a token budget."""
+
+    def __init__(self, summary="", turns=None):
+        self.summary = summary
+        self.turns = list(turns or [])
+        self.lock = threading.Lock()
+        self.last_used = time.time()
+        # Set while older turns are being summarized, so one compaction runs per session at a time
+        self.compacting = False
+
+    def tokens(self):
+        return estimate_tokens(self.summary) + sum(estimate_tokens(q) + estimate_tokens(a) for q, a in self.turns)
+
+    def transcript(self):
+        with self.lock:
+            lines = [f"Summary of the earlier conversation: {self.summary}"] if self.summary else []
+            for question, answer in self.turns:
+                lines.append(f"Human: {question}")
+                lines.append(f"Assistant: {answer}")
+            return "\n".join(lines)
+
+    def has_history(self):
+        return bool(self.turns or self.summary)
+
+    def to_dict(self):
+        with self.lock:
+            return {"summary": self.summary, "turns": self.turns}
+
+
+class SessionMemoryStore:
+    """Per-session memories with LRU eviction of idle sessions and optional SQLite persistence."""
+
+    def __init__(self, summarizer=None, max_tokens=1200, max_answer_chars=1500, max_sessions=500,
+                 idle_ttl=3600, path=None):
+        self.summarizer = summarizer
+        self.max_tokens = max_tokens
+        self.max_answer_chars = max_answer_chars
+        self.max_sessions = max_sessions
+        self.idle_ttl = idle_ttl
+        self.sessions = OrderedDict()
+        self.lock = threading.Lock()
+        # Summaries are written in the background, after the answer that pushed a session over budget has gone out
+        self.compactor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="summarize")
+        self.conn = None
+        if path:
+            directory = os.path.dirname(os.path.abspath(path))
+            os.makedirs(directory, exist_ok=True)
+            self.conn = sqlite3.connect(path, check_same_thread=False)
+            self.conn.execute(
+                "CREATE TABLE IF NOT EXISTS sessions (id TEXT PRIMARY KEY, data TEXT NOT NULL, updated REAL NOT NULL)"
+            )
+            self.conn.commit()
+
+    def __len__(self):
+        with self.lock:
+            return len(self.sessions)
+
+    def get(self, session_id):
+        with self.lock:
+            memory = self.sessions.get(session_id)
+            if memory is None:
+                memory = self.load(session_id) or SessionMemory()
+                self.sessions[session_id] = memory
+            self.sessions.move_to_end(session_id)
+            memory.last_used = time.time()
+            evicted = self.evict_idle()
+        for evicted_id, evicted_memory in evicted:
+            self.persist(evicted_id, evicted_memory)
+        return memory
+
+    def evict_idle(self):
+        # Caller holds the lock
+        now = time.time()
+        evicted = []
+        while self.sessions:
+            session_id, memory = next(iter(self.sessions.items()))
+            if len(self.sessions) <= self.max_sessions and now - memory.last_used <= self.idle_ttl:
+                break
+            del self.sessions[session_id]
+            evicted.append((session_id, memory))
+        if evicted:
+            logger.debug(f"Evicted {len(evicted)} idle chat sessions")
+        return evicted
+
+    def load(self, session_id):
+        if self.conn is None:
+            return None
+        row = self.conn.execute("SELECT data FROM sessions WHERE id = ?", (session_id,)).fetchone()
+        if row is None:
+            return None
+        data = json.loads(row[0])
+        return SessionMemory(data.get("summary", ""), [tuple(turn) for turn in data.get("turns", [])])
+
+    def persist(self, session_id, memory):
+        if self.conn is None:
+            return
+        with self.lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO sessions (id, data, updated) VALUES (?, ?, ?)",
+                (session_id, json.dumps(memory.to_dict()), time.time()),
+            )
+            self.conn.commit()
+
+    def add_turn(self, session_id, question, answer):
+        """Record a turn; returns the future of the compaction it started, if the session went over budget."""
+        memory = self.get(session_id)
+        if len(answer) > self.max_answer_chars:
+            answer = answer[:self.max_answer_chars] + " ..."
+        with memory.lock:
+            memory.turns.append((question, answer))
+            start_compaction = memory.tokens() > self.max_tokens and not memory.compacting
+            if start_compaction:
+                memory.compacting = True
+        self.persist(session_id, memory)
+        if not start_compaction:
+            return None
+        # Copy the context so log lines from the summarizer keep the request's trace id
+        return self.compactor.submit(contextvars.copy_context().run, self.compact, session_id, memory)
+
+    def compact(self, session_id, memory):
+        # Fold the oldest turns into the summary until the window is half full, so summarization runs
+        # once every few turns rather than on every request. The LLM call runs without memory.lock;
+        # turns added meanwhile are kept, since only the folded prefix is replaced.
+        try:
+            with memory.lock:
+                previous = memory.summary
+                remaining = memory.tokens()
+                folded = []
+                for question, answer in memory.turns:
+                    if folded and remaining <= self.max_tokens // 2:
+                        break
+                    folded.append((question, answer))
+                    remaining -= estimate_tokens(question) + estimate_tokens(answer)
+            summary = None
+            if self.summarizer is not None:
+                try:
+                    summary = self.summarizer(previous, folded)
+                except Exception as e:
+                    logger.warning(f"Summarizing chat history failed, falling back to truncation: {e}")
+            if not summary:
+                summary = " ".join([previous] + [f"User asked: {question}" for question, _ in folded]).strip()
+            with memory.lock:
+                memory.turns = memory.turns[len(folded):]
+                # The summary has its own share of the budget so it cannot grow without bound either
+                memory.summary = summary[-(self.max_tokens // 4) * 4:]
+        finally:
+            with memory.lock:
+                memory.compacting = False
+        self.persist(session_id, memory)
+
+    def clear(self, session_id):
+        with self.lock:
+            self.sessions.pop(session_id, None)
+            if self.conn is not None:
+                self.conn.execute("DELETE FROM sessions WHERE id = ?", (session_id,))
+                self.conn.commit()
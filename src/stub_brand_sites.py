@@ -0,0 +1,317 @@
+import json
+import random
+import asyncio
+import hashlib
+import argparse
+import logging
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from email.utils import formatdate
+from aiohttp import web
+
+# Local stand-in for a set of Shopify-like brand sites: robots.txt, sitemap indexes, collection pages,
+# product pages with JSON-LD and OpenGraph, /products.json feeds, conditional requests and shared
+# site chrome. Each brand is served on its own loopback address (127.0.0.2, 127.0.0.3, ...), so the
+# crawler treats them as separate sites; Linux routes all of 127.0.0.0/8 to the loopback interface.
+#
+#   python src/stub_brand_sites.py --brands 20 --products 200 --port 8700 --latency-ms 30
+#   curl -X POST "http://127.0.0.2:8700/_stub/mutate?fraction=0.1"    # change 10% of the products
+
+logger = logging.getLogger(__name__)
+
+NAME_HEADS = ["Noor", "Rang", "Zari", "Gul", "Resham", "Kaari", "Sitar", "Mehr", "Dhaag", "Chunar"]
+NAME_TAILS = ["posh", "wala", "kada", "bano", "ista", "ora", "ani", "ezza", "lume", "aab"]
+FABRICS = ["lawn", "chiffon", "khaddar", "cotton", "silk", "linen", "cambric", "karandi", "velvet", "organza"]
+GARMENTS = ["suit", "kurta", "dupatta", "shirt", "trouser", "shawl", "dress", "kameez"]
+COLOURS = ["black", "white", "blue", "maroon", "green", "pink", "mustard", "beige", "navy", "lilac"]
+DETAILS = ["embroidered", "printed", "digital print", "dyed", "jacquard", "block print", "sequined", "lace trim"]
+COLLECTIONS = ["lawn", "chiffon", "khaddar", "pret", "unstitched", "formal"]
+BASE_TIME = 1735689600  # 2025-01-01
+
+
+def brand_name(index):
+    return NAME_HEADS[index % len(NAME_HEADS)] + NAME_TAILS[index // len(NAME_HEADS) % len(NAME_TAILS)]
+
+
+def brand_host(index):
+    return f"127.0.0.{index + 2}"
+
+
+def iso_date(timestamp):
+    return datetime.fromtimestamp(timestamp, timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+
+
+@dataclass
+class StubStats:
+    requests: int = 0
+    not_modified: int = 0
+
+
+BRANDS = web.AppKey("brands", dict)
+STATS = web.AppKey("stats", StubStats)
+
+
+class StubBrand:
+    """Deterministic catalogue of one synthetic brand; product versions change through mutate()."""
+
+    def __init__(self, index, products, seed=7):
+        self.index = index
+        self.name = brand_name(index)
+        self.rng = random.Random(seed * 1000 + index)
+        self.products = [self.make_product(i) for i in range(products)]
+        self.by_handle = {product["handle"]: product for product in self.products}
+
+    def make_product(self, i):
+        rng = self.rng
+        fabric, garment, colour = rng.choice(FABRICS), rng.choice(GARMENTS), rng.choice(COLOURS)
+        detail = rng.choice(DETAILS)
+        return {
+            "id": self.index * 100000 + i,
+            "handle": f"{colour}-{fabric}-{garment}-{i:04d}",
+            "title": f"{colour.capitalize()} {detail.capitalize()} {fabric.capitalize()} {garment.capitalize()} {i:04d}",
+            "fabric": fabric,
+            "garment": garment,
+            "colour": colour,
+            "detail": detail,
+            "collection": COLLECTIONS[i % len(COLLECTIONS)],
+            "price": rng.randrange(2500, 25000, 50),
+            "version": 0,
+            "updated": BASE_TIME + i * 60,
+            "words": [rng.choice(DETAILS + FABRICS + COLOURS) for _ in range(40)],
+        }
+
+    def mutate(self, fraction, rng):
+        changed = rng.sample(self.products, max(0, round(len(self.products) * fraction)))
+        for product in changed:
+            product["version"] += 1
+            product["price"] += 100
+            product["updated"] += 86400
+            product["words"] = product["words"][1:] + [rng.choice(DETAILS)]
+        return len(changed)
+
+    def description(self, product):
+        return (f"This {product['detail']} {product['fabric']} {product['garment']} in {product['colour']} is part of "
+                f"the {self.name} {product['collection']} collection, revision {product['version']}. "
+                f"{' '.join(product['words'])}. Care: dry clean only, do not bleach, iron on reverse. "
+                f"Model is wearing size S; fits true to size. Shirt length 42 inches, trouser length 38 inches.")
+
+    def image(self, product, size=None):
+        suffix = f"_{size}" if size else ""
+        return f"/cdn/shop/files/{product['handle']}{suffix}.jpg?v={product['version']}"
+
+
+def page(brand, title, main, head=""):
+    # Chrome every page shares: announcement bar, menu, cookie banner, newsletter and footer
+    menu = "".join(f'<li><a href="/collections/{c}">{c.capitalize()}</a></li>' for c in COLLECTIONS)
+    return f"""<!doctype html><html><head><title>{title} | {brand.name}</title>{head}
+<script>window.Shopify = {{"shop": "{brand.name.lower()}.myshopify.com"}};</script></head><body>
+<div class="announcement-bar">Free delivery on orders above Rs. 5,000 across Pakistan</div>
+<header class="site-header"><a href="/"><img src="/cdn/shop/files/logo.png" alt="{brand.name}"></a>
+<nav><ul>{menu}<li><a href="/pages/about">About</a></li><li><a href="/cart">Cart</a></li></ul></nav></header>
+<main>{main}</main>
+<div class="cookie-consent">We use cookies to improve your experience. By browsing you accept our cookie policy.</div>
+<div class="newsletter">Subscribe to our newsletter for early access to new arrivals and exclusive offers.</div>
+<footer><p>Exchange within 14 days of delivery with the original receipt. Customer care: 0800-12345.</p>
+<a href="/pages/about">About {brand.name}</a> <a href="/policies/refund-policy">Refunds</a></footer>
+<img src="https://www.facebook.com/tr?id=1&ev=PageView" width="1" height="1"></body></html>"""
+
+
+def product_page(brand, product):
+    jsonld = {
+        "@context": "https://schema.org", "@type": "Product", "name": product["title"],
+        "brand": {"@type": "Brand", "name": brand.name}, "color": product["colour"],
+        "category": f"{product['fabric']} {product['garment']}", "image": [brand.image(product)],
+        "offers": {"@type": "Offer", "price": str(product["price"]), "priceCurrency": "PKR"},
+    }
+    head = (f'<script type="application/ld+json">{json.dumps(jsonld)}</script>'
+            f'<meta property="og:type" content="product"><meta property="og:title" content="{product["title"]}">'
+            f'<meta property="og:image" content="{brand.image(product)}">')
+    related = [brand.products[(product["id"] + step) % len(brand.products)] for step in (1, 2, 3)]
+    main = (f'<h1>{product["title"]}</h1><p class="price">Rs. {product["price"]:,}</p>'
+            f'<img src="data:image/gif;base64,R0lGOD" data-src="{brand.image(product, "200x")}" '
+            f'data-srcset="{brand.image(product, "400x")} 400w, {brand.image(product, "1200x")} 1200w">'
+            f'<div class="description"><p>{brand.description(product)}</p></div>'
+            f'<h2>You may also like</h2><ul>'
+            + "".join(f'<li><a href="/collections/{p["collection"]}/products/{p["handle"]}">{p["title"]}</a></li>'
+                      for p in related)
+            + "</ul>")
+    return page(brand, product["title"], main, head)
+
+
+def collection_page(brand, name, page_number, per_page=24):
+    products = [p for p in brand.products if p["collection"] == name]
+    shown = products[(page_number - 1) * per_page:page_number * per_page]
+    items = "".join(f'<li><a href="/products/{p["handle"]}"><img src="{brand.image(p, "400x")}" width="400">'
+                    f'{p["title"]}</a> Rs. {p["price"]:,}</li>' for p in shown)
+    more = (f'<a href="/collections/{name}?page={page_number + 1}">Next page</a>'
+            if page_number * per_page < len(products) else "")
+    return page(brand, name.capitalize(), f"<h1>{name.capitalize()} collection</h1><ul>{items}</ul>{more}")
+
+
+def shopify_feed(brand, origin, page_number, limit):
+    shown = brand.products[(page_number - 1) * limit:page_number * limit]
+    return {"products": [{
+        "id": p["id"], "title": p["title"], "handle": p["handle"], "vendor": brand.name,
+        "product_type": f"{p['fabric'].capitalize()} {p['garment'].capitalize()}",
+        "updated_at": iso_date(p["updated"]),
+        "variants": [{"price": f"{p['price']}.00"}],
+        "options": [{"name": "Color", "values": [p["colour"].capitalize()]}],
+        "images": [{"src": f"{origin}{brand.image(p)}"}],
+    } for p in shown]}
+
+
+def create_app(brands=10, products=100, latency_ms=20.0, jitter_ms=10.0, seed=7):
+    app = web.Application()
+    app[BRANDS] = {brand_host(i): StubBrand(i, products, seed) for i in range(brands)}
+    # Counters live on a mutable object: an app's own keys are frozen once it starts serving
+    app[STATS] = stats_counts = StubStats()
+    mutate_rng = random.Random(seed)
+    jitter = random.Random(seed + 1)
+
+    def brand_for(request):
+        brand = app[BRANDS].get(request.url.host)
+        if brand is None:
+            raise web.HTTPNotFound(text="unknown brand host")
+        return brand
+
+    async def respond(request, body, content_type="text/html", last_modified=None):
+        stats_counts.requests += 1
+        await asyncio.sleep(max(0.0, latency_ms + jitter.uniform(-jitter_ms, jitter_ms)) / 1000)
+        etag = '"' + hashlib.md5(body.encode('utf-8')).hexdigest() + '"'
+        headers = {"ETag": etag}
+        if last_modified:
+            headers["Last-Modified"] = formatdate(last_modified, usegmt=True)
+        if request.headers.get("If-None-Match") == etag:
+            stats_counts.not_modified += 1
+            return web.Response(status=304, headers=headers)
+        return web.Response(text=body, content_type=content_type, headers=headers)
+
+    async def home(request):
+        brand = brand_for(request)
+        featured = "".join(f'<li><a href="/products/{p["handle"]}">{p["title"]}</a></li>' for p in brand.products[:12])
+        main = (f"<h1>{brand.name}</h1><p>Pakistani lawn, chiffon and khaddar for every season.</p>"
+                f"<h2>New arrivals</h2><ul>{featured}</ul>")
+        return await respond(request, page(brand, "Home", main))
+
+    async def robots(request):
+        brand_for(request)
+        host = request.url.origin()
+        body = f"User-agent: *\nDisallow: /cart\nDisallow: /checkout\nSitemap: {host}/sitemap.xml\n"
+        return await respond(request, body, "text/plain")
+
+    async def sitemap_index(request):
+        brand_for(request)
+        host = request.url.origin()
+        body = ('<?xml version="1.0" encoding="UTF-8"?><sitemapindex xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">'
+                f"<sitemap><loc>{host}/sitemap_products_1.xml</loc></sitemap>"
+                f"<sitemap><loc>{host}/sitemap_collections_1.xml</loc></sitemap>"
+                f"<sitemap><loc>{host}/sitemap_pages_1.xml</loc></sitemap></sitemapindex>")
+        return await respond(request, body, "application/xml")
+
+    async def sitemap(request):
+        brand = brand_for(request)
+        host = request.url.origin()
+        kind = request.match_info["kind"]
+        if kind == "products":
+            entries = [(f"/products/{p['handle']}", p["updated"]) for p in brand.products]
+        elif kind == "collections":
+            entries = [(f"/collections/{c}", BASE_TIME) for c in COLLECTIONS]
+        else:
+            entries = [("/pages/about", BASE_TIME)]
+        urls = "".join(f"<url><loc>{host}{path}</loc><lastmod>{iso_date(updated)}</lastmod></url>"
+                       for path, updated in entries)
+        body = f'<?xml version="1.0" encoding="UTF-8"?><urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">{urls}</urlset>'
+        return await respond(request, body, "application/xml")
+
+    async def product(request):
+        brand = brand_for(request)
+        item = brand.by_handle.get(request.match_info["handle"])
+        if item is None:
+            raise web.HTTPNotFound()
+        return await respond(request, product_page(brand, item), last_modified=item["updated"])
+
+    async def collection(request):
+        brand = brand_for(request)
+        name = request.match_info["name"]
+        if name not in COLLECTIONS:
+            raise web.HTTPNotFound()
+        page_number = max(1, int(request.query.get("page", "1")))
+        return await respond(request, collection_page(brand, name, page_number))
+
+    async def about(request):
+        brand = brand_for(request)
+        main = (f"<h1>About {brand.name}</h1><p>{brand.name} was founded in Lahore and designs seasonal lawn, "
+                "festive chiffon and winter khaddar collections, stitched and unstitched, with nationwide delivery "
+                "and exchanges at every outlet. Our artisans hand-finish embroidery on every formal piece.</p>"
+                "<p>Every print starts as a hand-drawn motif in our studio and is tested on lawn, cambric and "
+                "khaddar before it reaches a collection. Sizes run from XS to XL; our stitched pret follows the "
+                "size chart on each product page, and unstitched suits come with three metres of shirt fabric.</p>")
+        return await respond(request, page(brand, "About", main))
+
+    async def feed(request):
+        brand = brand_for(request)
+        page_number = max(1, int(request.query.get("page", "1")))
+        limit = min(250, int(request.query.get("limit", "30")))
+        return await respond(request, json.dumps(shopify_feed(brand, request.url.origin(), page_number, limit)), "application/json")
+
+    async def mutate(request):
+        fraction = float(request.query.get("fraction", "0.1"))
+        changed = sum(brand.mutate(fraction, mutate_rng) for brand in app[BRANDS].values())
+        return web.json_response({"changed": changed})
+
+    async def stats(request):
+        return web.json_response({"requests": stats_counts.requests, "not_modified": stats_counts.not_modified})
+
+    app.router.add_get("/", home)
+    app.router.add_get("/robots.txt", robots)
+    app.router.add_get("/sitemap.xml", sitemap_index)
+    app.router.add_get("/sitemap_{kind}_1.xml", sitemap)
+    app.router.add_get("/products.json", feed)
+    app.router.add_get("/products/{handle}", product)
+    app.router.add_get("/collections/{name}/products/{handle}", product)
+    app.router.add_get("/collections/{name}", collection)
+    app.router.add_get("/pages/about", about)
+    app.router.add_post("/_stub/mutate", mutate)
+    app.router.add_get("/_stub/stats", stats)
+    return app
+
+
+async def serve(app, port):
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    for host in app[BRANDS]:
+        await web.TCPSite(runner, host, port).start()
+    return runner
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Synthetic Shopify-like brand sites for benchmarks")
+    parser.add_argument("--brands", type=int, default=10)
+    parser.add_argument("--products", type=int, default=100, help="Products per brand")
+    parser.add_argument("--port", type=int, default=8700)
+    parser.add_argument("--latency-ms", type=float, default=20.0, help="Mean response delay")
+    parser.add_argument("--jitter-ms", type=float, default=10.0)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+    if not 0 < args.brands <= 250:
+        parser.error("--brands must be between 1 and 250, one loopback address each")
+    logging.basicConfig(level=logging.INFO)
+
+    async def run():
+        app = create_app(args.brands, args.products, args.latency_ms, args.jitter_ms, args.seed)
+        runner = await serve(app, args.port)
+        # The benchmark waits for this line before it starts crawling
+        print(f"Serving {args.brands} brand sites on 127.0.0.2-{brand_host(args.brands - 1)}:{args.port}", flush=True)
+        try:
+            await asyncio.Event().wait()
+        finally:
+            await runner.cleanup()
+
+    try:
+        asyncio.run(run())
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
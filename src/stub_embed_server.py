@@ -0,0 +1,91 @@
+import asyncio
+import hashlib
+import argparse
+import logging
+import math
+from aiohttp import web
+
+# Local stand-in for an Ollama embedding server. Vectors are derived from a hash of the text, so they
+# are deterministic but carry no meaning; use it to measure pipeline throughput, not retrieval quality.
+#
+#   python src/stub_embed_server.py --port 11500 --dim 1024 --latency-ms 40 --per-item-ms 2
+#   OLLAMA_URL=http://localhost:11500 python src/embedding_benchmark.py
+
+logger = logging.getLogger(__name__)
+
+
+def stub_vector(text, dim):
+    values = []
+    counter = 0
+    while len(values) < dim:
+        digest = hashlib.sha256(f"{counter}:{text}".encode('utf-8')).digest()
+        values.extend((byte - 127.5) / 127.5 for byte in digest)
+        counter += 1
+    values = values[:dim]
+    norm = math.sqrt(sum(value * value for value in values)) or 1.0
+    return [value / norm for value in values]
+
+
+def create_app(dim=1024, latency_ms=40.0, per_item_ms=2.0, max_concurrency=None):
+    app = web.Application(client_max_size=64 * 1024 * 1024)
+    # Emulates a model server that can only work on so many requests at once
+    limit = asyncio.Semaphore(max_concurrency) if max_concurrency else None
+    app["requests"] = 0
+    app["items"] = 0
+
+    async def simulate(count):
+        delay = (latency_ms + per_item_ms * count) / 1000
+        if limit is None:
+            await asyncio.sleep(delay)
+        else:
+            async with limit:
+                await asyncio.sleep(delay)
+
+    async def embed(request):
+        payload = await request.json()
+        inputs = payload.get("input", [])
+        if isinstance(inputs, str):
+            inputs = [inputs]
+        app["requests"] += 1
+        app["items"] += len(inputs)
+        await simulate(len(inputs))
+        return web.json_response({
+            "model": payload.get("model", "stub"),
+            "embeddings": [stub_vector(text, dim) for text in inputs],
+        })
+
+    async def embeddings_legacy(request):
+        payload = await request.json()
+        app["requests"] += 1
+        app["items"] += 1
+        await simulate(1)
+        return web.json_response({"embedding": stub_vector(payload.get("prompt", ""), dim)})
+
+    async def stats(request):
+        return web.json_response({"requests": app["requests"], "items": app["items"]})
+
+    app.router.add_post("/api/embed", embed)
+    app.router.add_post("/api/embeddings", embeddings_legacy)
+    app.router.add_get("/stats", stats)
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Deterministic stub of the Ollama embedding API")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=11500)
+    parser.add_argument("--dim", type=int, default=1024)
+    parser.add_argument("--latency-ms", type=float, default=40.0, help="Fixed cost per request")
+    parser.add_argument("--per-item-ms", type=float, default=2.0, help="Extra cost per text in a request")
+    parser.add_argument("--max-concurrency", type=int, default=None, help="Requests processed at once")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    web.run_app(
+        create_app(args.dim, args.latency_ms, args.per_item_ms, args.max_concurrency),
+        host=args.host,
+        port=args.port,
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+import re
+import time
+import random
+import hashlib
+from langchain_core.embeddings import Embeddings
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from stub_embed_server import stub_vector
+
+# In-process stand-ins for OllamaEmbeddings and ChatGroq with configurable latency. Output depends only
+# on the input text, so two runs over the same data do the same work; use them to time the pipeline,
+# never to judge answer quality.
+
+
+class StubEmbeddings(Embeddings):
+    def __init__(self, dim=1024, latency_ms=40.0, per_item_ms=2.0):
+        self.dim = dim
+        self.latency_ms = latency_ms
+        self.per_item_ms = per_item_ms
+        self.calls = 0
+        self.items = 0
+
+    def embed_documents(self, texts):
+        self.calls += 1
+        self.items += len(texts)
+        time.sleep((self.latency_ms + self.per_item_ms * len(texts)) / 1000)
+        return [stub_vector(text, self.dim) for text in texts]
+
+    def embed_query(self, text):
+        return self.embed_documents([text])[0]
+
+
+class StubChatModel(BaseChatModel):
+    """Answers with words picked from its own prompt, after first_token_ms and then one token per per_token_ms."""
+
+    first_token_ms: float = 300.0
+    per_token_ms: float = 15.0
+    answer_tokens: int = 60
+
+    @property
+    def _llm_type(self):
+        return "stub-chat"
+
+    def tokens(self, messages):
+        prompt = "\n".join(str(message.content) for message in messages)
+        rng = random.Random(hashlib.sha256(prompt.encode('utf-8')).hexdigest())
+        words = re.findall(r"[A-Za-z]{4,}", prompt)[-400:] or ["fashion"]
+        return [("" if i == 0 else " ") + rng.choice(words) for i in range(self.answer_tokens)]
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        time.sleep((self.first_token_ms + self.per_token_ms * self.answer_tokens) / 1000)
+        text = "".join(self.tokens(messages))
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=text))])
+
+    def _stream(self, messages, stop=None, run_manager=None, **kwargs):
+        time.sleep(self.first_token_ms / 1000)
+        for i, token in enumerate(self.tokens(messages)):
+            if i:
+                time.sleep(self.per_token_ms / 1000)
+            chunk = ChatGenerationChunk(message=AIMessageChunk(content=token))
+            if run_manager:
+                run_manager.on_llm_new_token(token, chunk=chunk)
+            yield chunk
@@ -0,0 +1,113 @@
+import os
+import json
+import time
+import uuid
+import logging
+import logging.handlers
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime, timezone
+import metrics
+
+# Per-request trace IDs carried in a context variable, per-stage timings, and logging setup shared by
+# every entry point. Log files are JSON lines, one object per record, each with the trace_id of the
+# request or refresh cycle that produced it.
+
+trace_id_var = ContextVar("trace_id", default=None)
+
+STAGE_SECONDS = metrics.histogram(
+    "pakfashion_stage_seconds",
+    "Time spent in each scrape, index and query stage",
+    ["stage"],
+)
+
+# LogRecord attributes that are not user-supplied extra fields
+RESERVED_ATTRIBUTES = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime", "trace_id"}
+
+
+def new_trace_id():
+    return uuid.uuid4().hex[:16]
+
+
+def current_trace_id():
+    return trace_id_var.get()
+
+
+@contextmanager
+def trace(trace_id=None):
+    """Run a block under trace_id (a fresh one by default); log records inside it carry the id."""
+    token = trace_id_var.set(trace_id or new_trace_id())
+    try:
+        yield trace_id_var.get()
+    finally:
+        trace_id_var.reset(token)
+
+
+def record_stage(stage, seconds, timings=None):
+    STAGE_SECONDS.observe(seconds, stage=stage)
+    if timings is not None:
+        timings[stage] = timings.get(stage, 0.0) + seconds
+
+
+@contextmanager
+def span(stage, timings=None):
+    """Time a block into the stage histogram, and into the timings dict of the request if given."""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_stage(stage, time.perf_counter() - started, timings)
+
+
+class TraceIdFilter(logging.Filter):
+    def filter(self, record):
+        record.trace_id = trace_id_var.get() or "-"
+        return True
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "trace_id": getattr(record, "trace_id", None) or trace_id_var.get(),
+            "thread": record.threadName,
+            "message": record.getMessage(),
+        }
+        # Fields passed with extra={...} become top-level keys
+        entry.update({key: value for key, value in record.__dict__.items() if key not in RESERVED_ATTRIBUTES})
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+def configure_logging(filename='fashion_bot.log'):
+    """Send JSON logs to a rotating file and readable logs to the console; safe to call repeatedly.
+
+    The file is appended to, never truncated. LOG_LEVEL sets the file level (DEBUG by default),
+    LOG_MAX_BYTES and LOG_BACKUP_COUNT its rotation.
+    """
+    root = logging.getLogger()
+    # Streamlit re-executes the app script on every interaction; configure the handlers only once
+    if any(getattr(handler, "pakfashion", False) for handler in root.handlers):
+        return
+    level = getattr(logging, os.getenv("LOG_LEVEL", "DEBUG").upper(), logging.DEBUG)
+
+    file_handler = logging.handlers.RotatingFileHandler(
+        filename,
+        maxBytes=int(os.getenv("LOG_MAX_BYTES", str(50 * 1024 * 1024))),
+        backupCount=int(os.getenv("LOG_BACKUP_COUNT", "5")),
+    )
+    file_handler.setLevel(level)
+    file_handler.setFormatter(JsonFormatter())
+
+    console_handler = logging.StreamHandler()
+    console_handler.setLevel(max(level, logging.INFO))
+    console_handler.setFormatter(logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - [%(trace_id)s] %(message)s'))
+
+    for handler in (file_handler, console_handler):
+        handler.pakfashion = True
+        handler.addFilter(TraceIdFilter())
+        root.addHandler(handler)
+    root.setLevel(level)
@@ -1,60 +1,261 @@
+import os
+import queue
+import tempfile
+import threading
+import time
+import argparse
 import logging
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from urllib.parse import urlsplit, parse_qsl, quote_plus
+from dotenv import load_dotenv
 from selenium import webdriver
-from selenium.webdriver.chrome.service import Service
 from selenium.webdriver.chrome.options import Options
+from selenium.webdriver.chrome.service import Service
 from selenium.webdriver.common.by import By
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
-from urllib.parse import urlparse
-import time
-import re
-import threading
-from dotenv import load_dotenv
-import os
+from frontier import normalize_url, url_key
+
+# Discovers brand sites through a search page and merges new ones into urls.txt. Point SEARCH_URL
+# at the local fixture to exercise it without hitting a real search engine:
+#
+#   SEARCH_URL="file://$PWD/fixtures/search_results.html?q={query}" python src/urls_finder.py --once
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_QUERIES = [
+    "Pakistani women fashion brands",
+    "Pakistani lawn suits online store",
+    "Pakistani designer pret wear",
+]
+# Search engines, social networks and app stores show up in results but are never brand sites
+EXCLUDED_HOSTS = {
+    "google.com", "bing.com", "yahoo.com", "duckduckgo.com", "youtube.com", "facebook.com", "instagram.com",
+    "twitter.com", "x.com", "pinterest.com", "tiktok.com", "linkedin.com", "wikipedia.org", "apple.com",
+    "play.google.com", "reddit.com", "quora.com",
+}
+
+
+def unwrap_redirect(href):
+    # Result links are often wrapped as /url?q=<target>
+    parts = urlsplit(href)
+    if parts.path == "/url":
+        target = dict(parse_qsl(parts.query)).get("q") or dict(parse_qsl(parts.query)).get("url")
+        if target:
+            return target
+    return href
+
+
+def is_excluded(url, excluded_hosts):
+    host = urlsplit(url).hostname or ""
+    return any(host == excluded or host.endswith("." + excluded) for excluded in excluded_hosts)
+
+
+def read_url_list(path):
+    if not os.path.exists(path):
+        return []
+    with open(path, 'r') as file:
+        return [line.strip() for line in file if line.strip()]
+
+
+def write_url_list(path, urls):
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=f".{os.path.basename(path)}.")
+    with os.fdopen(fd, 'w') as file:
+        file.write("\n".join(urls) + "\n")
+    # The ingest worker reads urls.txt at the start of every cycle; os.replace means it never sees half a file
+    os.replace(tmp_path, path)
+
+
+class DriverPool:
+    """A few long-lived headless Chrome drivers, created on demand and reused across searches."""
+
+    def __init__(self, size=2, headless=True, driver_path=None):
+        self.size = size
+        self.headless = headless
+        self.driver_path = driver_path or os.getenv("CHROMEDRIVER_PATH", "/usr/local/bin/chromedriver")
+        self.idle = queue.Queue()
+        self.created = 0
+        self.lock = threading.Lock()
+
+    def create_driver(self):
+        options = Options()
+        if self.headless:
+            options.add_argument("--headless=new")
+        options.add_argument("--disable-gpu")
+        options.add_argument("--no-sandbox")
+        options.add_argument("--disable-dev-shm-usage")
+        options.add_argument("--window-size=1920,1080")
+        options.add_argument("--disable-setuid-sandbox")
+        # No fixed --remote-debugging-port: chromedriver picks a free one, so drivers never collide
+        service = Service(self.driver_path) if os.path.exists(self.driver_path) else Service()
+        driver = webdriver.Chrome(service=service, options=options)
+        driver.set_page_load_timeout(30)
+        logger.info("Started headless Chrome driver")
+        return driver
+
+    def checkout(self):
+        while True:
+            with self.lock:
+                if self.idle.empty() and self.created < self.size:
+                    self.created += 1
+                    break
+            try:
+                # Time out and re-check so a slot freed by a discarded driver is noticed
+                return self.idle.get(timeout=1)
+            except queue.Empty:
+                continue
+        try:
+            return self.create_driver()
+        except Exception:
+            with self.lock:
+                self.created -= 1
+            raise
+
+    @contextmanager
+    def acquire(self):
+        driver = self.checkout()
+        try:
+            yield driver
+        except Exception:
+            # A driver that failed mid-search may be wedged; replace it rather than reuse it
+            self.discard(driver)
+            raise
+        else:
+            self.idle.put(driver)
+
+    def discard(self, driver):
+        with self.lock:
+            self.created -= 1
+        try:
+            driver.quit()
+        except Exception:
+            pass
+
+    def close(self):
+        while not self.idle.empty():
+            self.discard(self.idle.get())
+
 
 class URLFinder:
-    def __init__(self, headless=True):
-        # Configure logging
-        logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
-        # Configure headless browser
-        self.options = Options()
-        if headless:
-            self.options.add_argument("--headless")
-        self.options.add_argument("--disable-gpu")
-        self.options.add_argument("--no-sandbox")
-        self.options.add_argument("--disable-dev-shm-usage")
-        self.options.add_argument("--window-size=1920,1080")
-        self.options.add_argument("--disable-setuid-sandbox")
-        self.options.add_argument("--remote-debugging-port=9222")  # Required for Chrome to start
-
-        # Disable Selenium logging
+    def __init__(self, headless=True, pool_size=None, search_url=None, result_selector=None,
+                 urls_path='urls.txt', seen_path='scraped_urls.txt', keep_paths=False):
+        pool_size = pool_size or int(os.getenv("DISCOVERY_DRIVERS", "2"))
+        self.pool = DriverPool(pool_size, headless=headless)
+        self.search_url = search_url or os.getenv("SEARCH_URL", "https://www.google.com/search?q={query}&num=20")
+        self.result_selector = result_selector or os.getenv("SEARCH_RESULT_SELECTOR", "div#search a")
+        self.wait_timeout = float(os.getenv("SEARCH_WAIT_TIMEOUT", "10"))
+        self.urls_path = urls_path
+        # Every URL discovery has ever proposed; a site removed from urls.txt by hand is not added back
+        self.seen_path = seen_path
+        # Brand sites are crawled from their home page, so results are reduced to the site root by default
+        self.keep_paths = keep_paths
+        extra = {host.strip().lower() for host in os.getenv("DISCOVERY_EXCLUDE_HOSTS", "").split(",") if host.strip()}
+        self.excluded_hosts = EXCLUDED_HOSTS | extra
+        self.merge_lock = threading.Lock()
+
         logging.getLogger('selenium').setLevel(logging.CRITICAL)
         logging.getLogger('urllib3').setLevel(logging.CRITICAL)
-        logging.getLogger('http.client').setLevel(logging.CRITICAL)
-        logging.getLogger('asyncio').setLevel(logging.CRITICAL)
 
     def find_urls(self, search_query, max_results=10):
-        service = Service("/usr/local/bin/chromedriver")
-        driver = webdriver.Chrome(service=service, options=self.options)
-        urls = []
-        try:
-            driver.get("https://www.google.com")
-            search_box = driver.find_element(By.NAME, "q")
-            search_box.send_keys(search_query)
-            search_box.submit()
-            time.sleep(3)
-            wait = WebDriverWait(driver, 10)
-            wait.until(EC.presence_of_element_located((By.CSS_SELECTOR, 'div#search')))
-            links = driver.find_elements(By.CSS_SELECTOR, 'div#search a')
-
-            for link in links[:max_results]:
-                href = link.get_attribute("href")
-                if href and re.match(r'^https?://', href):
-                    parsed_url = urlparse(href)
-                    if parsed_url.netloc.endswith(".com"):
-                        urls.append(href)
-
-        except Exception as e:
-            logging.error(f"An error occurred while finding URLs: {e}")
-        finally:
-            driver.quit()  # Ensure the driver is closed properly
\ No newline at end of file
+        started = time.perf_counter()
+        with self.pool.acquire() as driver:
+            driver.get(self.search_url.format(query=quote_plus(search_query)))
+            # Wait for the results themselves rather than sleeping a fixed time
+            links = WebDriverWait(driver, self.wait_timeout).until(
+                EC.presence_of_all_elements_located((By.CSS_SELECTOR, self.result_selector))
+            )
+            hrefs = [link.get_attribute("href") for link in links]
+        urls = self.clean_results(hrefs)[:max_results]
+        logger.info(f"Search '{search_query}' returned {len(urls)} candidate URLs "
+                    f"in {time.perf_counter() - started:.2f}s")
+        return urls
+
+    def clean_results(self, hrefs):
+        urls, keys = [], set()
+        for href in hrefs:
+            if not href:
+                continue
+            url = normalize_url(unwrap_redirect(href), keep_path=self.keep_paths)
+            if url is None or is_excluded(url, self.excluded_hosts):
+                continue
+            key = url_key(url)
+            if key not in keys:
+                keys.add(key)
+                urls.append(url)
+        return urls
+
+    def search_all(self, queries, max_results=10):
+        # One search per driver at a time; more queries than drivers simply wait for one to free up
+        with ThreadPoolExecutor(max_workers=self.pool.size, thread_name_prefix="discovery") as executor:
+            futures = {query: executor.submit(self.find_urls, query, max_results) for query in queries}
+        found = []
+        for query, future in futures.items():
+            try:
+                found.extend(future.result())
+            except Exception as e:
+                logger.error(f"An error occurred while searching for '{query}': {e}")
+        return found
+
+    def merge(self, candidates):
+        """Append candidates not yet in urls.txt or scraped_urls.txt to both; return the ones added."""
+        with self.merge_lock:
+            urls = read_url_list(self.urls_path)
+            seen = read_url_list(self.seen_path)
+            known = {url_key(url) for url in urls + seen}
+            added = []
+            for url in candidates:
+                key = url_key(url)
+                if key and key not in known:
+                    known.add(key)
+                    added.append(url)
+            if added:
+                write_url_list(self.urls_path, urls + added)
+                write_url_list(self.seen_path, seen + added)
+        logger.info(f"Discovery merged {len(added)} new URLs out of {len(candidates)} candidates")
+        return added
+
+    def discover(self, queries=None, max_results=10):
+        return self.merge(self.search_all(queries or DEFAULT_QUERIES, max_results))
+
+    def run_periodic(self, queries=None, interval=86400):
+        while True:
+            try:
+                self.discover(queries)
+            except Exception as e:
+                logger.exception(f"URL discovery failed: {e}")
+            time.sleep(interval)
+
+    def close(self):
+        self.pool.close()
+
+
+def queries_from_env():
+    value = os.getenv("SEARCH_QUERIES")
+    return [query.strip() for query in value.split(";") if query.strip()] if value else DEFAULT_QUERIES
+
+
+def main():
+    load_dotenv()
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    parser = argparse.ArgumentParser(description="Discover brand sites and merge them into urls.txt")
+    parser.add_argument("--query", action="append", help="Search term; repeat for several (default: SEARCH_QUERIES)")
+    parser.add_argument("--max-results", type=int, default=10)
+    parser.add_argument("--once", action="store_true", help="Run one discovery pass and exit")
+    parser.add_argument("--interval", type=int, default=int(os.getenv("DISCOVERY_INTERVAL", "86400")))
+    args = parser.parse_args()
+
+    finder = URLFinder()
+    try:
+        if args.once:
+            for url in finder.discover(args.query or queries_from_env(), args.max_results):
+                print(url)
+        else:
+            finder.run_periodic(args.query or queries_from_env(), args.interval)
+    finally:
+        finder.close()
+
+
+if __name__ == "__main__":
+    main()
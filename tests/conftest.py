@@ -0,0 +1,33 @@
+import os
+import sys
+import pytest
+
+# The modules in src/ import each other by bare name, as they do when run with python src/<module>.py
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
+
+
+@pytest.fixture
+def bot(tmp_path, monkeypatch):
+    """A FashionBot on stub embeddings and a stub LLM, with its index and state under tmp_path."""
+    import main
+    from stub_models import StubChatModel, StubEmbeddings
+
+    class FlakyEmbeddings(StubEmbeddings):
+        # Fails every request while fail is set, like an Ollama outage
+        fail = False
+
+        def embed_documents(self, texts):
+            if self.fail:
+                raise ConnectionError("embedding server unavailable")
+            return super().embed_documents(texts)
+
+    monkeypatch.setattr(main, "INDEX_DIR", str(tmp_path / "index"))
+    monkeypatch.setenv("SCRAPE_STATE_PATH", str(tmp_path / "scrape_state.json"))
+    monkeypatch.setenv("PARSE_WORKERS", "0")
+    monkeypatch.setenv("EMBEDDING_MAX_RETRIES", "0")
+    monkeypatch.setenv("MEMORY_PERSIST_PATH", "")
+    embeddings = FlakyEmbeddings(dim=64, latency_ms=0, per_item_ms=0)
+    bot = main.FashionBot(embeddings=embeddings, llm=StubChatModel(first_token_ms=0, per_token_ms=0, answer_tokens=5))
+    bot.stub_embeddings = embeddings
+    yield bot
+    bot.parse_pool.shutdown()
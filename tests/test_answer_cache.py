@@ -0,0 +1,96 @@
+import pytest
+from answer_cache import AnswerCache
+from catalog import ProductCatalog, make_product, parse_catalog_query
+from index_snapshot import IndexSnapshot
+
+
+class SameVector:
+    """Embeds every question to the same vector, so every lookup is a perfect semantic match."""
+
+    def embed_query(self, text):
+        return [1.0, 0.0, 0.0]
+
+
+class ScriptedChain:
+    def __init__(self):
+        self.calls = 0
+
+    def stream(self, inputs):
+        self.calls += 1
+        yield f"answer {self.calls}"
+
+
+@pytest.fixture
+def catalog():
+    return ProductCatalog([
+        make_product("https://www.khaadi.com", "Blue Lawn Suit", price="4,500", category="lawn"),
+        make_product("https://pk.sapphireonline.pk", "Pink Lawn Suit", price="5,900", category="lawn", brand="Sapphire"),
+    ])
+
+
+def entities(question, catalog):
+    return parse_catalog_query(question, catalog).entities
+
+
+def test_semantic_hit_needs_the_same_entities(catalog):
+    cache = AnswerCache(SameVector())
+    question = "best sapphire lawn for summer"
+    cache.store(question, {"text": "sapphire answer"}, 1, cache.embed(question), entities(question, catalog))
+
+    other_brand = "best khaadi lawn for summer"
+    assert cache.lookup(other_brand, 1, entities(other_brand, catalog))[0] is None
+    other_price = "best sapphire lawn for summer under 3000"
+    assert cache.lookup(other_price, 1, entities(other_price, catalog))[0] is None
+
+    same_brand = "nice sapphire lawn for the summer"
+    assert cache.lookup(same_brand, 1, entities(same_brand, catalog))[0] == {"text": "sapphire answer"}
+    assert cache.stats()["semantic_hits"] == 1
+
+
+def test_semantic_match_skips_other_entities_for_a_matching_one(catalog):
+    cache = AnswerCache(SameVector())
+    for question in ("best sapphire lawn for summer", "best khaadi lawn for summer"):
+        cache.store(question, {"text": question}, 1, cache.embed(question), entities(question, catalog))
+    question = "good khaadi lawn for summer"
+    assert cache.lookup(question, 1, entities(question, catalog))[0] == {"text": "best khaadi lawn for summer"}
+
+
+def test_without_entities_only_exact_matches_are_served():
+    cache = AnswerCache(SameVector())
+    cache.store("best lawn for summer", {"text": "answer"}, 1, cache.embed("best lawn for summer"))
+    assert cache.lookup("best lawn for the summer", 1)[0] is None
+    assert cache.lookup("Best lawn, for summer!", 1)[0] == {"text": "answer"}
+
+
+def test_answers_written_with_chat_history_are_not_cached(bot, catalog):
+    chain = ScriptedChain()
+    bot.catalog = catalog
+    bot.index.publish(IndexSnapshot(generation=1, collection_name="test-g1", vector_store=None, lexical_index=None,
+                                    retriever=None, conversation=chain, chunk_ids={}))
+    question = "best khaadi lawn for summer"
+
+    bot.sessions.add_turn("alice", "do you have anything for a wedding", "Here are some formal suits.")
+    bot.get_response(question, session_id="alice")
+    assert bot.answer_cache.stats()["entries"] == 0
+
+    bot.get_response(question, session_id="bob")
+    assert bot.answer_cache.stats()["entries"] == 1
+    assert "answer 2" in bot.get_response(question, session_id="carol")
+    assert chain.calls == 2
+
+
+def test_questions_without_entities_are_not_matched_semantically(bot, catalog):
+    chain = ScriptedChain()
+    bot.catalog = catalog
+    bot.answer_cache = AnswerCache(SameVector())
+    bot.index.publish(IndexSnapshot(generation=1, collection_name="test-g1", vector_store=None, lexical_index=None,
+                                    retriever=None, conversation=chain, chunk_ids={}))
+
+    def answer(question, session_id):
+        events = bot.answer_events(question, session_id, {}, {})
+        return "".join(event["text"] for event in events if event["type"] == "text")
+
+    assert answer("what is your return policy", "alice") == "answer 1"
+    assert answer("what is your shipping policy", "bob") == "answer 2"
+    assert answer("What is your return policy?", "carol") == "answer 1"
+    assert chain.calls == 2
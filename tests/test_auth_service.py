@@ -0,0 +1,52 @@
+import sys
+import importlib
+import dotenv
+import pytest
+
+
+def load_auth_service(monkeypatch, tmp_path, secret_key="test-secret"):
+    # The engine and signing key are read at import, so each test imports its own copy
+    monkeypatch.setattr(dotenv, "load_dotenv", lambda *args, **kwargs: False)
+    monkeypatch.setenv("AUTH_DATABASE_URL", f"sqlite:///{tmp_path / 'users.db'}")
+    if secret_key is None:
+        monkeypatch.delenv("AUTH_SECRET_KEY", raising=False)
+    else:
+        monkeypatch.setenv("AUTH_SECRET_KEY", secret_key)
+    monkeypatch.delitem(sys.modules, "auth_service", raising=False)
+    return importlib.import_module("auth_service")
+
+
+@pytest.fixture
+def auth(monkeypatch, tmp_path):
+    module = load_auth_service(monkeypatch, tmp_path)
+    yield module
+    module.engine.dispose()
+    sys.modules.pop("auth_service", None)
+
+
+def test_register_then_login(auth):
+    assert auth.register_user("sara@example.com", "sara", "lawn-season")
+    assert not auth.register_user("sara@example.com", "sara2", "lawn-season")
+    token = auth.authenticate_user("sara@example.com", "lawn-season")
+    assert auth.verify_token(token) == "sara@example.com"
+    assert auth.authenticate_user("sara@example.com", "wrong") is None
+
+
+def test_concurrent_sign_up_with_the_same_email_returns_false(auth, monkeypatch):
+    hash_password = auth.hash_password
+
+    def hash_while_another_sign_up_lands(password):
+        # The other request passes the existence check too and inserts while this one hashes
+        with auth.session_scope() as session:
+            session.add(auth.User(email="ali@example.com", username="ali-1", password=hash_password("other")))
+        return hash_password(password)
+
+    monkeypatch.setattr(auth, "hash_password", hash_while_another_sign_up_lands)
+    assert auth.register_user("ali@example.com", "ali-2", "chiffon") is False
+    with auth.session_scope() as session:
+        assert [user.username for user in session.query(auth.User).all()] == ["ali-1"]
+
+
+def test_missing_secret_key_fails_at_startup(monkeypatch, tmp_path):
+    with pytest.raises(RuntimeError, match="AUTH_SECRET_KEY"):
+        load_auth_service(monkeypatch, tmp_path, secret_key=None)
@@ -0,0 +1,59 @@
+import pytest
+from catalog import ProductCatalog, make_product, parse_catalog_query
+
+
+@pytest.fixture
+def catalog():
+    return ProductCatalog([
+        make_product("https://www.khaadi.com", "Blue Lawn Suit", price="4,500", category="lawn"),
+        make_product("https://www.khaadi.com", "Black Khaddar Kurta", price="3,900", category="kurta"),
+        make_product("https://www.gulahmedshop.com", "Red Chiffon Dress", price="12,000", brand="Gul Ahmed"),
+    ])
+
+
+@pytest.mark.parametrize("question, max_price", [
+    ("lawn under 5000 khaadi", 5000),
+    ("kurta under 4000 khaadi", 4000),
+    ("lawn under 5k khaadi", 5000),
+    ("lawn under 5 k khaadi", 5000),
+    ("lawn under rs 5,000 khaadi", 5000),
+    ("lawn under 5k", 5000),
+])
+def test_max_price_followed_by_k_word(catalog, question, max_price):
+    query = parse_catalog_query(question, catalog)
+    assert query.max_price == max_price
+    assert query.residual == []
+    assert query.is_pure_filter
+    if "khaadi" in question:
+        assert query.brands == ["khaadi"]
+
+
+@pytest.mark.parametrize("question, low, high", [
+    ("between 1000 and 5000 khaddar", 1000, 5000),
+    ("between 1k and 5k khaddar", 1000, 5000),
+    ("rs 1000 - 5000 khaddar", 1000, 5000),
+    ("rs 1k to 5000 khaddar", 1000, 5000),
+])
+def test_price_range_followed_by_k_word(catalog, question, low, high):
+    query = parse_catalog_query(question, catalog)
+    assert (query.min_price, query.max_price) == (low, high)
+    assert query.categories == ["khaddar"]
+    assert query.residual == []
+
+
+def test_min_price_followed_by_k_word(catalog):
+    query = parse_catalog_query("over 3000 khaadi kurta", catalog)
+    assert query.min_price == 3000
+    assert query.brands == ["khaadi"]
+    assert query.categories == ["kurta"]
+
+
+def test_search_uses_parsed_filters(catalog):
+    products = catalog.search(parse_catalog_query("kurta under 4000 khaadi", catalog))
+    assert [product["name"] for product in products] == ["Black Khaddar Kurta"]
+
+
+def test_open_ended_question_keeps_residual(catalog):
+    query = parse_catalog_query("what should i wear to a mehndi under 5000", catalog)
+    assert query.max_price == 5000
+    assert not query.is_pure_filter
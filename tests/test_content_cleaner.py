@@ -0,0 +1,35 @@
+from content_cleaner import BoilerplateFilter
+
+SITE = "https://www.khaadi.com"
+PROMO = "Free delivery on all orders above Rs. 5000"
+CARE = "Fabric: pure cotton lawn. Dry clean only, do not bleach."
+
+
+def page(i, *blocks):
+    return "\n".join([f"Printed lawn suit number {i} with embroidered neckline", *blocks])
+
+
+def test_full_crawl_learns_blocks_repeated_across_the_site(tmp_path):
+    boilerplate = BoilerplateFilter(str(tmp_path / "boilerplate.json"))
+    for i in range(10):
+        boilerplate.observe(f"{SITE}/products/{i}", page(i, PROMO, CARE) if i < 3 else page(i, PROMO))
+    boilerplate.learn()
+    assert boilerplate.clean(f"{SITE}/products/1", page(1, PROMO, CARE)) == page(1, CARE)
+    # Rules persist across restarts
+    assert BoilerplateFilter(str(tmp_path / "boilerplate.json")).learned == boilerplate.learned
+
+
+def test_incremental_cycle_keeps_the_rules_of_indexed_sites(tmp_path):
+    boilerplate = BoilerplateFilter(str(tmp_path / "boilerplate.json"))
+    for i in range(10):
+        boilerplate.observe(f"{SITE}/products/{i}", page(i, PROMO))
+    boilerplate.learn()
+    learned = boilerplate.learned["khaadi.com"]
+
+    # Six products of one collection change; their shared care text is not site boilerplate
+    for i in range(6):
+        boilerplate.observe(f"{SITE}/products/{i}", page(i, PROMO, CARE))
+    boilerplate.learn(keep_sites={"khaadi.com"})
+    assert boilerplate.learned["khaadi.com"] == learned
+    assert CARE in boilerplate.clean(f"{SITE}/products/1", page(1, PROMO, CARE))
+    assert boilerplate.observed == {}
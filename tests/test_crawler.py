@@ -0,0 +1,60 @@
+import socket
+import asyncio
+from aiohttp import web
+from crawler import CrawlConfig, Crawler
+
+
+def flaky_app(failures, status=503):
+    """Answers status to the first `failures` requests for a path, then 200."""
+    seen = {}
+
+    async def page(request):
+        seen[request.path] = seen.get(request.path, 0) + 1
+        if seen[request.path] <= failures:
+            return web.Response(status=status)
+        return web.Response(text="<html><body>ok</body></html>", content_type="text/html")
+
+    app = web.Application()
+    app.router.add_get("/{name}", page)
+    return app, seen
+
+
+def fetch(app, path, max_retries=2):
+    async def run():
+        with socket.socket() as sock:
+            sock.bind(("127.0.0.1", 0))
+            port = sock.getsockname()[1]
+        runner = web.AppRunner(app, access_log=None)
+        await runner.setup()
+        await web.TCPSite(runner, "127.0.0.1", port).start()
+        try:
+            async with Crawler(CrawlConfig(max_retries=max_retries, backoff_base=0.0)) as crawler:
+                return await crawler.fetch(f"http://127.0.0.1:{port}{path}"), crawler.stats
+        finally:
+            await runner.cleanup()
+    return asyncio.run(run())
+
+
+def test_retries_until_the_page_answers():
+    app, seen = flaky_app(failures=2)
+    result, stats = fetch(app, "/page")
+    assert result.ok
+    assert seen["/page"] == 3
+    assert (stats.pages, stats.retries, stats.failures) == (1, 2, 0)
+
+
+def test_gives_up_after_the_last_retry():
+    app, seen = flaky_app(failures=10)
+    result, stats = fetch(app, "/page")
+    assert not result.ok
+    assert result.status == 503
+    assert seen["/page"] == 3
+    assert (stats.pages, stats.retries, stats.failures) == (0, 2, 1)
+
+
+def test_client_errors_are_not_retried():
+    app, seen = flaky_app(failures=10, status=404)
+    result, stats = fetch(app, "/page")
+    assert result.status == 404
+    assert seen["/page"] == 1
+    assert (stats.retries, stats.failures) == (0, 1)
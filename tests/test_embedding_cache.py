@@ -0,0 +1,75 @@
+import itertools
+import pytest
+import embedding_cache
+from embedding_cache import CachedEmbeddings
+
+
+class CountingEmbedder:
+    def __init__(self):
+        self.embedded = []
+
+    def embed_documents(self, texts):
+        self.embedded.extend(texts)
+        return [[float(len(text)), 1.0] for text in texts]
+
+    def embed_query(self, text):
+        return [float(len(text)), 1.0]
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    # Distinct timestamps, so least-recently-used order never ties
+    ticks = itertools.count(1000)
+    monkeypatch.setattr(embedding_cache.time, "time", lambda: float(next(ticks)))
+
+
+def cache(tmp_path, embedder, model="mxbai-embed-large", max_entries=100):
+    return CachedEmbeddings(embedder, model_name=model, path=str(tmp_path / "cache.sqlite"), max_entries=max_entries)
+
+
+def test_only_new_texts_reach_the_model(tmp_path):
+    embedder = CountingEmbedder()
+    embeddings = cache(tmp_path, embedder)
+    assert embeddings.embed_documents(["lawn", "khaddar", "lawn"]) == [[4.0, 1.0], [7.0, 1.0], [4.0, 1.0]]
+    assert embedder.embedded == ["lawn", "khaddar"]
+    assert embeddings.embed_documents(["khaddar", "chiffon"]) == [[7.0, 1.0], [7.0, 1.0]]
+    assert embedder.embedded == ["lawn", "khaddar", "chiffon"]
+    assert (embeddings.hits, embeddings.misses) == (2, 3)
+
+    # Persisted: a restarted process embeds nothing it has seen
+    reopened = cache(tmp_path, embedder)
+    reopened.embed_documents(["lawn", "khaddar", "chiffon"])
+    assert embedder.embedded == ["lawn", "khaddar", "chiffon"]
+    assert (reopened.hits, reopened.misses) == (3, 0)
+
+
+def test_least_recently_used_entries_are_evicted(tmp_path, clock):
+    embedder = CountingEmbedder()
+    embeddings = cache(tmp_path, embedder, max_entries=2)
+    embeddings.embed_documents(["lawn"])
+    embeddings.embed_documents(["khaddar"])
+    embeddings.embed_documents(["lawn"])
+    embeddings.embed_documents(["chiffon"])
+    embedder.embedded.clear()
+
+    embeddings.embed_documents(["lawn", "chiffon", "khaddar"])
+    assert embedder.embedded == ["khaddar"]
+
+
+def test_changing_the_model_invalidates_the_cache(tmp_path):
+    embedder = CountingEmbedder()
+    cache(tmp_path, embedder).embed_documents(["lawn"])
+    other = cache(tmp_path, embedder, model="nomic-embed-text")
+    other.embed_documents(["lawn"])
+    assert embedder.embedded == ["lawn", "lawn"]
+    # Switching back finds nothing either: vectors of another model are never served
+    cache(tmp_path, embedder).embed_documents(["lawn"])
+    assert embedder.embedded == ["lawn", "lawn", "lawn"]
+
+
+def test_changing_the_cache_version_invalidates_the_cache(tmp_path, monkeypatch):
+    embedder = CountingEmbedder()
+    cache(tmp_path, embedder).embed_documents(["lawn"])
+    monkeypatch.setattr(embedding_cache, "CACHE_VERSION", embedding_cache.CACHE_VERSION + 1)
+    cache(tmp_path, embedder).embed_documents(["lawn"])
+    assert embedder.embedded == ["lawn", "lawn"]
@@ -0,0 +1,103 @@
+import time
+import threading
+import pytest
+from langchain.schema import Document
+from embedding_pipeline import EmbeddingFailed, EmbeddingPipeline
+
+
+class StubEmbedder:
+    """Embeds each text to [number in the text]; delays and failures are injected per batch."""
+
+    def __init__(self, delays=None, failures=None):
+        self.delays = delays or {}
+        self.failures = dict(failures or {})
+        self.lock = threading.Lock()
+        self.calls = []
+        self.running = 0
+        self.max_running = 0
+
+    def embed_documents(self, texts):
+        first = texts[0]
+        with self.lock:
+            self.calls.append(len(texts))
+            self.running += 1
+            self.max_running = max(self.max_running, self.running)
+            fail = self.failures.get(first, 0) > 0
+            if fail:
+                self.failures[first] -= 1
+        try:
+            time.sleep(self.delays.get(first, 0.01))
+            if fail:
+                raise ConnectionError("embedding server unavailable")
+            return [[float(text.split()[-1])] for text in texts]
+        finally:
+            with self.lock:
+                self.running -= 1
+
+
+def chunks(count):
+    return [Document(page_content=f"chunk {i}", metadata={"source": f"page-{i}"}) for i in range(count)], \
+        [f"id-{i}" for i in range(count)]
+
+
+class RecordingSink:
+    def __init__(self, embedder=None):
+        self.batches = []
+        self.embedder = embedder
+        self.in_flight = []
+
+    def __call__(self, ids, texts, metadatas, vectors):
+        if self.embedder is not None:
+            # Batches started but not yet handed over; bounded by max_in_flight
+            self.in_flight.append(len(self.embedder.calls) - len(self.batches))
+        self.batches.append((ids, texts, metadatas, vectors))
+
+
+def test_chunks_are_embedded_in_fixed_size_batches():
+    embedder, sink = StubEmbedder(), RecordingSink()
+    documents, ids = chunks(10)
+    stats = EmbeddingPipeline(embedder, batch_size=4, max_in_flight=1).run(documents, ids, sink)
+    assert embedder.calls == [4, 4, 2]
+    assert [batch[0] for batch in sink.batches] == [ids[0:4], ids[4:8], ids[8:10]]
+    assert (stats.chunks, stats.batches, stats.retries) == (10, 3, 0)
+
+
+def test_requests_in_flight_are_bounded():
+    embedder = StubEmbedder(delays={f"chunk {i}": 0.05 for i in range(0, 40, 2)})
+    sink = RecordingSink(embedder)
+    documents, ids = chunks(40)
+    EmbeddingPipeline(embedder, batch_size=2, max_in_flight=3).run(documents, ids, sink)
+    assert embedder.max_running == 3
+    # Nothing is submitted past the limit while finished batches wait for the sink
+    assert max(sink.in_flight) <= 3
+    assert sorted(i for batch in sink.batches for i in batch[0]) == sorted(ids)
+
+
+def test_sink_receives_batches_as_they_finish_with_their_own_vectors():
+    embedder, sink = StubEmbedder(delays={"chunk 0": 0.3}), RecordingSink()
+    documents, ids = chunks(6)
+    EmbeddingPipeline(embedder, batch_size=2, max_in_flight=3).run(documents, ids, sink)
+    # The slow first batch does not hold back the ones submitted after it
+    assert sink.batches[-1][0] == ["id-0", "id-1"]
+    for batch_ids, texts, metadatas, vectors in sink.batches:
+        assert [f"id-{int(vector[0])}" for vector in vectors] == batch_ids
+        assert [metadata["source"] for metadata in metadatas] == [f"page-{i[3:]}" for i in batch_ids]
+        assert [f"chunk {i[3:]}" for i in batch_ids] == texts
+
+
+def test_failed_batches_are_retried():
+    embedder, sink = StubEmbedder(failures={"chunk 2": 2}), RecordingSink()
+    documents, ids = chunks(4)
+    stats = EmbeddingPipeline(embedder, batch_size=2, max_in_flight=2, max_retries=2, backoff_base=0).run(documents, ids, sink)
+    assert stats.retries == 2
+    assert embedder.calls == [2, 2, 2, 2]
+    assert sorted(i for batch in sink.batches for i in batch[0]) == ids
+
+
+def test_gives_up_after_the_last_retry():
+    embedder, sink = StubEmbedder(failures={"chunk 0": 10}), RecordingSink()
+    documents, ids = chunks(2)
+    with pytest.raises(EmbeddingFailed, match="after 3 attempts"):
+        EmbeddingPipeline(embedder, batch_size=2, max_retries=2, backoff_base=0).run(documents, ids, sink)
+    assert embedder.calls == [2, 2, 2]
+    assert sink.batches == []
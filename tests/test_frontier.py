@@ -0,0 +1,67 @@
+import asyncio
+from frontier import CrawlFrontier, FrontierConfig, SiteQueue, site_of
+
+SEED_URL = "https://www.khaadi.com"
+
+
+def frontier(max_pages, max_revisits=100):
+    frontier = CrawlFrontier(FrontierConfig(max_pages_per_site=max_pages, max_revisits_per_site=max_revisits,
+                                            seen_capacity=10000))
+    frontier.sites[site_of(SEED_URL)] = SiteQueue(seed=SEED_URL)
+    frontier.push(SEED_URL, 0, kind=0)
+    return frontier
+
+
+def drain(frontier):
+    async def run():
+        fetched = []
+        while (entry := await frontier.next(site_of(SEED_URL))) is not None:
+            fetched.append(entry[0])
+            await frontier.done(entry[0])
+        return fetched
+    return asyncio.run(run())
+
+
+def test_indexed_pages_are_revisited_despite_a_full_sitemap():
+    crawl = frontier(max_pages=3)
+    for i in range(50):
+        crawl.push(f"{SEED_URL}/products/new-{i}", 1, lastmod=1_700_000_000 + i)
+    crawl.revisit(f"{SEED_URL}/products/deleted-suit")
+    crawl.revisit(f"{SEED_URL}/products/old-suit")
+
+    fetched = drain(crawl)
+    assert fetched[0] == "https://www.khaadi.com"
+    assert fetched[1:3] == [f"{SEED_URL}/products/deleted-suit", f"{SEED_URL}/products/old-suit"]
+    # The revisits do not use up the budget for new pages
+    assert fetched[3:] == [f"{SEED_URL}/products/new-49", f"{SEED_URL}/products/new-48"]
+
+
+def test_revisit_budget_is_separate_and_pages_are_fetched_once():
+    crawl = frontier(max_pages=2, max_revisits=2)
+    crawl.push(f"{SEED_URL}/products/a", 1, lastmod=1_700_000_000)
+    for name in ("a", "b", "c"):
+        crawl.revisit(f"{SEED_URL}/products/{name}")
+    assert not crawl.revisit(f"{SEED_URL}/products/a")
+    # A link to a page queued for revisit is not queued again
+    assert not crawl.push(f"{SEED_URL}/products/b", 2)
+
+    fetched = drain(crawl)
+    assert fetched == ["https://www.khaadi.com", f"{SEED_URL}/products/a", f"{SEED_URL}/products/b"]
+    assert "2 revisits" in crawl.summary()
+
+
+def test_revisits_keep_the_depth_pages_were_found_at():
+    crawl = frontier(max_pages=5)
+    crawl.revisit(SEED_URL, 0)
+    crawl.revisit(f"{SEED_URL}/products/linked-suit", 2)
+    crawl.revisit(f"{SEED_URL}/products/old-suit")
+
+    async def run():
+        entries = []
+        while (entry := await crawl.next(site_of(SEED_URL))) is not None:
+            entries.append(entry)
+            await crawl.done(entry[0])
+        return entries
+    # The seed is fetched once, as a revisit, and its links are still one hop from the home page
+    assert asyncio.run(run()) == [("https://www.khaadi.com", 0), (f"{SEED_URL}/products/linked-suit", 2),
+                                  (f"{SEED_URL}/products/old-suit", 1)]
@@ -0,0 +1,93 @@
+import io
+import socket
+import asyncio
+import aiohttp
+import pytest
+from aiohttp import web
+from PIL import Image
+from image_pipeline import ThumbnailCache, clean_image_urls, is_placeholder, sized_image_url
+
+PAGE = "https://www.khaadi.com/products/organza-suit"
+
+
+@pytest.mark.parametrize("url", [
+    "https://www.khaadi.com/media/catalog/product/transparent-organza-dupatta.jpg",
+    "https://www.sapphireonline.pk/images/Iconic-Lawn-Kurta.jpg",
+    "https://www.gulahmedshop.com/media/blanket-shawl.jpg",
+    "https://www.alkaramstudio.com/media/flagship-edition-suit.jpg",
+    "https://www.outfitters.com.pk/images/pixel-print-shirt.jpg",
+    "https://www.khaadi.com/media/catalog/product/LLA-24-301_1.jpg",
+    "https://www.limelight.pk/images/IMG_1234.jpg",
+    "https://www.khaadi.com/media/khaadi-logo-print-tee.jpg",
+])
+def test_product_photos_are_kept(url):
+    assert not is_placeholder(url)
+    assert clean_image_urls(PAGE, [url]) == [url]
+
+
+@pytest.mark.parametrize("url", [
+    "https://www.khaadi.com/media/placeholder.png",
+    "https://www.khaadi.com/media/product-placeholder_600x.jpg",
+    "https://www.khaadi.com/media/loading_1x1.jpg",
+    "https://www.khaadi.com/media/logo.png",
+    "https://www.khaadi.com/media/logo-white_200x@2x.png",
+    "https://www.khaadi.com/media/transparent.png",
+    "https://www.khaadi.com/static/icons/whatsapp.png",
+    "https://www.khaadi.com/static/payment/visa.png",
+    "https://www.khaadi.com/media/spacer.gif",
+    "https://www.facebook.com/tr?id=1&ev=PageView",
+    "data:image/gif;base64,R0lGODlhAQABAAAAACw=",
+])
+def test_placeholders_and_site_chrome_are_dropped(url):
+    assert clean_image_urls(PAGE, [url]) == []
+
+
+def test_relative_urls_are_resolved_and_duplicates_dropped():
+    candidates = ["/media/blue-lawn.jpg", "//www.khaadi.com/media/blue-lawn.jpg", "", None, "/media/red-lawn.jpg"]
+    assert clean_image_urls(PAGE, candidates) == [
+        "https://www.khaadi.com/media/blue-lawn.jpg",
+        "https://www.khaadi.com/media/red-lawn.jpg",
+    ]
+
+
+def test_thumbnails_of_shopify_images_fetch_a_sized_variant(tmp_path):
+    requested = []
+
+    async def image(request):
+        requested.append(request.path)
+        if not request.path.endswith("_640x.jpg"):
+            # The original upload, larger than the cache will read
+            return web.Response(body=b"\xff" * 200_000, content_type="image/jpeg")
+        output = io.BytesIO()
+        Image.new("RGB", (640, 800), "navy").save(output, format="JPEG")
+        return web.Response(body=output.getvalue(), content_type="image/jpeg")
+
+    async def run():
+        app = web.Application()
+        app.router.add_get("/cdn/shop/files/{name}", image)
+        with socket.socket() as sock:
+            sock.bind(("127.0.0.1", 0))
+            port = sock.getsockname()[1]
+        runner = web.AppRunner(app, access_log=None)
+        await runner.setup()
+        await web.TCPSite(runner, "127.0.0.1", port).start()
+        try:
+            url = clean_image_urls(PAGE, [f"http://127.0.0.1:{port}/cdn/shop/files/blue-lawn_2048x.jpg?v=3"])[0]
+            assert url == f"http://127.0.0.1:{port}/cdn/shop/files/blue-lawn.jpg?v=3"
+            async with aiohttp.ClientSession() as session:
+                return await cache.get(session, url)
+        finally:
+            await runner.cleanup()
+
+    cache = ThumbnailCache(str(tmp_path), size=320, max_source_bytes=100_000)
+    path = asyncio.run(run())
+    assert path is not None
+    assert requested == ["/cdn/shop/files/blue-lawn_640x.jpg"]
+    with Image.open(path) as thumbnail:
+        assert max(thumbnail.size) == 320
+
+
+def test_sized_variant_leaves_other_hosts_alone():
+    assert sized_image_url("https://cdn.shopify.com/s/files/1/shirt_large.png?v=1", 640) == \
+        "https://cdn.shopify.com/s/files/1/shirt_640x.png?v=1"
+    assert sized_image_url("https://www.khaadi.com/media/shirt_large.png", 640) == "https://www.khaadi.com/media/shirt_large.png"
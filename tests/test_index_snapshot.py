@@ -0,0 +1,162 @@
+from langchain.schema import Document
+from index_snapshot import (
+    GenerationView,
+    IndexSnapshot,
+    SnapshotHolder,
+    generations_in_use,
+    read_pointer,
+    write_pointer,
+    write_reader_state,
+)
+
+
+def snapshot(generation):
+    return IndexSnapshot(generation=generation, collection_name=f"pakfashion-g{generation}", vector_store=None,
+                         lexical_index=None, retriever=None, conversation=None, chunk_ids={})
+
+
+def test_publish_swaps_for_new_readers_only():
+    retired = []
+    holder = SnapshotHolder(on_retire=retired.append)
+    holder.publish(snapshot(1))
+    with holder.acquire() as pinned:
+        holder.publish(snapshot(2))
+        # The query that started on generation 1 finishes on it
+        assert pinned.generation == 1
+        with holder.acquire() as fresh:
+            assert fresh.generation == 2
+        assert retired == []
+        assert holder.pending_retirement == 1
+    assert [s.generation for s in retired] == [1]
+    assert holder.pending_retirement == 0
+
+
+def test_unread_generation_is_retired_on_publish():
+    retired = []
+    holder = SnapshotHolder(on_retire=retired.append)
+    holder.publish(snapshot(1))
+    holder.publish(snapshot(2))
+    assert [s.generation for s in retired] == [1]
+    assert holder.current.generation == 2
+
+
+def test_failing_retire_does_not_break_publish():
+    def on_retire(snapshot):
+        raise RuntimeError("collection already gone")
+
+    holder = SnapshotHolder(on_retire=on_retire)
+    holder.publish(snapshot(1))
+    holder.publish(snapshot(2))
+    assert holder.current.generation == 2
+
+
+def test_pointer_round_trip(tmp_path):
+    assert read_pointer(str(tmp_path)) is None
+    write_pointer(str(tmp_path), 3, "pakfashion-g3")
+    assert read_pointer(str(tmp_path)) == {"generation": 3, "collection_name": "pakfashion-g3"}
+
+
+def test_holder_reports_generations_with_readers_left():
+    holder = SnapshotHolder()
+    holder.publish(snapshot(1))
+    with holder.acquire():
+        holder.publish(snapshot(2))
+        assert holder.generations() == [1, 2]
+    assert holder.generations() == [2]
+
+
+def test_stale_readers_hold_nothing(tmp_path):
+    index_dir = str(tmp_path)
+    assert generations_in_use(index_dir, 60) == set()
+    write_reader_state(index_dir, "query-a", [3, 4])
+    write_reader_state(index_dir, "query-b", [4])
+    assert generations_in_use(index_dir, 60) == {3, 4}
+    assert generations_in_use(index_dir, -1) == set()
+    # Stale reports are cleared, so a crashed query service stops pinning generations for good
+    assert not (tmp_path / "readers" / "query-a.json").exists()
+
+
+def page(bot, url, version):
+    words = " ".join(f"{url.rsplit('/', 1)[-1]}-{version}-{i}" for i in range(150))
+    bot.documents[url] = Document(page_content=f"Lawn suit {version}. {words}", metadata={"source": url})
+    bot.changed_sources.add(url)
+
+
+def build(bot, *urls, version=1):
+    bot.changed_sources = set()
+    for url in urls:
+        page(bot, url, version)
+    bot.prepare_vector_store()
+
+
+def visible(bot, generation):
+    existing = GenerationView(bot.chunk_store, generation).get(include=["metadatas"])
+    return {(metadata["source"], metadata["generation"]) for metadata in existing["metadatas"]}
+
+
+SUIT, KURTA = "https://www.khaadi.com/products/suit", "https://www.khaadi.com/products/kurta"
+
+
+def test_refresh_writes_only_changed_chunks(bot):
+    build(bot, SUIT, KURTA)
+    stored = bot.chunk_store._collection.count()
+    per_page = stored // 2
+
+    build(bot, SUIT, version=2)
+    # Only the changed page's new chunks were written; the unchanged page was neither copied nor rewritten
+    assert bot.chunk_store._collection.count() == stored + per_page
+    assert visible(bot, 1) == {(SUIT, 1), (KURTA, 1)}
+    assert visible(bot, 2) == {(SUIT, 2), (KURTA, 1)}
+    found = bot.index.current.vector_store.similarity_search("lawn suit", k=50)
+    assert {(document.metadata["source"], document.metadata["generation"]) for document in found} == {(SUIT, 2), (KURTA, 1)}
+
+
+def test_replaced_chunks_wait_for_query_services(bot):
+    import main
+    build(bot, SUIT, KURTA)
+    write_reader_state(main.INDEX_DIR, "query-a", [1])
+    build(bot, SUIT, version=2)
+    # Past the grace period, so only the query service's report keeps generation 1's chunks
+    bot.lingering = [(generation, retired_at - main.INDEX_READER_TIMEOUT) for generation, retired_at in bot.lingering]
+    bot.drop_released_generations()
+    assert visible(bot, 1) == {(SUIT, 1), (KURTA, 1)}
+
+    write_reader_state(main.INDEX_DIR, "query-a", [2])
+    bot.drop_released_generations()
+    assert bot.lingering == []
+    assert visible(bot, 1) == {(KURTA, 1)}
+    assert visible(bot, 2) == {(SUIT, 2), (KURTA, 1)}
+
+
+def test_replaced_chunks_are_kept_through_the_grace_period(bot):
+    build(bot, SUIT, KURTA)
+    # No query service has reported yet; one may have just read the old pointer
+    build(bot, SUIT, version=2)
+    assert len(bot.lingering) == 1
+    assert visible(bot, 1) == {(SUIT, 1), (KURTA, 1)}
+
+
+def test_unpublished_build_is_rolled_back(bot):
+    build(bot, SUIT, KURTA)
+    build(bot, SUIT, version=2)
+    # As if generation 2 had crashed before its pointer was written
+    bot.discard_generations_after(1)
+    assert visible(bot, 1) == {(SUIT, 1), (KURTA, 1)}
+    assert visible(bot, 2) == {(SUIT, 1), (KURTA, 1)}
+
+
+def test_legacy_collection_is_served_then_rebuilt_into_the_shared_one(bot):
+    import main
+    legacy = bot.legacy_collection_name(3)
+    bot.open_vector_store(legacy).add_texts(["Lawn suit from an older index"], metadatas=[{"source": SUIT}], ids=["old-0"])
+    write_pointer(main.INDEX_DIR, 3, legacy)
+    bot.load_vector_store()
+    assert bot.index.current.collection_name == legacy
+
+    build(bot, SUIT, KURTA)
+    assert bot.generation == 4
+    assert visible(bot, 4) == {(SUIT, 4), (KURTA, 4)}
+    bot.lingering = [(generation, retired_at - main.INDEX_READER_TIMEOUT) for generation, retired_at in bot.lingering]
+    bot.drop_released_generations()
+    names = {c if isinstance(c, str) else c.name for c in bot.chroma.list_collections()}
+    assert names == {bot.collection_name}
@@ -0,0 +1,74 @@
+import pytest
+import main
+import metrics
+from index_snapshot import IndexSnapshot
+
+
+class ScriptedChain:
+    def __init__(self, fail=False):
+        self.fail = fail
+
+    def stream(self, inputs):
+        yield "Try the "
+        if self.fail:
+            raise TimeoutError("LLM timed out")
+        yield "printed lawn."
+
+
+def observed(histogram, path):
+    entry = dict(histogram.items()).get((path,))
+    return entry[2] if entry else 0
+
+
+def publish(bot, chain):
+    bot.index.publish(IndexSnapshot(generation=1, collection_name="test-g1", vector_store=None, lexical_index=None,
+                                    retriever=None, conversation=chain, chunk_ids={}))
+
+
+@pytest.mark.parametrize("fail, path", [(False, "llm"), (True, "error")])
+def test_first_token_is_labelled_with_the_answer_path(bot, fail, path):
+    publish(bot, ScriptedChain(fail=fail))
+    before = {p: (observed(main.FIRST_TOKEN_SECONDS, p), main.QUERIES.value(path=p)) for p in ("llm", "error")}
+    bot.get_response("what should I wear to a mehndi", session_id="alice")
+    after = {p: (observed(main.FIRST_TOKEN_SECONDS, p), main.QUERIES.value(path=p)) for p in ("llm", "error")}
+    other = "error" if path == "llm" else "llm"
+    assert after[path] == (before[path][0] + 1, before[path][1] + 1)
+    assert after[other] == before[other]
+
+
+def test_prometheus_text_escapes_label_values():
+    registry = metrics.Registry()
+    pages = registry.counter("pages_total", "Pages fetched", ["outcome"])
+    pages.inc(outcome='say "hi"\\now\nnext')
+    pages.inc(2, outcome="ok")
+    lines = registry.render().splitlines()
+    assert lines[:2] == ["# HELP pages_total Pages fetched", "# TYPE pages_total counter"]
+    assert 'pages_total{outcome="say \\"hi\\"\\\\now\\nnext"} 1' in lines
+    assert 'pages_total{outcome="ok"} 2' in lines
+
+
+def test_histogram_renders_cumulative_buckets_sum_and_count():
+    registry = metrics.Registry()
+    latency = registry.histogram("query_seconds", "Query time", ["path"], buckets=(0.1, 1))
+    for seconds in (0.05, 0.5, 0.5, 3.0):
+        latency.observe(seconds, path="llm")
+    lines = registry.render().splitlines()
+    assert lines[1] == "# TYPE query_seconds histogram"
+    assert lines[2:] == [
+        'query_seconds_bucket{path="llm",le="0.1"} 1',
+        'query_seconds_bucket{path="llm",le="1.0"} 3',
+        'query_seconds_bucket{path="llm",le="+Inf"} 4',
+        'query_seconds_sum{path="llm"} 4.05',
+        'query_seconds_count{path="llm"} 4',
+    ]
+    summary = registry.snapshot()["query_seconds"]["samples"][0]
+    assert (summary["count"], summary["labels"]) == (4, {"path": "llm"})
+
+
+def test_metrics_are_shared_by_name_and_checked_for_labels():
+    registry = metrics.Registry()
+    assert registry.counter("refreshes_total", "Refreshes", ["outcome"]) is registry.counter("refreshes_total", "Refreshes", ["outcome"])
+    with pytest.raises(ValueError):
+        registry.gauge("refreshes_total", "Refreshes", ["outcome"])
+    with pytest.raises(ValueError):
+        registry.counter("refreshes_total", "Refreshes", ["outcome"]).inc(result="ok")
@@ -0,0 +1,51 @@
+from bs4 import BeautifulSoup
+from content_cleaner import strip_boilerplate
+from page_parser import parse_page
+
+# Trimmed from a Shopify Dawn product page
+DAWN_PRODUCT = """
+<html><body>
+<div id="shopify-section-announcement-bar" class="announcement-bar-section">
+  <div class="announcement-bar" role="region"><p>Free shipping on orders over Rs 5,000</p></div>
+</div>
+<header class="header"><a href="/"><img src="//brand.pk/cdn/shop/files/logo.png" width="120" height="40" alt="Brand"></a></header>
+<main id="MainContent">
+  <section class="product">
+    <div class="product__media-wrapper">
+      <modal-opener class="product__modal-opener product__modal-opener--image" data-modal="#ProductModal-main">
+        <div class="product__media media">
+          <img src="//brand.pk/cdn/shop/files/blue-lawn-suit_1200x.jpg?v=17" width="1200" height="1500" alt="Blue Lawn Suit">
+        </div>
+      </modal-opener>
+    </div>
+    <div class="product__info-container">
+      <h1 class="product__title">Blue Lawn Suit</h1>
+      <p class="price">Rs 4,500</p>
+      <div class="product__description"><p>Three piece printed lawn suit with a chiffon dupatta.</p></div>
+      <div class="social-sharing"><a href="https://facebook.com/sharer">Share</a></div>
+    </div>
+  </section>
+  <div class="cookie-banner" id="cookie-consent"><p>We use cookies to improve your experience.</p></div>
+  <div id="drawer-cart" class="drawer"><p>Your cart is empty</p></div>
+</main>
+</body></html>
+"""
+
+
+def test_boilerplate_hints_match_whole_class_names():
+    soup = BeautifulSoup(DAWN_PRODUCT, "html.parser")
+    strip_boilerplate(soup)
+    text = soup.get_text(" ", strip=True)
+    assert soup.find("modal-opener") is not None
+    assert "Three piece printed lawn suit" in text
+    assert "Free shipping" not in text
+    assert "We use cookies" not in text
+    assert "Your cart is empty" not in text
+    assert "Share" not in text
+
+
+def test_product_page_parses():
+    parsed = parse_page("https://brand.pk/products/blue-lawn-suit", DAWN_PRODUCT)
+    assert "https://facebook.com/sharer" in parsed["links"]
+    assert "Blue Lawn Suit" in parsed["content"]
+    assert "Free shipping" not in parsed["content"]
@@ -0,0 +1,26 @@
+import asyncio
+import pytest
+from aiohttp.test_utils import TestClient, TestServer
+from query_service import create_app
+
+
+def post_query(body):
+    async def run():
+        app = create_app(lambda: None, poll_interval=3600)
+        async with TestClient(TestServer(app)) as client:
+            response = await client.post("/query", data=body, headers={"Content-Type": "application/json"})
+            return response.status, await response.json()
+    return asyncio.run(run())
+
+
+@pytest.mark.parametrize("body", ['["what is new at khaadi"]', '"what is new at khaadi"', "42", "null"])
+def test_query_body_must_be_an_object(body):
+    status, payload = post_query(body)
+    assert status == 400
+    assert payload == {"error": "body must be a JSON object"}
+
+
+def test_query_needs_a_question():
+    status, payload = post_query('{"session_id": "alice"}')
+    assert status == 400
+    assert payload == {"error": "question is required"}
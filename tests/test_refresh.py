@@ -0,0 +1,90 @@
+import random
+import socket
+import asyncio
+import pytest
+import main
+from embedding_pipeline import EmbeddingFailed
+from stub_brand_sites import BRANDS, create_app, serve
+
+
+def free_port(host):
+    with socket.socket() as sock:
+        sock.bind((host, 0))
+        return sock.getsockname()[1]
+
+
+class Sites:
+    """Stub brand sites served on loopback addresses for the length of one test."""
+
+    def __init__(self, brands=1, products=8):
+        self.app = create_app(brands=brands, products=products, latency_ms=0, jitter_ms=0)
+        self.brands = self.app[BRANDS]
+        self.port = free_port(next(iter(self.brands)))
+        self.urls = [f"http://{host}:{self.port}/" for host in self.brands]
+
+    def run(self, scenario):
+        # One event loop for the whole test: an aiohttp app cannot move between loops
+        async def run():
+            runner = await serve(self.app, self.port)
+            try:
+                await scenario()
+            finally:
+                await runner.cleanup()
+        asyncio.run(run())
+
+    def mutate(self, fraction=0.5):
+        """Change some products; return the URLs of their pages."""
+        urls = set()
+        for host, brand in self.brands.items():
+            before = {product["handle"]: product["updated"] for product in brand.products}
+            brand.mutate(fraction, random.Random(1))
+            urls |= {f"http://{host}:{self.port}/products/{product['handle']}"
+                     for product in brand.products if product["updated"] != before[product["handle"]]}
+        return urls
+
+
+@pytest.fixture
+def sites():
+    return Sites()
+
+
+def test_failed_build_leaves_changed_pages_for_the_next_cycle(bot, sites):
+    async def scenario():
+        await bot.scrape_data_from_urls(sites.urls)
+        assert bot.generation == 1
+        changed = sites.mutate()
+        assert changed
+
+        bot.stub_embeddings.fail = True
+        bot.get_urls = lambda: sites.urls
+        catalog_version = bot.catalog_version
+        failed_refreshes = main.REFRESHES.value(outcome="failed")
+        with pytest.raises(EmbeddingFailed):
+            await bot.initialize_data()
+        assert main.REFRESHES.value(outcome="failed") == failed_refreshes + 1
+        assert not bot.data_fetching
+        assert bot.generation == 1
+        assert bot.catalog_version == catalog_version
+        assert changed <= bot.changed_sources
+        # Nothing of the failed cycle may be remembered, or the next one would get 304s and equal hashes
+        for url in changed:
+            assert not bot.scrape_state.conditional_headers(url)
+
+        bot.stub_embeddings.fail = False
+        await bot.scrape_data_from_urls(sites.urls)
+        assert bot.generation == 2
+        assert changed <= bot.changed_sources
+    sites.run(scenario)
+
+
+def test_successful_build_commits_validators(bot, sites):
+    async def scenario():
+        await bot.scrape_data_from_urls(sites.urls)
+        product_url = next(url for url in bot.chunk_ids if "/products/" in url)
+        assert bot.scrape_state.conditional_headers(product_url)
+        assert not bot.scrape_state.pending
+
+        await bot.scrape_data_from_urls(sites.urls)
+        assert bot.changed_sources == set()
+        assert bot.generation == 1
+    sites.run(scenario)
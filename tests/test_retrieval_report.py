@@ -0,0 +1,27 @@
+from langchain.schema import Document
+from retrieval_report import is_labelled, is_relevant
+
+
+def chunk(source, text="unrelated words"):
+    return Document(page_content=text, metadata={"source": source})
+
+
+def test_labelled_page_is_relevant_without_query_terms():
+    judgment = {"query": "khaddar shawl for winter", "relevant_urls": ["https://www.example.pk/products/warm-wrap/"]}
+    assert is_relevant(chunk("http://example.pk/products/warm-wrap"), judgment)
+
+
+def test_query_terms_alone_do_not_make_a_chunk_relevant():
+    judgment = {"query": "khaddar shawl", "relevant_urls": ["https://example.pk/products/warm-wrap"]}
+    assert not is_relevant(chunk("https://example.pk/products/other", "khaddar shawl"), judgment)
+
+
+def test_site_label_covers_subdomains_only_of_that_host():
+    judgment = {"query": "Sapphire new arrivals", "relevant_sites": ["sapphireonline.pk"]}
+    assert is_relevant(chunk("https://pk.sapphireonline.pk/collections/new"), judgment)
+    assert not is_relevant(chunk("https://notsapphireonline.pk/collections/new"), judgment)
+
+
+def test_queries_without_labels_are_unlabelled():
+    assert not is_labelled({"query": "cambric shirt", "relevant_urls": []})
+    assert is_labelled({"query": "cambric shirt", "relevant_urls": ["https://example.pk/cambric"]})
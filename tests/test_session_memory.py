@@ -0,0 +1,47 @@
+import threading
+from session_memory import SessionMemoryStore
+
+
+def fill(store, session_id, turns):
+    future = None
+    for i in range(turns):
+        future = store.add_turn(session_id, f"question {i} " + "x" * 80, f"answer {i} " + "y" * 80) or future
+    return future
+
+
+def test_summarizing_does_not_block_the_session():
+    started, release = threading.Event(), threading.Event()
+
+    def summarizer(previous, turns):
+        started.set()
+        assert release.wait(5)
+        return f"summary of {len(turns)} turns"
+
+    store = SessionMemoryStore(summarizer=summarizer, max_tokens=200)
+    future = fill(store, "alice", 5)
+    assert future is not None
+    assert started.wait(5)
+
+    # The summarizer is still running; the session stays usable meanwhile
+    memory = store.get("alice")
+    assert "question 0" in memory.transcript()
+    assert store.add_turn("alice", "while summarizing", "still answered") is None
+
+    release.set()
+    future.result(timeout=5)
+    assert memory.summary.startswith("summary of")
+    assert memory.turns[-1] == ("while summarizing", "still answered")
+    assert "question 0" not in memory.transcript()
+    assert not memory.compacting
+
+
+def test_failed_summary_falls_back_to_truncation():
+    def summarizer(previous, turns):
+        raise TimeoutError("LLM unavailable")
+
+    store = SessionMemoryStore(summarizer=summarizer, max_tokens=200)
+    fill(store, "bob", 5).result(timeout=5)
+    memory = store.get("bob")
+    assert "User asked: question 2" in memory.summary
+    assert all(not question.startswith(("question 0", "question 2")) for question, _ in memory.turns)
+    assert memory.tokens() <= 200
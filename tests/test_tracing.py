@@ -0,0 +1,66 @@
+import io
+import json
+import asyncio
+import logging
+import threading
+import contextvars
+import pytest
+from tracing import JsonFormatter, TraceIdFilter, current_trace_id, trace
+
+
+@pytest.fixture
+def json_log():
+    stream = io.StringIO()
+    handler = logging.StreamHandler(stream)
+    handler.setFormatter(JsonFormatter())
+    handler.addFilter(TraceIdFilter())
+    logger = logging.getLogger("test_tracing")
+    logger.addHandler(handler)
+    logger.setLevel(logging.INFO)
+    logger.propagate = False
+    yield logger, lambda: [json.loads(line) for line in stream.getvalue().splitlines()]
+    logger.removeHandler(handler)
+
+
+def test_log_records_carry_the_trace_id_and_extra_fields(json_log):
+    logger, records = json_log
+    logger.info("before")
+    with trace("refresh-1") as trace_id:
+        assert trace_id == current_trace_id() == "refresh-1"
+        logger.info("answered", extra={"path": "llm", "total_ms": 12.5})
+    assert current_trace_id() is None
+    before, answered = records()
+    assert before["trace_id"] == "-"
+    assert (answered["trace_id"], answered["message"], answered["path"], answered["total_ms"]) == \
+        ("refresh-1", "answered", "llm", 12.5)
+
+
+def test_trace_id_follows_tasks_and_copied_contexts(json_log):
+    logger, records = json_log
+
+    async def refresh():
+        with trace("refresh-2"):
+            await asyncio.gather(asyncio.create_task(fetch()))
+            worker = threading.Thread(target=contextvars.copy_context().run, args=(logger.info, "embedding"))
+            worker.start()
+            worker.join()
+            # A plain thread starts from an empty context
+            plain = threading.Thread(target=logger.info, args=("unrelated",))
+            plain.start()
+            plain.join()
+
+    async def fetch():
+        logger.info("fetching")
+
+    asyncio.run(refresh())
+    assert [(record["message"], record["trace_id"]) for record in records()] == [
+        ("fetching", "refresh-2"), ("embedding", "refresh-2"), ("unrelated", "-"),
+    ]
+
+
+def test_nested_traces_restore_the_outer_id():
+    with trace() as outer:
+        assert len(outer) == 16
+        with trace("inner"):
+            assert current_trace_id() == "inner"
+        assert current_trace_id() == outer
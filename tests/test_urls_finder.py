@@ -0,0 +1,57 @@
+import os
+import pathlib
+from urllib.parse import urljoin
+import pytest
+from bs4 import BeautifulSoup
+from urls_finder import URLFinder, read_url_list
+
+FIXTURE = pathlib.Path(__file__).resolve().parent.parent / "fixtures" / "search_results.html"
+
+
+def fixture_hrefs(selector):
+    # What the browser hands find_urls: the result links of the page, resolved against its URL
+    page_url = FIXTURE.as_uri() + "?q=lawn"
+    soup = BeautifulSoup(FIXTURE.read_text(), "html.parser")
+    return [urljoin(page_url, link.get("href")) for link in soup.select(selector)]
+
+
+@pytest.fixture
+def finder(tmp_path):
+    return URLFinder(urls_path=str(tmp_path / "urls.txt"), seen_path=str(tmp_path / "scraped_urls.txt"))
+
+
+def test_results_are_reduced_to_site_roots(finder):
+    assert finder.clean_results(fixture_hrefs(finder.result_selector)) == [
+        "https://www.khaadi.com",
+        "https://www.gulahmedshop.com",
+        "https://www.sanasafinaz.com",
+        "https://www.mariab.pk",
+        "https://saya.pk",
+    ]
+
+
+def test_paths_keep_only_meaningful_query_parameters(tmp_path):
+    finder = URLFinder(urls_path=str(tmp_path / "urls.txt"), seen_path=str(tmp_path / "scraped_urls.txt"), keep_paths=True)
+    urls = finder.clean_results(fixture_hrefs(finder.result_selector))
+    assert "https://www.khaadi.com/pk/new-in" in urls
+    assert "https://www.gulahmedshop.com/women/unstitched" in urls
+    assert "https://www.mariab.pk/collections/lawn" in urls
+    assert "https://khaadi.com" in urls
+    assert not any("youtube" in url or "wikipedia" in url or "mailto" in url for url in urls)
+
+
+def test_merge_skips_known_and_previously_proposed_sites(finder):
+    # www. and bare hosts, http and https count as one site
+    with open(finder.urls_path, 'w') as file:
+        file.write("http://khaadi.com\n")
+    # Proposed before and removed from urls.txt by hand
+    with open(finder.seen_path, 'w') as file:
+        file.write("https://www.saya.pk\n")
+
+    added = finder.merge(finder.clean_results(fixture_hrefs(finder.result_selector)))
+
+    assert added == ["https://www.gulahmedshop.com", "https://www.sanasafinaz.com", "https://www.mariab.pk"]
+    assert read_url_list(finder.urls_path) == ["http://khaadi.com"] + added
+    assert read_url_list(finder.seen_path) == ["https://www.saya.pk"] + added
+    assert finder.merge(finder.clean_results(fixture_hrefs(finder.result_selector))) == []
+    assert not [name for name in os.listdir(os.path.dirname(finder.urls_path)) if name.startswith(".")]